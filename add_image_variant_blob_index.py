@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add the rendition blob index to image_variant
+
+/media checks which image a requested blob is a rendition of before
+serving it, so receipts and raw uploads stay private.
+"""
+
+from app import app, db
+from sqlalchemy import text
+
+def add_image_variant_blob_index():
+    """Add idx_image_variant_blob index if it doesn't exist"""
+    with app.app_context():
+        try:
+            print("Adding idx_image_variant_blob index to image_variant table...")
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_image_variant_blob
+                ON image_variant (blob_hash)
+            """))
+            db.session.commit()
+            print("✓ idx_image_variant_blob index is in place")
+        except Exception as e:
+            print(f"Error adding image variant blob index: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    add_image_variant_blob_index()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add the keyset browsing index to restaurant table
+"""
+
+from app import app, db
+from sqlalchemy import text
+
+def add_restaurant_browse_index():
+    """Add idx_restaurant_approval_created index if it doesn't exist"""
+    with app.app_context():
+        try:
+            print("Adding idx_restaurant_approval_created index to restaurant table...")
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_restaurant_approval_created
+                ON restaurant (is_approved, created_at, id)
+            """))
+            db.session.commit()
+            print("✓ idx_restaurant_approval_created index is in place")
+        except Exception as e:
+            print(f"Error adding restaurant browse index: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    add_restaurant_browse_index()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add the full-text search index to restaurant table
+
+Creates the idx_restaurant_search GIN index over the weighted name and
+description tsvector used by search.py. Only PostgreSQL needs it; other
+databases use the in-process search index instead.
+"""
+
+from app import app, db
+from search import restaurant_search_index
+
+def add_search_index():
+    """Add idx_restaurant_search index if it doesn't exist"""
+    with app.app_context():
+        if db.engine.dialect.name != 'postgresql':
+            print("✓ Not PostgreSQL; search uses the in-process index")
+            return
+        try:
+            print("Adding idx_restaurant_search index to restaurant table...")
+            restaurant_search_index.create(db.engine, checkfirst=True)
+            print("✓ idx_restaurant_search index is in place")
+        except Exception as e:
+            print(f"Error adding search index: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    add_search_index()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add the session_version column to the user
+table
+
+Sessions keep a snapshot of a few user fields and reload it when this
+number changes (see principal.py). Existing sessions have no snapshot yet
+and build one on their next request.
+"""
+
+from app import app, db
+from sqlalchemy import inspect, text
+
+def add_session_version_column():
+    """Add session_version to user table if it doesn't exist"""
+    with app.app_context():
+        try:
+            existing = {c['name'] for c in inspect(db.engine).get_columns('user')}
+            if 'session_version' in existing:
+                print("✓ session_version column already exists")
+                return
+            print("Adding session_version column to user table...")
+            db.session.execute(text("""
+                ALTER TABLE "user"
+                ADD COLUMN session_version INTEGER NOT NULL DEFAULT 0
+            """))
+            db.session.commit()
+            print("✓ session_version column added successfully")
+        except Exception as e:
+            print(f"Error adding session_version column: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    add_session_version_column()
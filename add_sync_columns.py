@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add updated_at columns used by the admin
+dashboard's incremental sync
+
+Adds updated_at (backfilled from created_at) and its index to the user,
+restaurant and review tables. The deleted_record tombstone table is
+created by db.create_all() on app start.
+"""
+
+from app import app, db
+from sqlalchemy import inspect, text
+
+SYNCED_TABLES = ['user', 'restaurant', 'review']
+
+def add_sync_columns():
+    """Add updated_at to synced tables if it doesn't exist"""
+    with app.app_context():
+        try:
+            inspector = inspect(db.engine)
+            for table_name in SYNCED_TABLES:
+                existing = {c['name'] for c in inspector.get_columns(table_name)}
+                if 'updated_at' in existing:
+                    print(f"✓ {table_name}.updated_at column already exists")
+                    continue
+                print(f"Adding updated_at column to {table_name} table...")
+                db.session.execute(text(
+                    f'ALTER TABLE "{table_name}" ADD COLUMN updated_at TIMESTAMP'))
+                db.session.execute(text(
+                    f'UPDATE "{table_name}" SET updated_at = created_at'))
+                db.session.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS ix_{table_name}_updated_at '
+                    f'ON "{table_name}" (updated_at)'))
+            db.session.commit()
+            print("✓ updated_at columns are in place")
+        except Exception as e:
+            print(f"Error adding updated_at columns: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    add_sync_columns()
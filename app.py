@@ -1,12 +1,15 @@
 import os
-import base64
-import json
-from flask import Flask, g, request
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
-from flask_login import LoginManager, current_user
+from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from media import media_url
+from images import (responsive_image, image_src, image_srcset, image_status,
+                    MAX_UPLOAD_SIZE)
+import i18n
+import perf
 
 class Base(DeclarativeBase):
     pass
@@ -23,52 +26,31 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
-app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024  # 2MB max file size
-
-# Load translations
-TRANSLATIONS = {}
-for lang in ['en', 'ar']:
-    try:
-        with open(f'translations/{lang}.json', 'r', encoding='utf-8') as f:
-            TRANSLATIONS[lang] = json.load(f)
-    except:
-        TRANSLATIONS[lang] = {}
-
-def get_locale():
-    """Get current locale from g, user preference, cookie, or default"""
-    # Check if locale is stored in g (set by set_language route)
-    if hasattr(g, 'locale'):
-        return g.locale
-    # Check user preference if authenticated
-    if current_user.is_authenticated:
-        return current_user.language or 'en'
-    # Check cookie
-    locale = request.cookies.get('language', 'en')
-    return locale if locale in ['en', 'ar'] else 'en'
-
-def translate(text):
-    """Translate text to current locale"""
-    locale = get_locale()
-    if locale in TRANSLATIONS and text in TRANSLATIONS[locale]:
-        return TRANSLATIONS[locale][text]
-    return text
+# One upload plus the rest of its form; larger requests are refused before
+# their body is read
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_SIZE + 256 * 1024
 
 db.init_app(app)
 login_manager.init_app(app)
 csrf.init_app(app)
+i18n.init_app(app)
+perf.init_app(app)
 login_manager.login_view = 'login'
 
 # Make helpers available to templates
-app.jinja_env.globals.update(get_locale=get_locale, _=translate)
-
-@app.template_filter('b64encode')
-def b64encode_filter(data):
-    if data:
-        return base64.b64encode(data).decode('utf-8')
-    return ''
+app.jinja_env.globals.update(media_url=media_url,
+                             responsive_image=responsive_image,
+                             image_src=image_src,
+                             image_srcset=image_srcset,
+                             image_status=image_status)
 
 @app.after_request
 def add_cache_control(response):
+    # Responses that set their own caching policy (/media, admin sync,
+    # gallery pages) keep it
+    if (response.cache_control.immutable or response.cache_control.private
+            or response.cache_control.max_age is not None):
+        return response
     # Add proper caching headers for static files
     if response.content_type:
         if 'text/css' in response.content_type:
@@ -94,3 +76,7 @@ with app.app_context():
     import models
     import routes
     db.create_all()
+
+if os.environ.get('JOBS_RUN_IN_PROCESS'):
+    from jobs import start_worker_thread
+    start_worker_thread(app)
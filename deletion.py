@@ -0,0 +1,163 @@
+"""
+Set-based bulk deletion for Yalla
+
+Deletes rows together with everything that depends on them, children
+first (comments -> reviews / photos -> restaurants / users), using IN lists of at
+most DELETE_BATCH_SIZE ids. The number of statements grows with the
+number of batches, not rows.
+
+Query-level deletes skip ORM cascades and mapper events, so these
+functions also write the sync tombstones and update the rating
+aggregates, user stats and badges, leaderboard rows and search indexes
+that the events would have kept current. Each returns a dict of row
+counts by kind. Nothing here commits.
+"""
+
+from app import db
+from models import (User, Restaurant, RestaurantPhoto, Review, ReviewComment,
+                    Cuisine, News, UserBadge, ReputationEvent, LeaderboardEntry,
+                    DeletedRecord)
+from search import note_bulk_changes
+
+DELETE_BATCH_SIZE = 500
+
+
+def batched(ids, size=DELETE_BATCH_SIZE):
+    """Yield the distinct ids in sorted lists of at most size"""
+    ids = sorted({i for i in ids if i is not None})
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def _select_in(query, column, ids):
+    rows = []
+    for batch in batched(ids):
+        rows.extend(query.filter(column.in_(batch)).all())
+    return rows
+
+
+def _delete_in(model, column, ids):
+    deleted = 0
+    for batch in batched(ids):
+        deleted += model.query.filter(column.in_(batch)).delete(
+            synchronize_session=False)
+    return deleted
+
+
+def _update_in(model, column, ids, values):
+    updated = 0
+    for batch in batched(ids):
+        updated += model.query.filter(column.in_(batch)).update(
+            values, synchronize_session=False)
+    return updated
+
+
+def _refresh_users(user_ids):
+    """Recompute stats, badges and leaderboard rows for authors who lost
+    reviews"""
+    for batch in batched(user_ids):
+        User.reconcile_stats(batch)
+        User.recompute_badges(batch)
+        LeaderboardEntry.refresh(batch)
+
+
+def _delete_review_rows(review_ids):
+    counts = {
+        'comments': _delete_in(ReviewComment, ReviewComment.review_id,
+                               review_ids),
+        'reviews': _delete_in(Review, Review.id, review_ids)
+    }
+    DeletedRecord.record('review', review_ids)
+    return counts
+
+
+def delete_reviews(review_ids):
+    """Delete reviews and their comments"""
+    rows = _select_in(
+        db.session.query(Review.id, Review.user_id, Review.restaurant_id,
+                         Review.is_approved), Review.id, review_ids)
+    counts = _delete_review_rows([row.id for row in rows])
+    approved = [row for row in rows if row.is_approved]
+    for batch in batched(row.restaurant_id for row in approved):
+        Restaurant.reconcile_rating_aggregates(batch)
+    _refresh_users(row.user_id for row in approved)
+    return counts
+
+
+def delete_restaurants(restaurant_ids):
+    """Delete restaurants with their photos, reviews and those reviews'
+    comments"""
+    restaurants = _select_in(
+        db.session.query(Restaurant.id, Restaurant.user_id), Restaurant.id,
+        restaurant_ids)
+    restaurant_ids = [row.id for row in restaurants]
+    reviews = _select_in(
+        db.session.query(Review.id, Review.user_id, Review.is_approved),
+        Review.restaurant_id, restaurant_ids)
+    counts = _delete_review_rows([row.id for row in reviews])
+    counts['photos'] = _delete_in(RestaurantPhoto,
+                                  RestaurantPhoto.restaurant_id,
+                                  restaurant_ids)
+    counts['restaurants'] = _delete_in(Restaurant, Restaurant.id,
+                                       restaurant_ids)
+    DeletedRecord.record('restaurant', restaurant_ids)
+    note_bulk_changes('restaurant', ((ref, None) for ref in restaurant_ids))
+    _refresh_users({row.user_id for row in reviews if row.is_approved}
+                   | {row.user_id for row in restaurants})
+    return counts
+
+
+def delete_users(user_ids, successor_id):
+    """Delete users and their badges, ledger and leaderboard rows.
+
+    Their reviews, comments, photos and restaurant submissions stay up
+    without an author, as when a single user is deleted. News posts require an author
+    and are handed over to successor_id.
+    """
+    user_ids = [
+        row.id for row in _select_in(db.session.query(User.id), User.id,
+                                     user_ids) if row.id != successor_id
+    ]
+    counts = {
+        'reviews_kept':
+        _update_in(Review, Review.user_id, user_ids, {'user_id': None}),
+        'comments_kept':
+        _update_in(ReviewComment, ReviewComment.user_id, user_ids,
+                   {'user_id': None}),
+        'news_reassigned':
+        _update_in(News, News.user_id, user_ids, {'user_id': successor_id})
+    }
+    _update_in(Review, Review.approved_by_id, user_ids,
+               {'approved_by_id': None})
+    _update_in(RestaurantPhoto, RestaurantPhoto.user_id, user_ids,
+               {'user_id': None})
+    _update_in(Restaurant, Restaurant.user_id, user_ids, {'user_id': None})
+    _update_in(Restaurant, Restaurant.approved_by_id, user_ids,
+               {'approved_by_id': None})
+    # The foreign keys cascade on PostgreSQL; deleting explicitly keeps
+    # SQLite, which doesn't enforce them by default, consistent
+    counts['badges'] = _delete_in(UserBadge, UserBadge.user_id, user_ids)
+    _delete_in(ReputationEvent, ReputationEvent.user_id, user_ids)
+    counts['users'] = _delete_in(User, User.id, user_ids)
+    DeletedRecord.record('user', user_ids)
+    # With the users gone, refreshing drops their rows and closes the gaps
+    for batch in batched(user_ids):
+        LeaderboardEntry.refresh(batch)
+    return counts
+
+
+def delete_cuisines(cuisine_ids):
+    """Delete cuisines that no restaurant uses; used ones are skipped"""
+    in_use = {
+        row.cuisine_id
+        for row in _select_in(
+            db.session.query(Restaurant.cuisine_id).distinct(),
+            Restaurant.cuisine_id, cuisine_ids)
+    }
+    cuisine_ids = [ref for ref in set(cuisine_ids) if ref not in in_use]
+    counts = {
+        'cuisines': _delete_in(Cuisine, Cuisine.id, cuisine_ids),
+        'cuisines_in_use': len(in_use)
+    }
+    note_bulk_changes('cuisine', ((ref, None) for ref in cuisine_ids))
+    return counts
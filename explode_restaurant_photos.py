@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Database migration script to move gallery photos into restaurant_photo
+
+Restaurant galleries used to live in the restaurant.photos JSON array,
+rewritten whole on every upload. This creates the restaurant_photo table
+and inserts one row per array entry, mapping the uploader's username to
+their user id and keeping the upload time so the gallery order is
+unchanged. Entries still holding inline base64 data are moved into the
+blob store on the way. Each restaurant's array is cleared in the same
+transaction as its rows are inserted, so the script is safe to re-run.
+The emptied photos column is left in place and can be dropped later.
+"""
+
+import json
+from datetime import datetime
+
+from app import app, db
+from migrate_images_to_blob_store import id_batches, store_base64
+from models import RestaurantPhoto, User
+from sqlalchemy import bindparam, inspect, text
+
+
+def parse_uploaded_at(value, default):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def user_ids_by_name(usernames):
+    usernames = {name for name in usernames if name}
+    if not usernames:
+        return {}
+    return dict(
+        db.session.query(User.username, User.id).filter(
+            User.username.in_(usernames)))
+
+
+def explode_restaurant_photos():
+    """Insert a restaurant_photo row for every photo in restaurant.photos"""
+    with app.app_context():
+        try:
+            RestaurantPhoto.__table__.create(db.engine, checkfirst=True)
+            columns = {c['name'] for c in inspect(db.engine).get_columns('restaurant')}
+            if 'photos' not in columns:
+                print("✓ restaurant.photos already removed")
+                return
+            moved = 0
+            skipped = 0
+            for ids in id_batches(
+                    "SELECT id FROM restaurant WHERE photos IS NOT NULL"):
+                rows = db.session.execute(
+                    text('SELECT id, photos, created_at FROM restaurant WHERE id IN :ids').bindparams(
+                        bindparam('ids', expanding=True)), {'ids': ids}).all()
+                galleries = []
+                for restaurant_id, photos, created_at in rows:
+                    if isinstance(photos, str):
+                        photos = json.loads(photos)
+                    galleries.append((restaurant_id, photos or [], created_at))
+                user_ids = user_ids_by_name(
+                    photo.get('uploaded_by') for _, photos, _ in galleries
+                    for photo in photos)
+                new_rows = []
+                for restaurant_id, photos, created_at in galleries:
+                    for photo in photos:
+                        if photo.get('hash'):
+                            image_hash = photo['hash']
+                        elif photo.get('data'):
+                            image_hash = store_base64(photo['data'])
+                        else:
+                            skipped += 1
+                            continue
+                        new_rows.append({
+                            'restaurant_id': restaurant_id,
+                            'image_hash': image_hash,
+                            'user_id': user_ids.get(photo.get('uploaded_by')),
+                            'created_at': parse_uploaded_at(
+                                photo.get('uploaded_at'), created_at
+                                or datetime.utcnow())
+                        })
+                if new_rows:
+                    db.session.execute(RestaurantPhoto.__table__.insert(),
+                                       new_rows)
+                db.session.execute(
+                    text('UPDATE restaurant SET photos = NULL WHERE id IN :ids').bindparams(
+                        bindparam('ids', expanding=True)),
+                    {'ids': [restaurant_id for restaurant_id, _, _ in galleries]})
+                db.session.commit()
+                moved += len(new_rows)
+            print(f"✓ Moved {moved} gallery photo(s) into restaurant_photo")
+            if skipped:
+                print(f"  {skipped} entry(ies) without image data were dropped")
+        except Exception as e:
+            print(f"Error moving gallery photos: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    explode_restaurant_photos()
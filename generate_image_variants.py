@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Maintenance script to generate responsive variants for stored images
+
+Images uploaded before the multi-resolution pipeline exist as a single
+blob. This re-encodes each one that has no ImageVariant rows yet at the
+widths of its profile (see images.IMAGE_PROFILES), keyed by the hash the
+row already stores, so no model column changes. Blobs that are missing
+or can't be decoded are reported and skipped. Safe to re-run.
+"""
+
+from app import app, db
+from images import generate_variants
+from media import get_blob_store
+from models import User, Restaurant, RestaurantPhoto, Review, ImageVariant
+
+BATCH_SIZE = 50
+
+
+def stored_images():
+    """(hash, profile) for every image referenced by a row"""
+    images = {}
+    for (image_hash, ) in db.session.query(Restaurant.image_hash).filter(
+            Restaurant.image_hash.isnot(None)):
+        images.setdefault(image_hash, 'cover')
+    for (image_hash, ) in db.session.query(RestaurantPhoto.image_hash):
+        images.setdefault(image_hash, 'photo')
+    for (image_hash, ) in db.session.query(User.profile_picture_hash).filter(
+            User.profile_picture_hash.isnot(None)):
+        images.setdefault(image_hash, 'avatar')
+    for (image_hash, ) in db.session.query(Review.receipt_image_hash).filter(
+            Review.receipt_image_hash.isnot(None)):
+        images.setdefault(image_hash, 'receipt')
+    return images
+
+
+def generate_image_variants():
+    """Generate variants for every stored image that has none"""
+    with app.app_context():
+        try:
+            images = stored_images()
+            done = {
+                row[0]
+                for row in db.session.query(ImageVariant.image_hash).distinct()
+            }
+            pending = sorted(h for h in images if h not in done)
+            print(f"{len(pending)} of {len(images)} images need variants")
+            store = get_blob_store()
+            generated = 0
+            for start in range(0, len(pending), BATCH_SIZE):
+                for image_hash in pending[start:start + BATCH_SIZE]:
+                    data = store.get(image_hash)
+                    if data is None:
+                        print(f"  missing blob {image_hash}, skipped")
+                        continue
+                    try:
+                        generate_variants(data, images[image_hash], image_hash)
+                    except ValueError as e:
+                        print(f"  {image_hash}: {e}, skipped")
+                        continue
+                    generated += 1
+                db.session.commit()
+            print(f"✓ Generated variants for {generated} images")
+        except Exception as e:
+            print(f"Error generating image variants: {e}")
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    generate_image_variants()
@@ -0,0 +1,178 @@
+"""
+Translations for Yalla
+
+Each supported locale has a translations/<locale>.json file mapping
+English source strings to their translation. The files are validated and
+compiled at startup into read-only lookups; a malformed file stops the
+app from starting instead of silently rendering untranslated pages.
+
+The locale is resolved once per request and kept in g.locale, and
+templates get a _() bound to that locale's lookup, so the hundreds of _()
+calls on a page are plain dict lookups.
+
+With TRANSLATIONS_AUTO_RELOAD set (meant for development), a background
+thread polls the JSON files and swaps in a recompiled catalog when one
+changes. A file that fails validation while reloading is reported and the
+previous catalog stays in use.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from flask import g, request
+from flask_login import current_user
+
+SUPPORTED_LOCALES = ('en', 'ar')
+DEFAULT_LOCALE = 'en'
+TRANSLATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'translations')
+TRANSLATIONS_RELOAD_INTERVAL = float(
+    os.environ.get('TRANSLATIONS_RELOAD_INTERVAL', 1))
+
+logger = logging.getLogger(__name__)
+
+EMPTY_CATALOG = MappingProxyType({})
+
+
+class TranslationError(ValueError):
+    """A translation file is missing required structure"""
+
+
+def load_catalog(path):
+    """Read and validate one translation file into a read-only mapping.
+
+    A missing file is an empty catalog (every string falls back to
+    English). Anything other than a JSON object of non-empty string keys
+    to string values raises TranslationError.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.warning('Translation file %s not found', path)
+        return EMPTY_CATALOG
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise TranslationError(f'{path}: {e}') from e
+    if not isinstance(data, dict):
+        raise TranslationError(f'{path}: expected a JSON object')
+    for key, value in data.items():
+        if not key:
+            raise TranslationError(f'{path}: empty source string')
+        if not isinstance(value, str):
+            raise TranslationError(
+                f'{path}: translation of {key!r} is not a string')
+    return MappingProxyType(dict(data))
+
+
+class TranslationCatalog:
+    """Compiled lookups for every supported locale"""
+
+    def __init__(self, directory, locales):
+        self.directory = directory
+        self.locales = locales
+        self._catalogs = MappingProxyType({})
+        self._mtimes = {}
+        self._watcher = None
+
+    def _path(self, locale):
+        return os.path.join(self.directory, f'{locale}.json')
+
+    def _file_mtimes(self):
+        mtimes = {}
+        for locale in self.locales:
+            try:
+                mtimes[locale] = os.path.getmtime(self._path(locale))
+            except OSError:
+                mtimes[locale] = None
+        return mtimes
+
+    def load(self):
+        """Compile every locale's file; raises TranslationError on bad files"""
+        mtimes = self._file_mtimes()
+        catalogs = {
+            locale: load_catalog(self._path(locale))
+            for locale in self.locales
+        }
+        # Swapping one reference keeps readers on a consistent catalog
+        self._catalogs = MappingProxyType(catalogs)
+        self._mtimes = mtimes
+
+    def lookup(self, locale):
+        """Read-only mapping of source string to translation for locale"""
+        return self._catalogs.get(locale, EMPTY_CATALOG)
+
+    def translate(self, locale, text):
+        return self.lookup(locale).get(text, text)
+
+    def reload_if_changed(self):
+        """Recompile when a file changed; keep the old catalog if it's bad"""
+        if self._file_mtimes() == self._mtimes:
+            return False
+        try:
+            self.load()
+        except TranslationError as e:
+            logger.error('Keeping previous translations: %s', e)
+            # Don't report the same broken file on every poll
+            self._mtimes = self._file_mtimes()
+            return False
+        logger.info('Reloaded translations from %s', self.directory)
+        return True
+
+    def start_watcher(self, interval=TRANSLATIONS_RELOAD_INTERVAL):
+        """Poll the translation files from a daemon thread"""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch,
+                                         name='translations-reload',
+                                         daemon=True)
+        self._watcher.start()
+
+
+translations = TranslationCatalog(TRANSLATIONS_DIR, SUPPORTED_LOCALES)
+
+
+def resolve_locale():
+    """Locale for this request from user preference, cookie, or default"""
+    if current_user.is_authenticated:
+        locale = current_user.language
+    else:
+        locale = request.cookies.get('language')
+    return locale if locale in SUPPORTED_LOCALES else DEFAULT_LOCALE
+
+
+def get_locale():
+    """Current locale, resolved on first use and cached in g"""
+    locale = g.get('locale')
+    if locale is None:
+        locale = g.locale = resolve_locale()
+    return locale
+
+
+def translate(text):
+    """Translate text to current locale"""
+    return translations.translate(get_locale(), text)
+
+
+def translation_context():
+    """Template context with _() bound to the request's locale lookup"""
+    lookup = translations.lookup(get_locale())
+    return {'_': lambda text: lookup.get(text, text)}
+
+
+def init_app(app):
+    """Compile the catalogs and install the template helpers"""
+    translations.load()
+    app.jinja_env.globals.update(get_locale=get_locale, _=translate)
+    app.context_processor(translation_context)
+    if os.environ.get('TRANSLATIONS_AUTO_RELOAD'):
+        translations.start_watcher()
@@ -0,0 +1,403 @@
+"""
+Responsive image pipeline for Yalla
+
+An upload is decoded once, turned upright from its EXIF orientation and
+re-encoded at every width of its profile as WebP plus a JPEG fallback.
+Re-encoding also drops the uploader's metadata (location, camera). Each
+rendition is a blob of its own, recorded as an ImageVariant with its
+dimensions under the hash of the upload, which is what model columns
+store. Pages link renditions only, never the upload itself.
+
+Uploads are read through read_upload(), which streams the file in
+chunks and stops as soon as it passes MAX_UPLOAD_SIZE, then checked by
+inspect_upload(): the type comes from the file's magic bytes (never the
+client's Content-Type) and the pixel dimensions from its header, so
+oversized or disguised files are rejected before anything is decoded.
+
+Uploads are stored as they arrived and rendered by a background job
+(VARIANT_JOB, see tasks.py), so the request returns without decoding the
+image. Until the job has run, image_status() reports 'processing' and
+templates show the fallback image instead of the unprocessed upload.
+Images stored before the pipeline existed have no variants or job
+('original') and are served from their blob until
+generate_image_variants.py has run.
+
+Templates call responsive_image() for a lazily loaded <picture> with
+WebP and JPEG srcsets and intrinsic dimensions, or image_src() for one
+URL near a given width (CSS backgrounds, JSON).
+
+A hash's variants never change once written, so lookups are cached per
+worker. Views rendering many images call preload_variants() first to
+fetch them in one query.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+
+from media import store_blob, media_url, sniff_image_type
+
+# Uploads larger than this are rejected while still being read
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Largest image accepted, by side and by area, read from the header
+MAX_IMAGE_DIMENSION = 8000
+MAX_IMAGE_PIXELS = 40_000_000
+ALLOWED_IMAGE_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
+# Pillow format names of the accepted types
+PIL_FORMAT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp'
+}
+# EXIF orientations that turn the image a quarter, swapping its sides
+EXIF_ORIENTATION = 0x0112
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+# Widths generated for each use of an image
+IMAGE_PROFILES = {
+    'cover': (320, 640, 1280),
+    'photo': (480, 960, 1600),
+    'avatar': (96, 192, 384),
+    'receipt': (1024, 2048),
+}
+
+# (format name, Pillow encoder, encoder options), preferred format first
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+VARIANT_MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+# Job that renders an upload's variants
+VARIANT_JOB = 'image_variants'
+
+# image_status() values
+IMAGE_READY = 'ready'
+IMAGE_PROCESSING = 'processing'
+IMAGE_FAILED = 'failed'
+IMAGE_ORIGINAL = 'original'
+
+VARIANT_CACHE_SIZE = 4096
+# Images without variants are looked up again after this many seconds,
+# in case their variants have been generated since
+MISSING_VARIANTS_TTL = 30.0
+
+
+def read_upload(stream, limit=MAX_UPLOAD_SIZE):
+    """Read an uploaded file in chunks, at most limit bytes.
+
+    Raises ValueError as soon as the file turns out to be larger, without
+    reading the rest of it.
+    """
+    chunks = []
+    size = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise ValueError(
+                f'File size exceeds {limit // (1024 * 1024)}MB limit')
+        chunks.append(chunk)
+    return b''.join(chunks)
+
+
+def _check_dimensions(width, height):
+    if (width > MAX_IMAGE_DIMENSION or height > MAX_IMAGE_DIMENSION
+            or width * height > MAX_IMAGE_PIXELS):
+        raise ValueError(f'Image dimensions {width}x{height} are too large '
+                         f'(max {MAX_IMAGE_DIMENSION} pixels per side)')
+
+
+def inspect_upload(data):
+    """Check an upload's type and dimensions without decoding its pixels.
+
+    Returns the MIME type sniffed from the magic bytes. Raises ValueError
+    for unsupported types, files whose contents don't match their magic
+    bytes, and images larger than MAX_IMAGE_DIMENSION / MAX_IMAGE_PIXELS.
+    """
+    mime_type = sniff_image_type(data[:16])
+    if mime_type not in ALLOWED_IMAGE_TYPES:
+        raise ValueError('Only JPEG, PNG, GIF and WebP images are allowed')
+    try:
+        # Image.open parses the header only; pixels are decoded on load()
+        with Image.open(BytesIO(data)) as image:
+            image_type = PIL_FORMAT_TYPES.get(image.format)
+            width, height = image.size
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError('Unreadable image file') from e
+    if image_type != mime_type:
+        raise ValueError('Unreadable image file')
+    _check_dimensions(width, height)
+    return mime_type
+
+
+def _open_for_widths(data, widths):
+    """Open an image for rendering at widths, decoding JPEGs at reduced
+    scale when the widest rendition doesn't need every pixel"""
+    image = Image.open(BytesIO(data))
+    _check_dimensions(*image.size)
+    if image.format == 'JPEG':
+        width, height = image.size
+        shown_width = width
+        if image.getexif().get(EXIF_ORIENTATION) in TRANSPOSED_ORIENTATIONS:
+            shown_width = height
+        scale = max(widths) / shown_width
+        if scale < 1:
+            # libjpeg decodes at 1/2, 1/4 or 1/8 scale, never below size
+            image.draft(image.mode, (math.ceil(width * scale),
+                                     math.ceil(height * scale)))
+    return image
+
+
+def _renditions(image, widths):
+    """The image at each profile width it can fill without upscaling"""
+    for width in sorted({min(width, image.width) for width in widths}):
+        if width == image.width:
+            yield image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            yield image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def _encode(image, encoder, options):
+    if encoder == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    output = BytesIO()
+    image.save(output, encoder, **options)
+    return output.getvalue()
+
+
+def generate_variants(data, profile, image_hash):
+    """Encode the image stored as image_hash at every width of profile.
+
+    Adds ImageVariant rows to the session; does not commit. Raises
+    ValueError for data Pillow can't decode or that is too large.
+    """
+    widths = IMAGE_PROFILES[profile]
+    try:
+        image = ImageOps.exif_transpose(_open_for_widths(data, widths))
+        image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f'Unreadable image: {e}') from e
+    variants = []
+    for rendition in _renditions(image, widths):
+        for name, encoder, options in VARIANT_FORMATS:
+            encoded = _encode(rendition, encoder, options)
+            variants.append({
+                'format': name,
+                'width': rendition.width,
+                'height': rendition.height,
+                'byte_size': len(encoded),
+                'blob_hash': store_blob(encoded)
+            })
+    record_variants(image_hash, variants)
+
+
+def record_variants(image_hash, variants):
+    """Insert the variants image_hash doesn't have yet; does not commit"""
+    from app import db
+    from models import ImageVariant
+    existing = set(
+        db.session.query(ImageVariant.format, ImageVariant.width).filter(
+            ImageVariant.image_hash == image_hash))
+    rows = [
+        dict(variant, image_hash=image_hash) for variant in variants
+        if (variant['format'], variant['width']) not in existing
+    ]
+    if rows:
+        db.session.execute(ImageVariant.__table__.insert(), rows)
+    variant_cache.discard(image_hash)
+
+
+class VariantCache:
+    """Per-worker LRU of each image hash's (status, variants).
+
+    Ready images stay until evicted; other statuses are remembered for
+    MISSING_VARIANTS_TTL seconds only.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_hash):
+        with self._lock:
+            entry = self._entries.get(image_hash)
+            if entry is None:
+                return None
+            info, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[image_hash]
+                return None
+            self._entries.move_to_end(image_hash)
+            return info
+
+    def set(self, image_hash, status, variants):
+        expires_at = (None if status == IMAGE_READY else time.monotonic() +
+                      MISSING_VARIANTS_TTL)
+        with self._lock:
+            self._entries[image_hash] = ((status, variants), expires_at)
+            self._entries.move_to_end(image_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, image_hash):
+        with self._lock:
+            self._entries.pop(image_hash, None)
+
+
+variant_cache = VariantCache(VARIANT_CACHE_SIZE)
+
+
+def preload_variants(image_hashes):
+    """Load the variants of every uncached hash in one query, and the job
+    status of those without variants in a second"""
+    from app import db
+    from models import ImageVariant, Job
+    missing = {h for h in image_hashes if h and variant_cache.get(h) is None}
+    if not missing:
+        return
+    found = {image_hash: [] for image_hash in missing}
+    for row in db.session.query(
+            ImageVariant.image_hash, ImageVariant.format, ImageVariant.width,
+            ImageVariant.height, ImageVariant.blob_hash).filter(
+                ImageVariant.image_hash.in_(missing)).order_by(
+                    ImageVariant.width):
+        found[row.image_hash].append((row.format, row.width, row.height,
+                                      row.blob_hash))
+    unrendered = [h for h, variants in found.items() if not variants]
+    job_statuses = {}
+    if unrendered:
+        # Ordered by id so the newest job for a hash wins
+        for ref, status in db.session.query(Job.ref, Job.status).filter(
+                Job.name == VARIANT_JOB,
+                Job.ref.in_(unrendered)).order_by(Job.id):
+            job_statuses[ref] = status
+    for image_hash, variants in found.items():
+        if variants:
+            status = IMAGE_READY
+        elif job_statuses.get(image_hash) == 'failed':
+            status = IMAGE_FAILED
+        elif image_hash in job_statuses:
+            status = IMAGE_PROCESSING
+        else:
+            status = IMAGE_ORIGINAL
+        variant_cache.set(image_hash, status, tuple(variants))
+
+
+def _lookup(image_hash):
+    info = variant_cache.get(image_hash)
+    if info is None:
+        preload_variants([image_hash])
+        info = variant_cache.get(image_hash) or (IMAGE_ORIGINAL, ())
+    return info
+
+
+def image_status(image_hash):
+    """'ready', 'processing', 'failed' or 'original' (stored before the
+    pipeline, served as is); None without an image"""
+    if not image_hash:
+        return None
+    return _lookup(image_hash)[0]
+
+
+def _unprocessed_url(image_hash):
+    """The stored blob, unless it's an upload still waiting for its job"""
+    if image_status(image_hash) == IMAGE_ORIGINAL:
+        return media_url(image_hash)
+    return None
+
+
+def variants_for(image_hash, format=None):
+    """(format, width, height, blob_hash) tuples of an image, narrowest first"""
+    if not image_hash:
+        return ()
+    variants = _lookup(image_hash)[1]
+    if format is not None:
+        variants = tuple(v for v in variants if v[0] == format)
+    return variants
+
+
+def _pick(variants, width):
+    """Narrowest variant at least width wide, else the widest"""
+    for variant in variants:
+        if variant[1] >= width:
+            return variant
+    return variants[-1]
+
+
+def _srcset(variants):
+    return ', '.join(f'{media_url(blob_hash)} {width}w'
+                     for _, width, _, blob_hash in variants)
+
+
+def image_src(image_hash, width=640, fallback=None):
+    """URL of the JPEG rendition nearest width, else the stored blob"""
+    jpeg = variants_for(image_hash, 'jpeg')
+    if jpeg:
+        return media_url(_pick(jpeg, width)[3])
+    return _unprocessed_url(image_hash) or fallback
+
+
+def image_srcset(image_hash, format='jpeg'):
+    """srcset value listing an image's renditions in format, or ''"""
+    return _srcset(variants_for(image_hash, format))
+
+
+def _attributes(attrs):
+    return ''.join(f' {name.rstrip("_").replace("_", "-")}="{escape(value)}"'
+                   for name, value in attrs.items() if value is not None)
+
+
+def responsive_image(image_hash, alt='', sizes='100vw', fallback=None,
+                     lazy=True, **attrs):
+    """<picture> offering WebP and JPEG renditions sized for the layout.
+
+    sizes is the rendered width for the browser to pick a rendition by.
+    Images without variants render as a plain <img> of the stored blob,
+    or of fallback (a URL) while there is no image to show yet. Extra keyword
+    arguments become attributes of the <img> (class_ for class).
+    """
+    loading = {'loading': 'lazy'} if lazy else {}
+    jpeg = variants_for(image_hash, 'jpeg')
+    if not jpeg:
+        src = _unprocessed_url(image_hash) or fallback
+        if not src:
+            return Markup('')
+        return Markup('<img{}>'.format(
+            _attributes(dict(src=src, alt=alt, decoding='async', **loading,
+                             **attrs))))
+    widest = jpeg[-1]
+    img = _attributes(
+        dict(src=media_url(_pick(jpeg, 640)[3]),
+             srcset=_srcset(jpeg),
+             sizes=sizes,
+             width=widest[1],
+             height=widest[2],
+             alt=alt,
+             decoding='async',
+             **loading,
+             **attrs))
+    sources = ''.join(
+        '<source type="{}" srcset="{}" sizes="{}">'.format(
+            VARIANT_MIME_TYPES[name], escape(_srcset(variants)), escape(sizes))
+        for name, variants in ((name, variants_for(image_hash, name))
+                               for name, _, _ in VARIANT_FORMATS
+                               if name != 'jpeg') if variants)
+    return Markup(f'<picture>{sources}<img{img}></picture>')
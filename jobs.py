@@ -0,0 +1,277 @@
+"""
+Background jobs for Yalla
+
+A job queue kept in the application database, so no broker is needed.
+enqueue() adds a Job row to the current session; it becomes visible to
+workers when the request's transaction commits, and not at all if it
+rolls back. worker.py (the Procfile's worker process) claims due jobs with
+a conditional UPDATE, so several workers never run the same job, and runs
+the function registered for the job's name with @task. Failures are
+retried with backoff up to JOB_MAX_ATTEMPTS times, then left as 'failed'
+with the error for inspection. Jobs whose worker died mid-run are put
+back after JOB_TIMEOUT seconds.
+
+Some state lives in each process's memory (the page cache, feature
+toggles, image variant lookups), which one worker running a job can't
+clear for the others. broadcast() records a message that every process
+applies to itself through its @broadcast_handler function; web workers
+poll for new messages at most every BROADCAST_POLL_INTERVAL seconds,
+re-reading a BROADCAST_OVERLAP window so late commits aren't missed.
+
+Setting JOBS_RUN_IN_PROCESS runs a worker thread inside the web process
+instead, for development or single-process deployments.
+"""
+
+import os
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from app import db
+from models import Job
+
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 300))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+BROADCAST_POLL_INTERVAL = float(os.environ.get('BROADCAST_POLL_INTERVAL', 2))
+# Broadcasts created this long before a poll are read again, covering
+# transactions that committed out of id order or clocks that disagree
+BROADCAST_OVERLAP = timedelta(seconds=30)
+# Finished jobs and broadcasts are kept this long for inspection
+JOB_RETENTION = timedelta(days=7)
+BROADCAST_RETENTION = timedelta(hours=1)
+
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_BROADCAST = 'broadcast'
+
+_tasks = {}
+_broadcast_handlers = {}
+
+
+def task(name):
+    """Register the decorated function as the handler for jobs named name.
+
+    Handlers get the job's payload as keyword arguments and must not
+    commit; the worker commits their changes together with the job's
+    status.
+    """
+
+    def register(func):
+        _tasks[name] = func
+        return func
+
+    return register
+
+
+def broadcast_handler(name):
+    """Register the decorated function for broadcasts named name"""
+
+    def register(func):
+        _broadcast_handlers[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, payload=None, ref=None, delay=0):
+    """Queue a job to run after the current transaction commits"""
+    job = Job(name=name,
+              payload=payload or {},
+              ref=ref,
+              status=STATUS_PENDING,
+              run_after=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+
+def broadcast(name, payload=None):
+    """Have every process run name's broadcast handler; commits with the
+    current transaction"""
+    job = Job(name=name, payload=payload or {}, status=STATUS_BROADCAST)
+    db.session.add(job)
+    return job
+
+
+def job_status(ref, name=None):
+    """Status of the newest job for ref, or None if there is none"""
+    query = db.session.query(Job.status).filter(Job.ref == ref)
+    if name is not None:
+        query = query.filter(Job.name == name)
+    return query.order_by(Job.id.desc()).limit(1).scalar()
+
+
+def _release_stale_jobs(now):
+    Job.query.filter(
+        Job.status == STATUS_RUNNING,
+        Job.locked_at < now - timedelta(seconds=JOB_TIMEOUT)).update(
+            {'status': STATUS_PENDING}, synchronize_session=False)
+
+
+def claim_next():
+    """Mark the oldest due job as running and return it, or None"""
+    now = datetime.utcnow()
+    _release_stale_jobs(now)
+    db.session.commit()
+    candidates = db.session.query(Job.id).filter(
+        Job.status == STATUS_PENDING, Job.run_after <= now).order_by(
+            Job.run_after, Job.id).limit(10).all()
+    for (job_id, ) in candidates:
+        # Only one worker's UPDATE matches while the job is still pending
+        claimed = Job.query.filter(
+            Job.id == job_id, Job.status == STATUS_PENDING).update(
+                {
+                    'status': STATUS_RUNNING,
+                    'locked_at': now,
+                    'attempts': Job.attempts + 1
+                },
+                synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+    return None
+
+
+def run_job(job):
+    """Run one claimed job and record the outcome"""
+    handler = _tasks.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f'No task registered for {job.name!r}')
+        handler(**(job.payload or {}))
+    except Exception:
+        db.session.rollback()
+        job = db.session.get(Job, job.id)
+        job.last_error = traceback.format_exc(limit=5)
+        if job.attempts >= JOB_MAX_ATTEMPTS or handler is None:
+            job.status = STATUS_FAILED
+            job.finished_at = datetime.utcnow()
+        else:
+            job.status = STATUS_PENDING
+            job.run_after = datetime.utcnow() + timedelta(
+                seconds=2**job.attempts)
+        db.session.commit()
+        return False
+    job.status = STATUS_DONE
+    job.finished_at = datetime.utcnow()
+    job.last_error = None
+    db.session.commit()
+    return True
+
+
+def run_pending(limit=None):
+    """Run due jobs until none are left (or limit ran); returns the count"""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+def prune_jobs():
+    """Delete finished jobs and old broadcasts past their retention"""
+    now = datetime.utcnow()
+    Job.query.filter(Job.status == STATUS_DONE,
+                     Job.finished_at < now - JOB_RETENTION).delete(
+                         synchronize_session=False)
+    Job.query.filter(Job.status == STATUS_BROADCAST,
+                     Job.created_at < now - BROADCAST_RETENTION).delete(
+                         synchronize_session=False)
+    db.session.commit()
+
+
+class BroadcastListener:
+    """Applies new broadcasts to this process, polling at most every
+    interval seconds.
+
+    Ids are taken from the sequence at INSERT, so a broadcast can commit
+    after one with a higher id has been read. Each poll therefore re-reads
+    the broadcasts created within BROADCAST_OVERLAP before the previous
+    poll and skips the ids it has already applied.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.since = None
+        # id -> created_at of broadcasts applied within the overlap
+        self._seen = {}
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _recent(self, since):
+        return db.session.query(
+            Job.id, Job.name, Job.payload, Job.created_at).filter(
+                Job.status == STATUS_BROADCAST,
+                Job.created_at >= since - BROADCAST_OVERLAP).order_by(Job.id)
+
+    def poll(self, force=False):
+        if (not force
+                and time.monotonic() - self._checked_at < self.interval):
+            return 0
+        with self._lock:
+            self._checked_at = time.monotonic()
+            now = datetime.utcnow()
+            if self.since is None:
+                # A new process starts with empty caches; only later
+                # broadcasts concern it
+                self._seen = {m.id: m.created_at for m in self._recent(now)}
+                self.since = now
+                return 0
+            applied = 0
+            for message in self._recent(self.since):
+                if message.id in self._seen:
+                    continue
+                handler = _broadcast_handlers.get(message.name)
+                if handler is not None:
+                    handler(**(message.payload or {}))
+                self._seen[message.id] = message.created_at
+                applied += 1
+            self.since = now
+            cutoff = now - BROADCAST_OVERLAP
+            self._seen = {
+                message_id: created_at
+                for message_id, created_at in self._seen.items()
+                if created_at is None or created_at >= cutoff
+            }
+            return applied
+
+
+broadcast_listener = BroadcastListener(BROADCAST_POLL_INTERVAL)
+
+
+def work(app, poll_interval=JOB_POLL_INTERVAL, stop=None):
+    """Run jobs until stop is set, sleeping poll_interval when idle"""
+    stop = stop or threading.Event()
+    last_pruned = 0.0
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                broadcast_listener.poll()
+                ran = run_pending(limit=100)
+                if time.monotonic() - last_pruned > 3600:
+                    prune_jobs()
+                    last_pruned = time.monotonic()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Job worker error')
+                ran = 0
+            finally:
+                db.session.remove()
+        if not ran:
+            stop.wait(poll_interval)
+
+
+def start_worker_thread(app):
+    """Run a job worker in a daemon thread of this process"""
+    thread = threading.Thread(target=work,
+                              args=(app, ),
+                              name='job-worker',
+                              daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,127 @@
+"""
+Media Blob Store for Yalla
+Content-addressed storage for uploaded images.
+
+Blobs are keyed by the SHA-256 hex digest of their bytes, so identical
+uploads are stored once and the bytes behind a key never change. Models
+store only the key; images are served from the /media/<hash> route.
+
+The default backend writes to the local filesystem under MEDIA_ROOT.
+Other backends (object storage, a shared volume) can implement BlobStore
+and be installed with set_blob_store().
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import url_for
+
+BLOB_HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+def is_blob_hash(value):
+    """Check that value looks like a SHA-256 hex digest"""
+    return bool(value) and bool(BLOB_HASH_PATTERN.match(value))
+
+
+def sniff_image_type(data):
+    """Return the image MIME type from the leading magic bytes, or None"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+class BlobStore:
+    """Interface for content-addressed blob storage backends"""
+
+    def put(self, data):
+        """Store bytes and return their SHA-256 hex digest"""
+        raise NotImplementedError
+
+    def get(self, blob_hash):
+        """Return the stored bytes for blob_hash, or None if missing"""
+        raise NotImplementedError
+
+    def exists(self, blob_hash):
+        return self.get(blob_hash) is not None
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under root, fanned out by the first two hex digits"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, blob_hash):
+        return os.path.join(self.root, blob_hash[:2], blob_hash)
+
+    def put(self, data):
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self._path(blob_hash)
+        if os.path.exists(path):
+            return blob_hash
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_hash
+
+    def get(self, blob_hash):
+        if not is_blob_hash(blob_hash):
+            return None
+        try:
+            with open(self._path(blob_hash), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, blob_hash):
+        return is_blob_hash(blob_hash) and os.path.exists(self._path(blob_hash))
+
+
+_blob_store = None
+
+
+def get_blob_store():
+    """Return the active blob store, creating the local default on first use"""
+    global _blob_store
+    if _blob_store is None:
+        root = os.environ.get(
+            'MEDIA_ROOT',
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'media'))
+        _blob_store = LocalBlobStore(root)
+    return _blob_store
+
+
+def set_blob_store(store):
+    """Install a different BlobStore backend"""
+    global _blob_store
+    _blob_store = store
+
+
+def store_blob(data):
+    """Store bytes in the active blob store and return their hash"""
+    return get_blob_store().put(data)
+
+
+def media_url(blob_hash):
+    """URL for a stored blob, or None when there is no blob"""
+    if not blob_hash:
+        return None
+    return url_for('media', blob_hash=blob_hash)
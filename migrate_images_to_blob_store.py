@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Database migration script to move inline images into the media blob store
+
+Adds the hash columns, then extracts the base64 / binary image data still
+stored in restaurant.image_url (data: URIs), restaurant.photos,
+review.receipt_image and user.profile_picture into the blob store. Each
+row keeps only the blob hash and the legacy column is cleared. Rows are
+processed in id batches so memory stays bounded. Safe to re-run.
+"""
+
+import base64
+import json
+
+from app import app, db
+from media import store_blob
+from sqlalchemy import bindparam, inspect, text
+
+BATCH_SIZE = 100
+
+HASH_COLUMNS = {
+    'restaurant': 'image_hash',
+    'review': 'receipt_image_hash',
+    'user': 'profile_picture_hash',
+}
+
+
+def add_hash_columns():
+    """Add blob hash columns if they don't exist"""
+    inspector = inspect(db.engine)
+    for table_name, column_name in HASH_COLUMNS.items():
+        existing = {c['name'] for c in inspector.get_columns(table_name)}
+        if column_name in existing:
+            print(f"✓ {table_name}.{column_name} column already exists")
+            continue
+        print(f"Adding {column_name} column to {table_name} table...")
+        db.session.execute(text(
+            f'ALTER TABLE "{table_name}" ADD COLUMN {column_name} VARCHAR(64)'))
+    db.session.commit()
+
+
+def has_column(table_name, column_name):
+    return column_name in {c['name'] for c in inspect(db.engine).get_columns(table_name)}
+
+
+def id_batches(sql):
+    """Yield lists of ids selected by sql in batches of BATCH_SIZE"""
+    ids = [row[0] for row in db.session.execute(text(sql))]
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+def store_base64(value):
+    """Store a base64 string (optionally a data: URI) and return its hash"""
+    if value.startswith('data:'):
+        value = value.split(',', 1)[1]
+    return store_blob(base64.b64decode(value))
+
+
+def migrate_restaurant_images():
+    moved = 0
+    for ids in id_batches(
+            "SELECT id FROM restaurant WHERE image_url LIKE 'data:%'"):
+        rows = db.session.execute(
+            text('SELECT id, image_url FROM restaurant WHERE id IN :ids').bindparams(
+                bindparam('ids', expanding=True)), {'ids': ids})
+        for restaurant_id, image_url in rows:
+            db.session.execute(
+                text('UPDATE restaurant SET image_hash = :hash, image_url = NULL WHERE id = :id'),
+                {'hash': store_base64(image_url), 'id': restaurant_id})
+            moved += 1
+        db.session.commit()
+    print(f"✓ Moved {moved} restaurant cover image(s)")
+
+
+def migrate_restaurant_photos():
+    moved = 0
+    for ids in id_batches("SELECT id FROM restaurant WHERE photos IS NOT NULL"):
+        rows = db.session.execute(
+            text('SELECT id, photos FROM restaurant WHERE id IN :ids').bindparams(
+                bindparam('ids', expanding=True)), {'ids': ids})
+        for restaurant_id, photos in rows:
+            if isinstance(photos, str):
+                photos = json.loads(photos)
+            if not photos or not any('data' in p for p in photos):
+                continue
+            for photo in photos:
+                if 'data' in photo:
+                    photo['hash'] = store_base64(photo.pop('data'))
+                    photo['content_type'] = 'image/png'
+                    moved += 1
+            db.session.execute(
+                text('UPDATE restaurant SET photos = :photos WHERE id = :id'),
+                {'photos': json.dumps(photos), 'id': restaurant_id})
+        db.session.commit()
+    print(f"✓ Moved {moved} restaurant gallery photo(s)")
+
+
+def migrate_receipt_images():
+    if not has_column('review', 'receipt_image'):
+        print("✓ review.receipt_image already removed")
+        return
+    moved = 0
+    for ids in id_batches(
+            "SELECT id FROM review WHERE receipt_image IS NOT NULL"):
+        rows = db.session.execute(
+            text('SELECT id, receipt_image FROM review WHERE id IN :ids').bindparams(
+                bindparam('ids', expanding=True)), {'ids': ids})
+        for review_id, receipt_image in rows:
+            db.session.execute(
+                text('UPDATE review SET receipt_image_hash = :hash, receipt_image = NULL WHERE id = :id'),
+                {'hash': store_base64(receipt_image), 'id': review_id})
+            moved += 1
+        db.session.commit()
+    print(f"✓ Moved {moved} receipt image(s)")
+
+
+def migrate_profile_pictures():
+    if not has_column('user', 'profile_picture'):
+        print("✓ user.profile_picture already removed")
+        return
+    moved = 0
+    for ids in id_batches(
+            'SELECT id FROM "user" WHERE profile_picture IS NOT NULL'):
+        rows = db.session.execute(
+            text('SELECT id, profile_picture FROM "user" WHERE id IN :ids').bindparams(
+                bindparam('ids', expanding=True)), {'ids': ids})
+        for user_id, profile_picture in rows:
+            db.session.execute(
+                text('UPDATE "user" SET profile_picture_hash = :hash, profile_picture = NULL WHERE id = :id'),
+                {'hash': store_blob(bytes(profile_picture)), 'id': user_id})
+            moved += 1
+        db.session.commit()
+    print(f"✓ Moved {moved} profile picture(s)")
+
+
+def migrate_images_to_blob_store():
+    """Extract inline image data from all tables into the blob store"""
+    with app.app_context():
+        try:
+            add_hash_columns()
+            migrate_restaurant_images()
+            migrate_restaurant_photos()
+            migrate_receipt_images()
+            migrate_profile_pictures()
+        except Exception as e:
+            print(f"Error migrating images: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    migrate_images_to_blob_store()
@@ -1,9 +1,28 @@
+import os
+import time
 from app import db
+from images import image_src
 from flask_login import UserMixin
+from sqlalchemy import event, inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone, timedelta
 
 
+def _update_in_database(obj, **values):
+    """Assign SQL expressions to obj's columns and flush them at once.
+
+    The UPDATE is computed from the current column values, so concurrent
+    changes don't overwrite each other. Flushing straight away lets a
+    second call build on the first instead of replacing it, and reading
+    the attributes afterwards loads the new numbers rather than returning
+    the expressions.
+    """
+    for name, value in values.items():
+        setattr(obj, name, value)
+    session = inspect(obj).session
+    if session is not None and inspect(obj).persistent:
+        session.flush()
+
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -12,22 +31,38 @@ class User(UserMixin, db.Model):
                          nullable=False,
                          index=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(256), nullable=False)
+    # Columns only a few views need are deferred so load_user and
+    # listings don't fetch them; those views undefer the 'profile' group
+    password_hash = db.deferred(db.Column(db.String(256), nullable=False),
+                                group='profile')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime,
+                           default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           index=True)
     is_admin = db.Column(db.Boolean, default=False, index=True)
     is_banned = db.Column(db.Boolean, default=False, index=True)
-    ban_reason = db.Column(db.Text)
+    ban_reason = db.deferred(db.Column(db.Text), group='profile')
     reputation_score = db.Column(db.Integer, default=0, index=True)
     
     __table_args__ = (
         db.Index('idx_user_admin_banned_reputation', 'is_admin', 'is_banned', 'reputation_score'),
     )
     badge = db.Column(db.String(50))
-    bio = db.Column(db.Text, default='')
-    profile_picture = db.Column(db.LargeBinary)
+    bio = db.deferred(db.Column(db.Text, default=''), group='profile')
+    profile_picture_hash = db.Column(db.String(64))  # Blob store key
     dark_mode = db.Column(db.Boolean, default=False)
     language = db.Column(db.String(10), default='en')
 
+    # Denormalized stats over the user's approved reviews and submissions
+    approved_review_count = db.Column(db.Integer, default=0, nullable=False, server_default='0', index=True)
+    review_rating_sum = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    submitted_restaurant_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+
+    # Bumped whenever a PRINCIPAL_COLUMNS value or the password changes, so
+    # sessions holding a snapshot of those fields know to reload it
+    session_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+
     reviews = db.relationship('Review', foreign_keys='Review.user_id', backref='author', lazy='dynamic')
 
     def set_password(self, password):
@@ -37,13 +72,12 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def review_count(self):
-        return self.reviews.filter(Review.is_approved == True).count()
+        return self.approved_review_count or 0
 
     def avg_rating_given(self):
-        reviews = self.reviews.filter(Review.is_approved == True).all()
-        if not reviews:
+        if not self.approved_review_count:
             return 0
-        return sum(r.rating for r in reviews) / len(reviews)
+        return (self.review_rating_sum or 0) / self.approved_review_count
 
     def calculate_reputation(self):
         rc = self.review_count()
@@ -53,7 +87,11 @@ class User(UserMixin, db.Model):
 
     def get_badge(self):
         """Get badge based on review count"""
-        review_count = self.review_count()
+        return User.badge_for_review_count(self.review_count())
+
+    @staticmethod
+    def badge_for_review_count(review_count):
+        """Map an approved review count to its badge tier name"""
         if review_count >= 50:
             return 'Elite Foodie'
         elif review_count >= 30:
@@ -73,37 +111,134 @@ class User(UserMixin, db.Model):
         self.assign_auto_badges()
 
     def assign_auto_badges(self):
-        """Automatically assign badges based on review count"""
-        from models import Badge, UserBadge
-
-        # Badge thresholds (review_count -> badge_name)
-        badge_mappings = [
-            (50, 'Elite Foodie'),
-            (30, 'Expert Reviewer'),
-            (15, 'Experienced Diner'),
-            (8, 'Rising Critic'),
-            (3, 'Food Explorer'),
-            (0, 'Newcomer'),
-        ]
-
-        review_count = self.review_count()
-
-        for threshold, badge_name in badge_mappings:
-            if review_count >= threshold:
-                # Find badge by name
-                badge = Badge.query.filter_by(name=badge_name).first()
-                if badge:
-                    # Check if user already has this badge
-                    existing = UserBadge.query.filter_by(
-                        user_id=self.id, badge_id=badge.id).first()
-                    if not existing:
-                        # Remove previous tier badges (only keep highest tier)
-                        UserBadge.query.filter_by(user_id=self.id).delete()
-                        # Assign new badge
-                        user_badge = UserBadge(user_id=self.id,
-                                               badge_id=badge.id)
-                        db.session.add(user_badge)
-                break
+        """Automatically assign the badge for the user's review count tier"""
+        badge = Badge.query.filter_by(name=self.get_badge()).first()
+        if badge:
+            # Check if user already has this badge
+            existing = UserBadge.query.filter_by(user_id=self.id,
+                                                 badge_id=badge.id).first()
+            if not existing:
+                # Remove previous tier badges (only keep highest tier)
+                UserBadge.query.filter_by(user_id=self.id).delete()
+                db.session.add(UserBadge(user_id=self.id, badge_id=badge.id))
+
+    @staticmethod
+    def recompute_badges(user_ids):
+        """update_reputation() for many users in a fixed number of queries.
+
+        Reads the stat counters, so apply or reconcile them first. Does not
+        commit.
+        """
+        from sqlalchemy import update
+        user_ids = [user_id for user_id in set(user_ids) if user_id]
+        if not user_ids:
+            return
+        tiers = {
+            user_id: User.badge_for_review_count(count or 0)
+            for user_id, count in db.session.query(
+                User.id, User.approved_review_count).filter(
+                    User.id.in_(user_ids))
+        }
+        if not tiers:
+            return
+        db.session.execute(
+            update(User).where(User.id.in_(list(tiers))).values(
+                badge=db.case(tiers, value=User.id)).execution_options(
+                    synchronize_session=False))
+
+        badge_ids = dict(
+            db.session.query(Badge.name, Badge.id).filter(
+                Badge.name.in_(set(tiers.values()))))
+        held = set(
+            db.session.query(UserBadge.user_id, UserBadge.badge_id).filter(
+                UserBadge.user_id.in_(list(tiers))))
+        # As in assign_auto_badges, a new tier replaces the user's badges
+        missing = {
+            user_id: badge_ids[name]
+            for user_id, name in tiers.items()
+            if name in badge_ids and (user_id, badge_ids[name]) not in held
+        }
+        if missing:
+            UserBadge.query.filter(UserBadge.user_id.in_(list(missing))).delete(
+                synchronize_session=False)
+            now = datetime.utcnow()
+            db.session.execute(UserBadge.__table__.insert(), [{
+                'user_id': user_id,
+                'badge_id': badge_id,
+                'assigned_at': now
+            } for user_id, badge_id in missing.items()])
+
+    def apply_review_rating(self, rating, delta):
+        """Add (delta=1) or remove (delta=-1) an approved review's rating.
+
+        Issued as a single UPDATE against the current column values, like
+        Restaurant.apply_review_rating.
+        """
+        _update_in_database(
+            self,
+            approved_review_count=User.approved_review_count + delta,
+            review_rating_sum=User.review_rating_sum + rating * delta)
+
+    def apply_restaurant_submission(self, delta):
+        """Count (delta=1) or uncount (delta=-1) a submitted restaurant"""
+        _update_in_database(
+            self,
+            submitted_restaurant_count=User.submitted_restaurant_count + delta)
+
+    @staticmethod
+    def set_preferences(user_id, **values):
+        """Update principal columns of one user without loading the row.
+
+        Bumps session_version in the same UPDATE, as the ORM path does in
+        _bump_session_version. Does not commit.
+        """
+        values['session_version'] = User.session_version + 1
+        User.query.filter(User.id == user_id).update(
+            values, synchronize_session=False)
+
+    @staticmethod
+    def reconcile_stats(user_ids=None):
+        """Recompute review and submission counters in grouped passes.
+
+        Recomputes every user when user_ids is None. Does not commit.
+        """
+        from sqlalchemy import func, update
+        reviews = db.session.query(
+            Review.user_id, func.count(Review.id),
+            func.coalesce(func.sum(Review.rating), 0)).filter(
+                Review.is_approved == True, Review.user_id.isnot(None))
+        restaurants = db.session.query(
+            Restaurant.user_id, func.count(Restaurant.id)).filter(
+                Restaurant.user_id.isnot(None))
+        reset = update(User).values(approved_review_count=0,
+                                    review_rating_sum=0,
+                                    submitted_restaurant_count=0)
+        if user_ids is not None:
+            user_ids = [user_id for user_id in set(user_ids) if user_id]
+            if not user_ids:
+                return 0
+            reviews = reviews.filter(Review.user_id.in_(user_ids))
+            restaurants = restaurants.filter(Restaurant.user_id.in_(user_ids))
+            reset = reset.where(User.id.in_(user_ids))
+        stats = {}
+        for user_id, count, total in reviews.group_by(Review.user_id):
+            stats[user_id] = {
+                'id': user_id,
+                'approved_review_count': count,
+                'review_rating_sum': int(total),
+                'submitted_restaurant_count': 0
+            }
+        for user_id, count in restaurants.group_by(Restaurant.user_id):
+            stats.setdefault(user_id, {
+                'id': user_id,
+                'approved_review_count': 0,
+                'review_rating_sum': 0
+            })['submitted_restaurant_count'] = count
+
+        db.session.execute(reset)
+        if stats:
+            db.session.execute(update(User), list(stats.values()))
+        return len(stats)
     
     def get_highest_hierarchy_badge(self):
         """Get the badge with highest hierarchy for this user"""
@@ -112,6 +247,28 @@ class User(UserMixin, db.Model):
             return None
         return max(user_badges, key=lambda ub: ub.badge.hierarchy).badge
 
+    @staticmethod
+    def highest_hierarchy_badges(user_ids):
+        """Map user id -> highest hierarchy Badge for many users in one query.
+
+        Ties go to the earliest assigned badge, as in
+        get_highest_hierarchy_badge().
+        """
+        if not user_ids:
+            return {}
+        ranked = db.session.query(
+            UserBadge.user_id, UserBadge.badge_id,
+            db.func.row_number().over(
+                partition_by=UserBadge.user_id,
+                order_by=(Badge.hierarchy.desc(),
+                          UserBadge.id)).label('rank')).join(
+                              Badge, UserBadge.badge_id == Badge.id).filter(
+                                  UserBadge.user_id.in_(user_ids)).subquery()
+        return dict(
+            db.session.query(ranked.c.user_id, Badge).join(
+                Badge, Badge.id == ranked.c.badge_id).filter(
+                    ranked.c.rank == 1).all())
+
 
 class Cuisine(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -134,30 +291,43 @@ class Restaurant(db.Model):
     description = db.Column(db.Text)
     address = db.Column(db.String(200))
     phone = db.Column(db.String(20))
-    working_hours = db.Column(db.String(500))
+    # Detail-page columns are deferred so listings don't fetch them;
+    # restaurant_detail and the admin views undefer the 'details' group
+    working_hours = db.deferred(db.Column(db.String(500)), group='details')
     price_range = db.Column(db.Integer, default=2, index=True)
     cuisine_id = db.Column(db.Integer,
                            db.ForeignKey('cuisine.id'),
                            nullable=False,
                            index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
-    image_url = db.Column(db.String(500))
+    image_url = db.Column(db.String(500))  # External image URL
+    image_hash = db.Column(db.String(64))  # Blob store key for uploaded image
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime,
+                           default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           index=True)
     is_small_business = db.Column(db.Boolean, default=False)
     is_approved = db.Column(db.Boolean, default=True, index=True)
     is_promoted = db.Column(db.Boolean, default=False, index=True)
     
     __table_args__ = (
         db.Index('idx_restaurant_approval_promotion', 'is_approved', 'is_promoted', 'created_at'),
+        db.Index('idx_restaurant_approval_created', 'is_approved', 'created_at', 'id'),
         db.Index('idx_restaurant_cuisine_approval', 'cuisine_id', 'is_approved'),
     )
-    food_categories = db.Column(db.JSON, default=list)
-    photos = db.Column(db.JSON, default=list)
+    food_categories = db.deferred(db.Column(db.JSON, default=list),
+                                  group='details')
     location_latitude = db.Column(db.Float)
     location_longitude = db.Column(db.Float)
     approved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
 
+    # Denormalized rating aggregates over approved reviews
+    rating_sum = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    approved_review_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    avg_rating = db.Column(db.Float, default=0, nullable=False, server_default='0')
+
     submitter = db.relationship('User',
                                 backref='submitted_restaurants',
                                 foreign_keys=[user_id])
@@ -168,6 +338,15 @@ class Restaurant(db.Model):
                               backref='restaurant',
                               lazy='dynamic',
                               cascade='all, delete-orphan')
+    photos = db.relationship('RestaurantPhoto',
+                             backref='restaurant',
+                             lazy='dynamic',
+                             cascade='all, delete-orphan')
+
+    @property
+    def cover_image_url(self):
+        """URL of the uploaded cover image, falling back to image_url"""
+        return image_src(self.image_hash, 1280, self.image_url)
 
     def get_formatted_hours(self):
         """Parse JSON working_hours and return formatted dict, or fallback"""
@@ -179,15 +358,96 @@ class Restaurant(db.Model):
         except (json.JSONDecodeError, TypeError):
             return {}
 
-    def avg_rating(self):
-        from sqlalchemy import func
-        from app import db
-        result = db.session.query(func.avg(Review.rating)).filter(
-            Review.restaurant_id == self.id, Review.is_approved == True).scalar()
-        return round(float(result), 1) if result else 0
-
     def review_count(self):
-        return self.reviews.filter(Review.is_approved == True).count()
+        return self.approved_review_count or 0
+
+    def apply_review_rating(self, rating, delta):
+        """Add (delta=1) or remove (delta=-1) an approved review's rating.
+
+        Issued as a single UPDATE against the current column values so
+        concurrent approvals don't overwrite each other.
+        """
+        new_sum = Restaurant.rating_sum + rating * delta
+        new_count = Restaurant.approved_review_count + delta
+        _update_in_database(
+            self,
+            rating_sum=new_sum,
+            approved_review_count=new_count,
+            avg_rating=db.case(
+                (new_count > 0, db.cast(new_sum, db.Float) / new_count),
+                else_=0.0))
+
+    @staticmethod
+    def reconcile_rating_aggregates(restaurant_ids=None):
+        """Recompute rating aggregates from Review in one grouped pass.
+
+        Recomputes every restaurant when restaurant_ids is None. Does not commit.
+        """
+        from sqlalchemy import func, update
+        totals = db.session.query(
+            Review.restaurant_id,
+            func.count(Review.id),
+            func.coalesce(func.sum(Review.rating), 0)
+        ).filter(Review.is_approved == True)
+        if restaurant_ids is not None:
+            restaurant_ids = list(restaurant_ids)
+            if not restaurant_ids:
+                return 0
+            totals = totals.filter(Review.restaurant_id.in_(restaurant_ids))
+        totals = {rid: (count, total) for rid, count, total in
+                  totals.group_by(Review.restaurant_id).all()}
+
+        reset = update(Restaurant).values(rating_sum=0,
+                                          approved_review_count=0,
+                                          avg_rating=0)
+        if restaurant_ids is not None:
+            reset = reset.where(Restaurant.id.in_(restaurant_ids))
+        db.session.execute(reset)
+        if totals:
+            db.session.execute(update(Restaurant), [{
+                'id': rid,
+                'rating_sum': int(total),
+                'approved_review_count': count,
+                'avg_rating': float(total) / count
+            } for rid, (count, total) in totals.items()])
+        return len(totals)
+
+
+class RestaurantPhoto(db.Model):
+    """A gallery photo; one row per upload, so adding one is an INSERT"""
+    id = db.Column(db.Integer, primary_key=True)
+    restaurant_id = db.Column(db.Integer,
+                              db.ForeignKey('restaurant.id'),
+                              nullable=False)
+    image_hash = db.Column(db.String(64), nullable=False)  # Blob store key
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Gallery order: a restaurant's photos newest first, keyset-paginated
+        db.Index('idx_restaurant_photo_order', 'restaurant_id', 'created_at',
+                 'id'),
+    )
+
+    uploader = db.relationship('User', backref='restaurant_photos')
+
+    @staticmethod
+    def gallery_page(restaurant_id, before=None, limit=12):
+        """Up to limit photos newest first, after the (created_at, id)
+        position before; uploaders are loaded in the same query"""
+        from sqlalchemy import and_, or_
+        from sqlalchemy.orm import joinedload
+        query = RestaurantPhoto.query.options(
+            joinedload(RestaurantPhoto.uploader)).filter(
+                RestaurantPhoto.restaurant_id == restaurant_id)
+        if before is not None:
+            created_at, photo_id = before
+            query = query.filter(
+                or_(RestaurantPhoto.created_at < created_at,
+                    and_(RestaurantPhoto.created_at == created_at,
+                         RestaurantPhoto.id < photo_id)))
+        return query.order_by(RestaurantPhoto.created_at.desc(),
+                              RestaurantPhoto.id.desc()).limit(limit).all()
 
 
 class Review(db.Model):
@@ -196,6 +456,10 @@ class Review(db.Model):
     title = db.Column(db.String(100))
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime,
+                           default=datetime.utcnow,
+                           onupdate=datetime.utcnow,
+                           index=True)
     food_category = db.Column(db.String(100))
 
     user_id = db.Column(db.Integer,
@@ -211,7 +475,7 @@ class Review(db.Model):
     is_approved = db.Column(db.Boolean, default=False, index=True)
     approved_by_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     approved_at = db.Column(db.DateTime, nullable=True)
-    receipt_image = db.Column(db.Text, nullable=True)  # Base64 encoded receipt photo
+    receipt_image_hash = db.Column(db.String(64), nullable=True)  # Blob store key of receipt photo
     receipt_confirmed = db.Column(db.Boolean, default=False, index=True)  # Receipt verified by admin
 
     __table_args__ = (
@@ -223,6 +487,13 @@ class Review(db.Model):
                                backref='approved_reviews',
                                foreign_keys=[approved_by_id])
 
+    def apply_approval(self, delta):
+        """Add (delta=1) or remove (delta=-1) this approved review from the
+        restaurant's rating aggregates and the author's stats"""
+        self.restaurant.apply_review_rating(self.rating, delta)
+        if self.author:
+            self.author.apply_review_rating(self.rating, delta)
+
     def formatted_date(self):
         return self.created_at.strftime('%B %d, %Y')
 
@@ -344,6 +615,256 @@ class FeatureToggle(db.Model):
 
     @staticmethod
     def get_feature_status(feature_name):
-        toggle = FeatureToggle.query.filter_by(
-            feature_name=feature_name).first()
-        return toggle.is_enabled if toggle else True
+        return feature_toggle_registry.is_enabled(feature_name)
+
+    @staticmethod
+    def invalidate_cache():
+        """Drop this worker's cached toggles after a toggle row changes"""
+        feature_toggle_registry.invalidate()
+
+
+class FeatureToggleRegistry:
+    """In-process cache of every FeatureToggle row.
+
+    All rows are loaded in one query and served from memory. Writes in this
+    worker call invalidate(); other gunicorn workers pick up the change when
+    their copy expires after ttl seconds.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._toggles = None
+        self._loaded_at = 0.0
+
+    def is_enabled(self, feature_name):
+        toggles = self._toggles
+        if toggles is None or time.monotonic() - self._loaded_at > self.ttl:
+            toggles = self._load()
+        # Missing toggles default to enabled
+        return toggles.get(feature_name, True)
+
+    def snapshot(self):
+        """Every toggle's state as a sorted tuple, for response validators"""
+        toggles = self._toggles
+        if toggles is None or time.monotonic() - self._loaded_at > self.ttl:
+            toggles = self._load()
+        return tuple(sorted(toggles.items()))
+
+    def invalidate(self):
+        self._toggles = None
+
+    def _load(self):
+        rows = db.session.query(FeatureToggle.feature_name,
+                                FeatureToggle.is_enabled).all()
+        toggles = {name: bool(enabled) for name, enabled in rows}
+        self._toggles = toggles
+        self._loaded_at = time.monotonic()
+        return toggles
+
+
+feature_toggle_registry = FeatureToggleRegistry(
+    ttl=float(os.environ.get('FEATURE_TOGGLE_CACHE_TTL', 5)))
+
+
+class ReputationEvent(db.Model):
+    """One entry in the reputation ledger.
+
+    Every change to User.reputation_score is recorded here with its reason
+    and the id of the row that caused it, so the score can be audited and
+    rebuilt as the sum of a user's deltas (see reputation.replay_reputation).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer,
+                        db.ForeignKey('user.id', ondelete='CASCADE'),
+                        nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(50), nullable=False, index=True)
+    source_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_reputation_event_user', 'user_id', 'created_at'),
+    )
+
+
+class LeaderboardEntry(db.Model):
+    """Snapshot of one user's standing on the leaderboard.
+
+    Holds every non-admin, non-banned user with reputation above zero,
+    ranked 1..n by reputation (ties broken by user id), so the leaderboard
+    page is one range scan on rank. refresh() updates individual users when
+    their reputation or reviews change; rebuild() recomputes the table.
+    """
+    user_id = db.Column(db.Integer,
+                        db.ForeignKey('user.id', ondelete='CASCADE'),
+                        primary_key=True)
+    rank = db.Column(db.Integer, nullable=False, index=True)
+    reputation_score = db.Column(db.Integer, nullable=False, default=0)
+    approved_review_count = db.Column(db.Integer, nullable=False, default=0)
+    avg_rating_given = db.Column(db.Float, nullable=False, default=0)
+    badge = db.Column(db.String(50))
+    updated_at = db.Column(db.DateTime,
+                           default=datetime.utcnow,
+                           onupdate=datetime.utcnow)
+
+    user = db.relationship('User')
+
+    @staticmethod
+    def _standings(user_ids=None):
+        """Entry rows for eligible users, read from the user stat counters"""
+        query = db.session.query(
+            User.id, User.reputation_score, User.approved_review_count,
+            User.review_rating_sum).filter(User.is_admin == False,
+                                           User.is_banned == False,
+                                           User.reputation_score > 0)
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        now = datetime.utcnow()
+        return [{
+            'user_id': user_id,
+            'rank': 0,
+            'reputation_score': reputation_score,
+            'approved_review_count': review_count,
+            'avg_rating_given':
+            rating_sum / review_count if review_count else 0.0,
+            'badge': User.badge_for_review_count(review_count),
+            'updated_at': now
+        } for user_id, reputation_score, review_count, rating_sum in query]
+
+    @staticmethod
+    def _rerank():
+        """Renumber ranks in one statement, writing only rows that moved"""
+        from sqlalchemy import func, select, update
+        ranked = select(
+            LeaderboardEntry.user_id,
+            func.row_number().over(order_by=(
+                LeaderboardEntry.reputation_score.desc(),
+                LeaderboardEntry.user_id)).label('position')).subquery()
+        db.session.execute(
+            update(LeaderboardEntry).where(
+                LeaderboardEntry.user_id == ranked.c.user_id,
+                LeaderboardEntry.rank != ranked.c.position).values(
+                    rank=ranked.c.position).execution_options(
+                        synchronize_session=False))
+
+    @staticmethod
+    def refresh(user_ids):
+        """Re-snapshot the given users and re-rank. Does not commit."""
+        from sqlalchemy import delete, insert
+        user_ids = [user_id for user_id in set(user_ids) if user_id]
+        if not user_ids:
+            return
+        db.session.execute(
+            delete(LeaderboardEntry).where(
+                LeaderboardEntry.user_id.in_(user_ids)))
+        rows = LeaderboardEntry._standings(user_ids)
+        if rows:
+            db.session.execute(insert(LeaderboardEntry), rows)
+        LeaderboardEntry._rerank()
+
+    @staticmethod
+    def rebuild():
+        """Recompute the whole leaderboard. Does not commit."""
+        from sqlalchemy import delete, insert
+        db.session.execute(delete(LeaderboardEntry))
+        rows = LeaderboardEntry._standings()
+        if rows:
+            db.session.execute(insert(LeaderboardEntry), rows)
+        LeaderboardEntry._rerank()
+        return len(rows)
+
+
+class ImageVariant(db.Model):
+    """One resized, re-encoded rendition of an uploaded image.
+
+    image_hash is the key stored on the owning row (a restaurant cover,
+    profile picture, gallery photo or receipt) and blob_hash the
+    rendition's own blob. Written by images.generate_variants.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    image_hash = db.Column(db.String(64), nullable=False, index=True)
+    format = db.Column(db.String(10), nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    byte_size = db.Column(db.Integer, nullable=False)
+    blob_hash = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('image_hash', 'format', 'width',
+                            name='uq_image_variant'),
+        # /media looks up which image a rendition belongs to
+        db.Index('idx_image_variant_blob', 'blob_hash'),
+    )
+
+
+class Job(db.Model):
+    """A unit of background work, run by worker.py (see jobs.py).
+
+    Broadcast rows (status 'broadcast') are never claimed; every process
+    applies them to its own in-memory state instead.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, default=dict)
+    # What the job works on, e.g. an image hash, for status lookups
+    ref = db.Column(db.String(64), nullable=True, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('idx_job_status_run_after', 'status',
+                               'run_after'), )
+
+
+class DeletedRecord(db.Model):
+    """Tombstone left when a synced row is deleted.
+
+    Lets the admin dashboard's incremental sync tell clients which rows to
+    drop. Written by the after_delete listeners below and by bulk deletes,
+    which bypass ORM events.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def record(table_name, record_ids, connection=None):
+        """Insert tombstones for record_ids; does not commit"""
+        rows = [{'table_name': table_name,
+                 'record_id': record_id,
+                 'deleted_at': datetime.utcnow()} for record_id in record_ids]
+        if not rows:
+            return
+        if connection is None:
+            db.session.execute(DeletedRecord.__table__.insert(), rows)
+        else:
+            connection.execute(DeletedRecord.__table__.insert(), rows)
+
+
+# User fields kept in each session's principal snapshot (see principal.py)
+PRINCIPAL_COLUMNS = ('username', 'is_admin', 'is_banned', 'dark_mode',
+                     'language')
+
+
+def _bump_session_version(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in PRINCIPAL_COLUMNS + ('password_hash',)):
+        target.session_version = User.session_version + 1
+
+
+event.listen(User, 'before_update', _bump_session_version)
+
+
+def _record_deletion(mapper, connection, target):
+    DeletedRecord.record(mapper.local_table.name, [target.id], connection)
+
+
+for _model in (User, Restaurant, Review):
+    event.listen(_model, 'after_delete', _record_deletion)
@@ -0,0 +1,289 @@
+"""
+Response cache for anonymous public pages
+
+Pages wrapped in @cached_page are rendered once per (endpoint, view
+args, query string, locale) and served from the cache to anonymous
+visitors until the entry expires (PAGE_CACHE_TTL seconds) or is evicted
+(least recently used beyond PAGE_CACHE_SIZE entries). Logged-in users,
+requests with pending flash messages and responses that aren't plain
+200 HTML pages without session changes always go to the view.
+
+Entries keep the view's ETag and Last-Modified headers, so a hit answers
+conditional requests with 304 as the view would.
+
+Committed writes to any table the public pages show clear the cache, in
+the same way the search indexes follow ORM and bulk writes. The default
+backend lives in each worker's memory, so other workers catch up on
+their own TTL. Setting PAGE_CACHE_REDIS_URL (requires the redis package)
+shares one cache, and its invalidation, across all workers.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request, session
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from i18n import get_locale
+
+PAGE_CACHE_TTL = float(os.environ.get('PAGE_CACHE_TTL', 60))
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+
+# Tables whose rows appear on cached pages
+PUBLIC_TABLES = frozenset(('restaurant', 'review', 'review_comment', 'news',
+                           'cuisine', 'food_category', 'leaderboard_entry',
+                           'feature_toggle', 'badge', 'user_badge',
+                           'image_variant', 'restaurant_photo'))
+# User columns shown on public pages; other user changes (dark mode,
+# language, password) leave cached pages valid
+PUBLIC_USER_COLUMNS = ('username', 'badge', 'profile_picture_hash',
+                       'is_banned', 'is_admin', 'reputation_score',
+                       'approved_review_count', 'review_rating_sum')
+
+# Response headers stored with a cached body so hits stay revalidatable
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+class MemoryCacheBackend:
+    """Thread-safe in-process LRU map with a per-entry expiry"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache shared by every worker through Redis.
+
+    Entries expire through Redis TTLs and eviction follows the server's
+    maxmemory policy (configure allkeys-lru). clear() bumps a generation
+    number that is part of every key, so all workers drop the old entries
+    at once without scanning for them.
+    """
+
+    def __init__(self, url, namespace='yalla:page'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def _key(self, key):
+        generation = self.client.get(f'{self.namespace}:generation') or b'0'
+        return f'{self.namespace}:{generation.decode()}:{key}'
+
+    def get(self, key):
+        value = self.client.get(self._key(key))
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(self._key(key), pickle.dumps(value), ex=int(ttl))
+
+    def clear(self):
+        self.client.incr(f'{self.namespace}:generation')
+
+    def __len__(self):
+        return 0
+
+
+class PageCache:
+    """Cached page bodies plus this worker's hit and miss counters"""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.by_endpoint = {}
+
+    def _count(self, endpoint, hit):
+        counts = self.by_endpoint.setdefault(endpoint, [0, 0])
+        if hit:
+            self.hits += 1
+            counts[0] += 1
+        else:
+            self.misses += 1
+            counts[1] += 1
+
+    def get(self, endpoint, key):
+        value = self.backend.get(key)
+        self._count(endpoint, value is not None)
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl)
+
+    def invalidate(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': len(self.backend),
+            'ttl': self.ttl,
+            'endpoints': {
+                endpoint: {'hits': hits, 'misses': misses}
+                for endpoint, (hits, misses) in sorted(self.by_endpoint.items())
+            }
+        }
+
+
+def _make_backend():
+    redis_url = os.environ.get('PAGE_CACHE_REDIS_URL')
+    if redis_url:
+        return RedisCacheBackend(redis_url)
+    return MemoryCacheBackend(PAGE_CACHE_SIZE)
+
+
+page_cache = PageCache(_make_backend(), PAGE_CACHE_TTL)
+
+
+def _is_cacheable_request():
+    return (request.method == 'GET' and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+
+def _cache_key():
+    args = '&'.join(f'{name}={value}'
+                    for name, value in sorted(request.args.items(multi=True)))
+    view_args = ','.join(f'{name}={value}'
+                         for name, value in sorted(request.view_args.items()))
+    return f'{request.endpoint}|{view_args}|{args}|{get_locale()}'
+
+
+def cached_page(view):
+    """Serve anonymous GETs of view from page_cache"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _is_cacheable_request():
+            return view(*args, **kwargs)
+        key = _cache_key()
+        cached = page_cache.get(request.endpoint, key)
+        if cached is not None:
+            body, mimetype, headers = cached
+            response = Response(body, mimetype=mimetype, headers=headers)
+            response.headers['X-Cache'] = 'HIT'
+            # Answer If-None-Match / If-Modified-Since from the stored
+            # validators without running the view
+            return response.make_conditional(request)
+        response = view(*args, **kwargs)
+        if isinstance(response, str):
+            response = Response(response, mimetype='text/html')
+        if (isinstance(response, Response) and response.status_code == 200
+                and response.mimetype == 'text/html'
+                and not session.modified
+                and 'Set-Cookie' not in response.headers):
+            headers = [(name, value) for name, value in response.headers
+                       if name in VALIDATOR_HEADERS]
+            page_cache.set(key,
+                           (response.get_data(), response.mimetype, headers))
+            response.headers['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def _touches_public_rows(obj):
+    table = getattr(inspect(obj).mapper.local_table, 'name', None)
+    if table in PUBLIC_TABLES:
+        return True
+    if table == 'user':
+        state = inspect(obj)
+        return state.deleted or any(
+            state.attrs[name].history.has_changes()
+            for name in PUBLIC_USER_COLUMNS)
+    return False
+
+
+def _note_flush(session, flush_context):
+    # session.new/dirty/deleted still hold the pre-flush state here
+    if any(
+            _touches_public_rows(obj)
+            for obj in session.new | session.dirty | session.deleted):
+        session.info['page_cache_stale'] = True
+
+
+def _updated_columns(orm_execute_state):
+    """Names of the columns an UPDATE sets, or None if they can't be told"""
+    statement = orm_execute_state.statement
+    if statement._values:
+        return {getattr(column, 'key', column) for column in statement._values}
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, dict):
+        parameters = [parameters]
+    if parameters:
+        return {name for row in parameters for name in row}
+    return None
+
+
+def _bulk_write_is_public(orm_execute_state):
+    table = getattr(getattr(orm_execute_state.statement, 'table', None),
+                    'name', None)
+    if table in PUBLIC_TABLES:
+        return True
+    if table != 'user':
+        return False
+    if not orm_execute_state.is_update:
+        return True
+    # Preference and password saves don't change what pages show
+    columns = _updated_columns(orm_execute_state)
+    return columns is None or not columns.isdisjoint(PUBLIC_USER_COLUMNS)
+
+
+def _note_bulk_write(orm_execute_state):
+    # Query-level and Core UPDATE/DELETE/INSERT skip the flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete
+            or orm_execute_state.is_insert):
+        return
+    if _bulk_write_is_public(orm_execute_state):
+        orm_execute_state.session.info['page_cache_stale'] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop('page_cache_stale', False):
+        page_cache.invalidate()
+
+
+def _discard_after_rollback(session):
+    session.info.pop('page_cache_stale', None)
+
+
+event.listen(Session, 'after_flush', _note_flush)
+event.listen(Session, 'do_orm_execute', _note_bulk_write)
+event.listen(Session, 'after_commit', _invalidate_after_commit)
+event.listen(Session, 'after_rollback', _discard_after_rollback)
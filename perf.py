@@ -0,0 +1,234 @@
+"""
+Per-request SQL instrumentation for Yalla
+
+SQLAlchemy's before/after_cursor_execute events time every statement a
+request runs. At the end of the request its statement count, database
+time and total time are
+
+- sent back in a Server-Timing header, which browser dev tools show
+  next to the request,
+- logged as one JSON line on the yalla.perf logger (WARNING when the
+  request was slow or ran many statements, INFO otherwise), and
+- added to a rolling window of recent samples per endpoint, which the
+  admin-only /admin/perf page summarises as percentiles together with
+  the slowest statements seen.
+
+Statements are recorded without their parameters, so logs and the
+admin page never show user data. The window lives in each process's
+memory; with several web workers, /admin/perf shows the worker that
+served it. Statements outside a request (the job worker, scripts) are
+not recorded.
+"""
+
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Requests slower than this, or running more statements, log a warning
+PERF_SLOW_REQUEST_MS = float(os.environ.get('PERF_SLOW_REQUEST_MS', 500))
+PERF_QUERY_WARNING = int(os.environ.get('PERF_QUERY_WARNING', 30))
+# Recent requests kept per endpoint for the percentiles
+PERF_WINDOW = 500
+# Slowest statements kept per request and per endpoint
+SLOWEST_STATEMENTS = 5
+STATEMENT_PREVIEW_LENGTH = 300
+PERCENTILES = (50, 95, 99)
+
+logger = logging.getLogger('yalla.perf')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _preview(statement):
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    if len(statement) > STATEMENT_PREVIEW_LENGTH:
+        statement = statement[:STATEMENT_PREVIEW_LENGTH] + '…'
+    return statement
+
+
+class RequestStats:
+    """Statements run while handling one request"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        # Min-heap of (seconds, statement) holding the slowest few
+        self._slowest = []
+
+    def record(self, statement, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        entry = (elapsed, statement)
+        if len(self._slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self._slowest, entry)
+        elif elapsed > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def slowest(self):
+        """(seconds, statement preview) pairs, slowest first"""
+        return [(elapsed, _preview(statement))
+                for elapsed, statement in sorted(self._slowest, reverse=True)]
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = round(percent / 100 * (len(sorted_values) - 1))
+    return sorted_values[index]
+
+
+class EndpointStats:
+    """Rolling samples of recent requests per endpoint"""
+
+    def __init__(self, window=PERF_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._slowest = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, duration, db_time, queries, slowest):
+        with self._lock:
+            samples = self._samples.get(endpoint)
+            if samples is None:
+                samples = self._samples[endpoint] = deque(maxlen=self.window)
+            samples.append((duration, db_time, queries))
+            kept = self._slowest.setdefault(endpoint, {})
+            for elapsed, statement in slowest:
+                if elapsed > kept.get(statement, 0.0):
+                    kept[statement] = elapsed
+            if len(kept) > SLOWEST_STATEMENTS:
+                self._slowest[endpoint] = dict(
+                    sorted(kept.items(), key=lambda item: item[1],
+                           reverse=True)[:SLOWEST_STATEMENTS])
+
+    def summary(self):
+        """One dict per endpoint, the most time-consuming first.
+
+        Durations are in milliseconds; 'slowest' lists the slowest
+        statements seen in the window as (ms, statement).
+        """
+        with self._lock:
+            snapshot = {
+                endpoint: (list(samples),
+                           sorted(self._slowest.get(endpoint, {}).items(),
+                                  key=lambda item: item[1],
+                                  reverse=True))
+                for endpoint, samples in self._samples.items()
+            }
+        rows = []
+        for endpoint, (samples, slowest) in snapshot.items():
+            durations = sorted(s[0] * 1000 for s in samples)
+            db_times = sorted(s[1] * 1000 for s in samples)
+            queries = sorted(s[2] for s in samples)
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(samples),
+                'total_ms': sum(durations),
+                'duration': {p: _percentile(durations, p) for p in PERCENTILES},
+                'db': {p: _percentile(db_times, p) for p in PERCENTILES},
+                'queries': {p: _percentile(queries, p) for p in PERCENTILES},
+                'max_queries': queries[-1],
+                'slowest': [(elapsed * 1000, statement)
+                            for statement, elapsed in slowest]
+            })
+        rows.sort(key=lambda row: row['total_ms'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._slowest.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def _current_stats():
+    if not has_request_context():
+        return None
+    return g.get('_perf_stats')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('perf_started_at', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    stats = _current_stats()
+    started = conn.info.get('perf_started_at')
+    if stats is None or not started:
+        return
+    stats.record(statement, time.perf_counter() - started.pop())
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get(
+        'perf_started_at') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def start_request():
+    g._perf_stats = RequestStats()
+
+
+def finish_request(response):
+    """Report the request's statements; returns the response"""
+    stats = g.pop('_perf_stats', None)
+    if stats is None:
+        return response
+    duration = time.perf_counter() - stats.started_at
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'total;dur={duration * 1000:.1f}')
+    endpoint = request.endpoint or '<unmatched>'
+    if endpoint == 'static':
+        return response
+    slowest = stats.slowest()
+    endpoint_stats.add(endpoint, duration, stats.db_time, stats.queries,
+                       slowest)
+    slow = (duration * 1000 >= PERF_SLOW_REQUEST_MS
+            or stats.queries >= PERF_QUERY_WARNING)
+    level = logging.WARNING if slow else logging.INFO
+    if logger.isEnabledFor(level):
+        logger.log(
+            level,
+            json.dumps({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'db_ms': round(stats.db_time * 1000, 1),
+                'queries': stats.queries,
+                'slowest': [{
+                    'ms': round(elapsed * 1000, 1),
+                    'statement': statement
+                } for elapsed, statement in slowest] if slow else []
+            }))
+    return response
+
+
+def init_app(app):
+    """Time every request and the statements it runs"""
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+    # Registered first so the measurement covers the other hooks
+    app.before_request_funcs.setdefault(None, []).insert(0, start_request)
+    app.after_request(finish_request)
@@ -0,0 +1,73 @@
+"""
+Session principal for Yalla
+
+current_user for a logged-in visitor is a SessionPrincipal: the few user
+fields nearly every request reads (PRINCIPAL_COLUMNS) held in the signed
+session cookie together with the user's session_version. Each request
+checks the snapshot with a one-column primary key lookup of
+session_version and rebuilds it from a slim column load only when the
+version moved, which happens whenever the user is banned, promoted,
+renamed, or changes a preference or password (see models.User).
+
+Views that need the rest of the row use current_user.user, which loads
+the User on first use.
+"""
+
+from flask import session
+from flask_login import UserMixin
+
+from app import db
+from models import User, PRINCIPAL_COLUMNS
+
+SESSION_KEY = '_principal'
+
+
+class SessionPrincipal(UserMixin):
+    """The logged-in user as seen by most requests"""
+
+    def __init__(self, snapshot):
+        self.id = snapshot['id']
+        self.session_version = snapshot['version']
+        for name in PRINCIPAL_COLUMNS:
+            setattr(self, name, snapshot[name])
+        self._user = None
+
+    @property
+    def user(self):
+        """The full User row, loaded on first use"""
+        if self._user is None:
+            self._user = db.session.get(User, self.id)
+        return self._user
+
+    def __repr__(self):
+        return f'<SessionPrincipal {self.id} v{self.session_version}>'
+
+
+def _snapshot(user_id):
+    columns = [getattr(User, name) for name in PRINCIPAL_COLUMNS]
+    row = db.session.query(User.session_version, *columns).filter(
+        User.id == user_id).first()
+    if row is None:
+        return None
+    snapshot = dict(zip(PRINCIPAL_COLUMNS, row[1:]))
+    snapshot.update(id=user_id, version=row.session_version)
+    return snapshot
+
+
+def load_principal(user_id):
+    """Principal for user_id, or None if the user no longer exists"""
+    snapshot = session.get(SESSION_KEY)
+    if snapshot is not None and snapshot.get('id') == user_id:
+        version = db.session.query(User.session_version).filter(
+            User.id == user_id).scalar()
+        if version is None:
+            session.pop(SESSION_KEY, None)
+            return None
+        if version == snapshot.get('version'):
+            return SessionPrincipal(snapshot)
+    snapshot = _snapshot(user_id)
+    if snapshot is None:
+        session.pop(SESSION_KEY, None)
+        return None
+    session[SESSION_KEY] = snapshot
+    return SessionPrincipal(snapshot)
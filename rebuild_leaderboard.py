@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Maintenance script for the leaderboard snapshot table.
+
+Recomputes every leaderboard_entry row (rank, reputation, approved review
+count, average rating given) from the user and review tables. Run it once
+after deploying the table and whenever the snapshot needs fixing.
+"""
+
+from app import app, db
+from models import LeaderboardEntry
+
+
+def rebuild_leaderboard():
+    """Rebuild the leaderboard snapshot from scratch"""
+    with app.app_context():
+        try:
+            ranked = LeaderboardEntry.rebuild()
+            db.session.commit()
+            print(f"✓ Leaderboard rebuilt ({ranked} ranked users)")
+        except Exception as e:
+            print(f"Error rebuilding leaderboard: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    rebuild_leaderboard()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Database migration / maintenance script for restaurant rating aggregates.
+
+Adds the rating_sum, approved_review_count and avg_rating columns to the
+restaurant table if they are missing, then recomputes them from the review
+table in one grouped pass. Safe to re-run at any time to fix drift.
+"""
+
+from app import app, db
+from models import Restaurant
+from sqlalchemy import inspect, text
+
+AGGREGATE_COLUMNS = {
+    'rating_sum': 'INTEGER NOT NULL DEFAULT 0',
+    'approved_review_count': 'INTEGER NOT NULL DEFAULT 0',
+    'avg_rating': 'FLOAT NOT NULL DEFAULT 0',
+}
+
+
+def add_rating_aggregate_columns():
+    """Add rating aggregate columns to restaurant table if they don't exist"""
+    existing = {c['name'] for c in inspect(db.engine).get_columns('restaurant')}
+    for column_name, ddl in AGGREGATE_COLUMNS.items():
+        if column_name in existing:
+            print(f"✓ {column_name} column already exists")
+            continue
+        print(f"Adding {column_name} column to restaurant table...")
+        db.session.execute(text(
+            f'ALTER TABLE restaurant ADD COLUMN {column_name} {ddl}'))
+    db.session.commit()
+
+
+def reconcile_ratings():
+    """Recompute rating aggregates for every restaurant"""
+    with app.app_context():
+        try:
+            add_rating_aggregate_columns()
+            updated = Restaurant.reconcile_rating_aggregates()
+            db.session.commit()
+            print(f"✓ Rating aggregates reconciled ({updated} restaurants with approved reviews)")
+        except Exception as e:
+            print(f"Error reconciling rating aggregates: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    reconcile_ratings()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Database migration / maintenance script for per-user stat counters.
+
+Adds the approved_review_count, review_rating_sum and
+submitted_restaurant_count columns to the user table if they are missing,
+then recomputes them from the review and restaurant tables in grouped
+passes and rebuilds the leaderboard snapshot that reads them. Safe to
+re-run at any time to fix drift.
+"""
+
+from app import app, db
+from models import User, LeaderboardEntry
+from sqlalchemy import inspect, text
+
+STAT_COLUMNS = {
+    'approved_review_count': 'INTEGER NOT NULL DEFAULT 0',
+    'review_rating_sum': 'INTEGER NOT NULL DEFAULT 0',
+    'submitted_restaurant_count': 'INTEGER NOT NULL DEFAULT 0',
+}
+
+
+def add_user_stat_columns():
+    """Add stat counter columns to user table if they don't exist"""
+    existing = {c['name'] for c in inspect(db.engine).get_columns('user')}
+    for column_name, ddl in STAT_COLUMNS.items():
+        if column_name in existing:
+            print(f"✓ {column_name} column already exists")
+            continue
+        print(f"Adding {column_name} column to user table...")
+        db.session.execute(text(
+            f'ALTER TABLE "user" ADD COLUMN {column_name} {ddl}'))
+    db.session.commit()
+    for index in User.__table__.indexes:
+        if index.name == 'ix_user_approved_review_count':
+            index.create(db.engine, checkfirst=True)
+    print("✓ ix_user_approved_review_count index ready")
+
+
+def reconcile_user_stats():
+    """Recompute stat counters for every user"""
+    with app.app_context():
+        try:
+            add_user_stat_columns()
+            updated = User.reconcile_stats()
+            ranked = LeaderboardEntry.rebuild()
+            db.session.commit()
+            print(f"✓ User stats reconciled ({updated} users with reviews or submissions)")
+            print(f"✓ Leaderboard rebuilt ({ranked} ranked users)")
+        except Exception as e:
+            print(f"Error reconciling user stats: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    reconcile_user_stats()
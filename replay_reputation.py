@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Maintenance script to rebuild reputation scores from the ledger.
+
+Creates the reputation_event table if it is missing, gives users whose
+score predates the ledger an opening balance event, then sets every
+user's reputation_score to the sum of their ledger deltas and rebuilds
+the leaderboard snapshot. Safe to re-run at any time to fix drift.
+"""
+
+from app import app, db
+from models import LeaderboardEntry, ReputationEvent
+from reputation import replay_reputation
+
+
+def replay():
+    """Recompute every user's reputation from the ledger"""
+    with app.app_context():
+        try:
+            ReputationEvent.__table__.create(db.engine, checkfirst=True)
+            opened = replay_reputation()
+            ranked = LeaderboardEntry.rebuild()
+            db.session.commit()
+            print(f"✓ Opened ledger balances for {opened} user(s)")
+            print(f"✓ Reputation replayed from ledger ({ranked} ranked users)")
+        except Exception as e:
+            print(f"Error replaying reputation: {e}")
+            db.session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    replay()
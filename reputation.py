@@ -5,36 +5,83 @@ Manages reputation points earned by users for various actions.
 Point System:
 - 5 points for posting a review that is approved/confirmed by admin
 - 10 points for adding a restaurant with approved status
+
+Every change is written to the ReputationEvent ledger and applied to
+User.reputation_score as an in-SQL increment, so concurrent approvals
+can't overwrite each other and the score can always be replayed from
+the ledger.
 """
 
+from datetime import datetime
+
+from sqlalchemy import case, func, literal, null, select, update
+
 from app import db
-from models import User
+from models import User, LeaderboardEntry, ReputationEvent
+
+REVIEW_POINTS = 5
+RESTAURANT_POINTS = 10
+
+REASON_REVIEW_CONFIRMED = 'review_confirmed'
+REASON_RESTAURANT_APPROVED = 'restaurant_approved'
+REASON_RESET = 'admin_reset'
+REASON_OPENING_BALANCE = 'opening_balance'
 
 
-def award_review_points(user_id):
+def award_points(awards):
+    """Record and apply many awards at once. Does not commit.
+
+    awards is an iterable of (user_id, delta, reason, source_id) tuples.
+    All events are inserted with one statement and all scores are moved
+    with one UPDATE, whatever the number of users. Awards for missing
+    users are dropped. Returns the ids of the users that were awarded.
+    """
+    awards = [award for award in awards if award[0]]
+    if not awards:
+        return set()
+    existing = {
+        user_id for (user_id, ) in db.session.query(User.id).filter(
+            User.id.in_([award[0] for award in awards]))
+    }
+    now = datetime.utcnow()
+    events = [{
+        'user_id': user_id,
+        'delta': delta,
+        'reason': reason,
+        'source_id': source_id,
+        'created_at': now
+    } for user_id, delta, reason, source_id in awards
+              if user_id in existing]
+    if not events:
+        return set()
+    totals = {}
+    for event in events:
+        totals[event['user_id']] = totals.get(event['user_id'], 0) + event['delta']
+
+    db.session.execute(ReputationEvent.__table__.insert(), events)
+    db.session.execute(
+        update(User).where(User.id.in_(list(totals))).values(
+            reputation_score=func.coalesce(User.reputation_score, 0) +
+            case(totals, value=User.id, else_=0)).execution_options(
+                synchronize_session='fetch'))
+    LeaderboardEntry.refresh(list(totals))
+    return set(totals)
+
+
+def award_review_points(user_id, review_id=None):
     """Award 5 points to user for having a review approved/confirmed by admin"""
-    if not user_id:
-        return False
-    
-    user = User.query.get(user_id)
-    if not user:
+    if not award_points([(user_id, REVIEW_POINTS, REASON_REVIEW_CONFIRMED,
+                          review_id)]):
         return False
-    
-    user.reputation_score = (user.reputation_score or 0) + 5
     db.session.commit()
     return True
 
 
-def award_restaurant_points(user_id):
+def award_restaurant_points(user_id, restaurant_id=None):
     """Award 10 points to user for adding a restaurant with approved status"""
-    if not user_id:
-        return False
-    
-    user = User.query.get(user_id)
-    if not user:
+    if not award_points([(user_id, RESTAURANT_POINTS,
+                          REASON_RESTAURANT_APPROVED, restaurant_id)]):
         return False
-    
-    user.reputation_score = (user.reputation_score or 0) + 10
     db.session.commit()
     return True
 
@@ -49,10 +96,42 @@ def get_user_reputation(user_id):
 
 def reset_user_reputation(user_id):
     """Reset user's reputation score to 0 (admin function)"""
-    user = User.query.get(user_id)
-    if not user:
+    row = db.session.query(User.reputation_score).filter(
+        User.id == user_id).with_for_update().first()
+    if row is None:
         return False
-    
-    user.reputation_score = 0
+    # Cancel out the current score in the ledger so replays agree
+    award_points([(user_id, -(row.reputation_score or 0), REASON_RESET,
+                   None)])
     db.session.commit()
     return True
+
+
+def replay_reputation(user_ids=None):
+    """Rebuild reputation_score from the ledger. Does not commit.
+
+    The first replay for a user writes an opening balance event covering
+    whatever part of their score the ledger doesn't explain (points earned
+    before the ledger existed); later replays reuse it. Rebuilds everyone
+    when user_ids is None. Returns the number of opening balances written.
+    """
+    ledger_total = select(func.coalesce(func.sum(
+        ReputationEvent.delta), 0)).where(
+            ReputationEvent.user_id == User.id).scalar_subquery()
+    has_opening = select(ReputationEvent.id).where(
+        ReputationEvent.user_id == User.id,
+        ReputationEvent.reason == REASON_OPENING_BALANCE).exists()
+    unopened = select(User.id,
+                      func.coalesce(User.reputation_score, 0) - ledger_total,
+                      literal(REASON_OPENING_BALANCE), null(),
+                      literal(datetime.utcnow())).where(~has_opening)
+    replay = update(User).values(reputation_score=ledger_total)
+    if user_ids is not None:
+        unopened = unopened.where(User.id.in_(user_ids))
+        replay = replay.where(User.id.in_(user_ids))
+    opened = db.session.execute(
+        ReputationEvent.__table__.insert().from_select(
+            ['user_id', 'delta', 'reason', 'source_id', 'created_at'],
+            unopened)).rowcount
+    db.session.execute(replay.execution_options(synchronize_session=False))
+    return opened
@@ -1,50 +1,123 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, g
+from flask import render_template, redirect, url_for, flash, request, jsonify, g, abort
 from flask_login import login_user, logout_user, current_user, login_required
 from app import app, db, login_manager
-from models import User, Restaurant, Review, Cuisine, News, FoodCategory, FeatureToggle, ReviewComment
+from i18n import get_locale, SUPPORTED_LOCALES, DEFAULT_LOCALE
+from models import User, Restaurant, RestaurantPhoto, Review, Cuisine, News, FoodCategory, FeatureToggle, ReviewComment, LeaderboardEntry
 from forms import RegistrationForm, LoginForm, ReviewForm, RestaurantForm, PhotoUploadForm, NewsForm, ProfileEditForm, ReviewCommentForm, AdminChangePasswordForm, AdminChangeUsernameForm
-from reputation import award_review_points, award_restaurant_points
-from datetime import datetime
+from reputation import (award_points, REVIEW_POINTS, RESTAURANT_POINTS,
+                        REASON_REVIEW_CONFIRMED, REASON_RESTAURANT_APPROVED)
+from media import get_blob_store, store_blob, sniff_image_type, media_url
+from images import (VARIANT_JOB, preload_variants, image_src, image_srcset,
+                    image_status, read_upload, inspect_upload,
+                    IMAGE_ORIGINAL)
+from jobs import enqueue, broadcast_listener
+import tasks  # registers the background task handlers
+from search import search_restaurants, suggestion_index
+from page_cache import cached_page, page_cache
+from datetime import datetime, timedelta
 import base64
+import hashlib
 import os
-from PIL import Image
-from io import BytesIO
+import time
+
+# Restaurant browsing page size
+RESTAURANTS_PER_PAGE = 12
+REVIEWS_PER_PAGE = 20
+LEADERBOARD_PER_PAGE = 50
+# Photos on the restaurant page, and per gallery API page after those
+GALLERY_PREVIEW_SIZE = 6
+GALLERY_PER_PAGE = 24
+# Seconds a gallery API page may be cached; photos still processing are
+# missing from it until it expires
+GALLERY_PAGE_MAX_AGE = 60
+
+def process_image_upload(file, profile):
+    """Validate and store an image upload; return its blob hash.
+
+    The file is read in bounded chunks and its type and dimensions are
+    checked from its header before it is stored; the renditions for
+    profile are produced by a background job (see images.py), so the
+    request doesn't wait for decoding and resizing.
+    """
+    photo_data = read_upload(file.stream)
+    inspect_upload(photo_data)
+    image_hash = store_blob(photo_data)
+    enqueue(VARIANT_JOB, {'image_hash': image_hash, 'profile': profile},
+            ref=image_hash)
+    return image_hash
+
+
+def encode_cursor(row):
+    """Encode a row's (created_at, id) position as an opaque cursor"""
+    raw = f'{row.created_at.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into (created_at, id), or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
 
-# Image processing constants
-ALLOWED_MIME_TYPES = {'image/jpeg', 'image/png', 'image/gif', 'image/webp'}
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
-def process_image_upload(file, max_size=(400, 300)):
-    """Process and validate image upload, return base64 encoded data"""
-    if file.content_type not in ALLOWED_MIME_TYPES:
-        raise ValueError(f'Only {", ".join(ALLOWED_MIME_TYPES)} images are allowed')
-    
-    photo_data = file.read()
-    if len(photo_data) > MAX_FILE_SIZE:
-        raise ValueError('File size exceeds 5MB limit')
-    
-    # Resize image if needed
-    img = Image.open(BytesIO(photo_data))
-    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-    
-    # Convert to base64
-    img_io = BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
-    return base64.b64encode(img_io.getvalue()).decode('utf-8')
+def paginate_restaurants(query, cursor=None, per_page=RESTAURANTS_PER_PAGE):
+    """Keyset-paginate a restaurant query newest first on (created_at, id).
+
+    Returns (restaurants, next_cursor); next_cursor is None on the last page.
+    """
+    from sqlalchemy import and_, or_
+    from sqlalchemy.orm import joinedload
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, restaurant_id = position
+        query = query.filter(
+            or_(Restaurant.created_at < created_at,
+                and_(Restaurant.created_at == created_at,
+                     Restaurant.id < restaurant_id)))
+    rows = query.options(joinedload(Restaurant.cuisine)).order_by(
+        Restaurant.created_at.desc(),
+        Restaurant.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
+
+
+def paginate_photos(restaurant_id, cursor=None, per_page=GALLERY_PER_PAGE):
+    """Keyset-paginate a restaurant's gallery newest first.
+
+    Returns (photos, next_cursor) like paginate_restaurants; the photos'
+    variants are preloaded.
+    """
+    position = decode_cursor(cursor) if cursor else None
+    photos = RestaurantPhoto.gallery_page(restaurant_id,
+                                          before=position,
+                                          limit=per_page + 1)
+    next_cursor = None
+    if len(photos) > per_page:
+        photos = photos[:per_page]
+        next_cursor = encode_cursor(photos[-1])
+    preload_variants(photo.image_hash for photo in photos)
+    return photos, next_cursor
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from principal import load_principal
+    return load_principal(int(user_id))
 
 
 @app.before_request
 def check_banned_user():
     if current_user.is_authenticated and current_user.is_banned:
+        username = current_user.username
         logout_user()
         flash('Your account has been banned.', 'danger')
-        return redirect(url_for('banned', username=current_user.username))
+        return redirect(url_for('banned', username=username))
 
 
 def get_client_ip():
@@ -58,6 +131,78 @@ def get_client_ip():
         return request.remote_addr
 
 
+def _template_version():
+    """Newest template mtime, so a deploy with new templates changes ETags"""
+    folder = os.path.join(app.root_path, app.template_folder)
+    mtimes = [
+        os.path.getmtime(os.path.join(root, name))
+        for root, _, names in os.walk(folder) for name in names
+    ]
+    return int(max(mtimes)) if mtimes else 0
+
+
+TEMPLATE_VERSION = _template_version()
+
+
+def page_etag(*validators):
+    """ETag for a page built from its data validators.
+
+    Besides the rows the view reads, a rendered page depends on who is
+    looking (admin controls, language, dark mode, CSRF token), the feature
+    toggles and the templates, so all of those are part of the tag. CSRF
+    tokens expire, so the tag also rolls over once per token lifetime.
+    """
+    from flask import session
+    from models import feature_toggle_registry
+    if current_user.is_authenticated:
+        viewer = (current_user.id, current_user.is_admin,
+                  current_user.dark_mode, current_user.language)
+    else:
+        viewer = None
+    csrf_limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    csrf_period = int(time.time() // csrf_limit) if csrf_limit else 0
+    parts = (TEMPLATE_VERSION, get_locale(), viewer,
+             session.get('csrf_token'), csrf_period,
+             feature_toggle_registry.snapshot(), validators)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified and make clients revalidate each use"""
+    from flask import make_response
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """A 304 response when the client's copy is current, otherwise None.
+
+    Called before the expensive part of a view, with the same validators
+    the full response will carry.
+    """
+    from flask import session
+    # A pending flash message has to be rendered
+    if '_flashes' in session:
+        return None
+    # Last-Modified only dates the data; the viewer, locale and toggles
+    # are covered by the ETag alone, so If-Modified-Since never earns a 304
+    if etag not in request.if_none_match:
+        return None
+    return with_validators(app.response_class(status=304), etag,
+                           last_modified)
+
+
+@app.before_request
+def apply_broadcasts():
+    """Apply cache invalidations other processes have broadcast"""
+    broadcast_listener.poll()
+
+
 @app.before_request
 def check_maintenance_mode():
     """Check if maintenance mode is enabled - redirect non-admins to maintenance page"""
@@ -79,7 +224,7 @@ def check_maintenance_mode():
                 return None  # Allow whitelisted IPs to access all pages
         
         # Routes that should be accessible during maintenance (for non-whitelisted users)
-        allowed_routes = ['maintenance', 'login', 'logout', 'banned', 'restaurant_detail', 'restaurants']
+        allowed_routes = ['maintenance', 'login', 'logout', 'banned', 'restaurant_detail', 'restaurants', 'restaurants_api', 'media']
         if request.endpoint and request.endpoint in allowed_routes:
             return None
         
@@ -93,31 +238,25 @@ def check_maintenance_mode():
         return redirect(url_for('maintenance'))
 
 
-@app.before_request
-def refresh_user_dark_mode():
-    """Refresh user dark mode preference from database on each request"""
-    if current_user.is_authenticated:
-        # Only refresh if session dark mode differs from database
-        if not hasattr(current_user, '_dark_mode_synced') or not current_user._dark_mode_synced:
-            user = User.query.get(current_user.id)
-            if user:
-                current_user.dark_mode = user.dark_mode
-                current_user._dark_mode_synced = True
-
-
 @app.route('/')
+@cached_page
 def index():
-    from sqlalchemy import func
-    promoted_restaurants = Restaurant.query.filter_by(
-        is_approved=True, is_promoted=True).order_by(
-            Restaurant.created_at.desc()).limit(6).all()
-    regular_restaurants = Restaurant.query.filter_by(
-        is_approved=True).order_by(Restaurant.created_at.desc()).all()
+    from sqlalchemy.orm import joinedload
+    promoted_restaurants = Restaurant.query.options(
+        joinedload(Restaurant.cuisine)).filter_by(
+            is_approved=True, is_promoted=True).order_by(
+                Restaurant.created_at.desc()).limit(6).all()
+    regular_restaurants = paginate_restaurants(
+        Restaurant.query.filter_by(is_approved=True), per_page=6)[0]
     cuisines = Cuisine.query.all()
-    top_reviewers = (User.query.filter(
-        User.is_admin == False, User.is_banned == False).join(Review, Review.user_id == User.id).group_by(
-            User.id).having(func.count(Review.id) > 0).order_by(
-                func.count(Review.id).desc()).limit(4).all())
+    # Rank by the denormalized approved_review_count column, which the
+    # cards also display, so no per-user count queries are needed
+    top_reviewers = User.query.filter(
+        User.is_admin == False, User.is_banned == False,
+        User.approved_review_count > 0).order_by(
+            User.approved_review_count.desc()).limit(4).all()
+    preload_variants(r.image_hash
+                     for r in promoted_restaurants + regular_restaurants)
     return render_template('index.html',
                            promoted=promoted_restaurants,
                            restaurants=regular_restaurants,
@@ -147,9 +286,11 @@ def login():
         return redirect(url_for('index'))
     form = LoginForm()
     if form.validate_on_submit():
+        from sqlalchemy.orm import undefer_group
         user_input = form.user_input.data
-        user = User.query.filter((User.username == user_input)
-                                 | (User.email == user_input)).first()
+        user = User.query.options(undefer_group('profile')).filter(
+            (User.username == user_input)
+            | (User.email == user_input)).first()
         if user and user.check_password(form.password.data):
             if user.is_banned:
                 flash('Your account has been banned.', 'danger')
@@ -166,7 +307,9 @@ def login():
 
 @app.route('/banned/<username>')
 def banned(username):
-    user = User.query.filter_by(username=username).first()
+    from sqlalchemy.orm import undefer_group
+    user = User.query.options(undefer_group('profile')).filter_by(
+        username=username).first()
     if not user or not user.is_banned:
         return redirect(url_for('index'))
     return render_template('banned.html', user=user)
@@ -190,8 +333,8 @@ def logout():
 def set_language(language):
     """Set the user's language preference"""
     from flask import g
-    if language not in ['en', 'ar']:
-        language = 'en'
+    if language not in SUPPORTED_LOCALES:
+        language = DEFAULT_LOCALE
     
     # Set cookie for non-authenticated users
     response = redirect(request.referrer or url_for('index'))
@@ -199,7 +342,7 @@ def set_language(language):
     
     # Save to database if authenticated
     if current_user.is_authenticated:
-        current_user.language = language
+        User.set_preferences(current_user.id, language=language)
         db.session.commit()
     
     # Set locale for this request
@@ -242,21 +385,18 @@ def save_dark_mode():
         return {"status": "unauthenticated"}, 401
 
     dark_mode_value = request.form.get("darkMode") == "true"
-    current_user.dark_mode = dark_mode_value
+    User.set_preferences(current_user.id, dark_mode=dark_mode_value)
     db.session.commit()
     return {"status": "ok", "dark_mode": dark_mode_value}, 200
 
 
-@app.route('/restaurants')
-def restaurants():
-    if not FeatureToggle.get_feature_status('restaurant_filtering_enabled'):
-        flash('Restaurant browsing is temporarily disabled.', 'warning')
-        return redirect(url_for('index'))
-    cuisine_filter = request.args.get('cuisine', type=int)
-    price_filter = request.args.get('price', type=int)
-    rating_filter = request.args.get('rating', type=int)
-    search_query = request.args.get('search', '')
+def filtered_restaurants_query(args):
+    """Build the approved restaurant query for the browse filters in args"""
     query = Restaurant.query.filter_by(is_approved=True)
+    cuisine_filter = args.get('cuisine', type=int)
+    price_filter = args.get('price', type=int)
+    rating_filter = args.get('rating', type=int)
+    search_query = args.get('search', '')
     if cuisine_filter:
         query = query.filter_by(cuisine_id=cuisine_filter)
     if price_filter:
@@ -264,48 +404,252 @@ def restaurants():
     if search_query:
         query = query.filter(Restaurant.name.ilike(f'%{search_query}%'))
     if rating_filter:
-        # Move rating filter to database level using subquery
-        from sqlalchemy import func, text
-        avg_rating_subquery = db.session.query(
-            Review.restaurant_id,
-            func.avg(Review.rating).label('avg_rating')
-        ).filter(Review.is_approved == True).group_by(Review.restaurant_id).subquery()
-        
-        query = query.outerjoin(avg_rating_subquery, Restaurant.id == avg_rating_subquery.c.restaurant_id)
-        query = query.filter(text('COALESCE(avg_rating, 0) >= :rating_filter')).params(rating_filter=rating_filter)
-    
-    all_restaurants = query.all()
+        query = query.filter(Restaurant.avg_rating >= rating_filter)
+    return query
+
+
+def is_public_blob(blob_hash):
+    """Whether /media may serve blob_hash to anyone.
+
+    Renditions are public, and so are images stored before the pipeline
+    existed. Uploads that have (or are waiting for) renditions still carry
+    the uploader's metadata and are never served. Receipts and their
+    renditions are admin-only, see admin_review_receipt.
+    """
+    from models import ImageVariant
+    owner = db.session.query(ImageVariant.image_hash).filter(
+        ImageVariant.blob_hash == blob_hash).first()
+    if owner is not None:
+        image_hash = owner.image_hash
+    elif image_status(blob_hash) == IMAGE_ORIGINAL:
+        image_hash = blob_hash
+    else:
+        return False
+    return not db.session.query(
+        Review.query.filter(
+            Review.receipt_image_hash == image_hash).exists()).scalar()
+
+
+@app.route('/media/<blob_hash>')
+def media(blob_hash):
+    """Serve a public stored image; the hash is the content, so it never
+    changes"""
+    if not is_public_blob(blob_hash):
+        abort(404)
+    if blob_hash in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        data = get_blob_store().get(blob_hash)
+        if data is None:
+            abort(404)
+        response = app.response_class(
+            data, mimetype=sniff_image_type(data) or 'application/octet-stream')
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.set_etag(blob_hash)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/restaurants')
+@cached_page
+def restaurants():
+    if not FeatureToggle.get_feature_status('restaurant_filtering_enabled'):
+        flash('Restaurant browsing is temporarily disabled.', 'warning')
+        return redirect(url_for('index'))
+    page_restaurants, next_cursor = paginate_restaurants(
+        filtered_restaurants_query(request.args),
+        cursor=request.args.get('cursor'))
+    preload_variants(r.image_hash for r in page_restaurants)
     cuisines = Cuisine.query.all()
     return render_template('restaurants.html',
-                           restaurants=all_restaurants,
+                           restaurants=page_restaurants,
+                           next_cursor=next_cursor,
                            cuisines=cuisines,
-                           current_cuisine=cuisine_filter,
-                           current_price=price_filter,
-                           current_rating=rating_filter,
-                           search_query=search_query)
+                           current_cuisine=request.args.get('cuisine', type=int),
+                           current_price=request.args.get('price', type=int),
+                           current_rating=request.args.get('rating', type=int),
+                           search_query=request.args.get('search', ''))
+
+
+@app.route('/api/restaurants')
+def restaurants_api():
+    """Return the next page of restaurants for the browse page's load more"""
+    if not FeatureToggle.get_feature_status('restaurant_filtering_enabled'):
+        return jsonify({'error': 'Restaurant browsing is disabled'}), 403
+    page_restaurants, next_cursor = paginate_restaurants(
+        filtered_restaurants_query(request.args),
+        cursor=request.args.get('cursor'))
+    preload_variants(r.image_hash for r in page_restaurants)
+    return jsonify({
+        'restaurants': [{
+            'id': r.id,
+            'name': r.name,
+            'cuisine': r.cuisine.name,
+            'price_range': r.price_range,
+            'description': (r.description or '')[:100],
+            'image_url': image_src(r.image_hash, 640, r.image_url),
+            'image_srcset': image_srcset(r.image_hash),
+            'avg_rating': round(r.avg_rating or 0, 1),
+            'review_count': r.approved_review_count,
+            'url': url_for('restaurant_detail', id=r.id)
+        } for r in page_restaurants],
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/restaurants/<int:id>/photos')
+def restaurant_photos_api(id):
+    """Return a page of a restaurant's gallery for its show more button.
+
+    Photos whose renditions aren't ready yet are left out of the page.
+    """
+    if db.session.query(Restaurant.id).filter(
+            Restaurant.id == id).scalar() is None:
+        return jsonify({'error': 'Restaurant not found'}), 404
+    photos, next_cursor = paginate_photos(id, request.args.get('cursor'))
+    items = []
+    for photo in photos:
+        src = image_src(photo.image_hash, 480)
+        if src is None:
+            continue
+        items.append({
+            'id': photo.id,
+            'image_url': src,
+            'image_srcset': image_srcset(photo.image_hash),
+            'full_url': image_src(photo.image_hash, 1600),
+            'uploaded_by': photo.uploader.username if photo.uploader else None,
+            'uploaded_at': photo.created_at.isoformat()
+        })
+    response = jsonify({'photos': items, 'next_cursor': next_cursor})
+    response.cache_control.public = True
+    response.cache_control.max_age = GALLERY_PAGE_MAX_AGE
+    return response
+
+
+def badge_marker():
+    """Every badge definition; the table is tiny and has no change time"""
+    from models import Badge
+    return tuple(
+        db.session.query(Badge.id, Badge.name, Badge.color,
+                         Badge.hierarchy).order_by(Badge.id))
+
+
+def restaurant_page_validators(restaurant_id):
+    """(ETag, Last-Modified) of a restaurant page, or None if it's gone.
+
+    Covers the restaurant, its gallery and their renditions, its reviews and
+    comments and the people who wrote them (names, badges, pictures) in one
+    statement, plus the badge definitions.
+    """
+    from sqlalchemy import func, select, union
+    from models import UserBadge, ImageVariant
+    review_ids = select(
+        Review.id).where(Review.restaurant_id == restaurant_id)
+    people = union(
+        select(Review.user_id).where(Review.restaurant_id == restaurant_id),
+        select(ReviewComment.user_id).where(
+            ReviewComment.review_id.in_(review_ids))).subquery()
+    row = db.session.query(
+        Restaurant.updated_at,
+        select(func.max(Review.updated_at)).where(
+            Review.restaurant_id == restaurant_id).scalar_subquery(),
+        select(func.count(Review.id)).where(
+            Review.restaurant_id == restaurant_id).scalar_subquery(),
+        select(func.max(ReviewComment.created_at)).where(
+            ReviewComment.review_id.in_(review_ids)).scalar_subquery(),
+        select(func.count(ReviewComment.id)).where(
+            ReviewComment.review_id.in_(review_ids)).scalar_subquery(),
+        select(func.max(User.updated_at)).where(
+            User.id.in_(select(people.c[0]))).scalar_subquery(),
+        select(func.max(UserBadge.assigned_at)).where(
+            UserBadge.user_id.in_(select(people.c[0]))).scalar_subquery(),
+        select(func.count(UserBadge.id)).where(
+            UserBadge.user_id.in_(select(people.c[0]))).scalar_subquery(),
+        select(func.max(RestaurantPhoto.created_at)).where(
+            RestaurantPhoto.restaurant_id == restaurant_id).scalar_subquery(),
+        select(func.count(RestaurantPhoto.id)).where(
+            RestaurantPhoto.restaurant_id == restaurant_id).scalar_subquery(),
+        # Cover and photo renditions may be generated after the upload
+        select(func.count(ImageVariant.id)).where(
+            ImageVariant.image_hash == Restaurant.image_hash).scalar_subquery(),
+        select(func.count(ImageVariant.id)).where(
+            ImageVariant.image_hash.in_(
+                select(RestaurantPhoto.image_hash).where(
+                    RestaurantPhoto.restaurant_id ==
+                    restaurant_id))).scalar_subquery(),
+    ).filter(Restaurant.id == restaurant_id).first()
+    if row is None:
+        return None
+    changed = [value for value in row if isinstance(value, datetime)]
+    return page_etag(tuple(row), badge_marker()), max(changed)
 
 
 @app.route('/restaurant/<int:id>')
+@cached_page
 def restaurant_detail(id):
-    from sqlalchemy.orm import joinedload
-    restaurant = Restaurant.query.get_or_404(id)
+    from sqlalchemy.orm import contains_eager, joinedload, undefer_group
+    validators = restaurant_page_validators(id)
+    if validators:
+        cached = not_modified(*validators)
+        if cached:
+            return cached
+    restaurant = Restaurant.query.options(
+        undefer_group('details')).get_or_404(id)
+    review_query = Review.query.outerjoin(
+        User, Review.user_id == User.id).options(
+            contains_eager(Review.author),
+            joinedload(Review.approver)).filter(
+                Review.restaurant_id == restaurant.id)
     # Only show approved reviews to non-admin users
-    if current_user.is_authenticated and current_user.is_admin:
-        reviews = restaurant.reviews.options(joinedload(Review.author)).all()
-    else:
-        reviews = restaurant.reviews.options(joinedload(Review.author)).filter(Review.is_approved == True).all()
-    
-    reviews = sorted(
-        reviews,
-        key=lambda r:
-        (not (r.author and r.author.is_admin), -r.created_at.timestamp()))
+    if not (current_user.is_authenticated and current_user.is_admin):
+        review_query = review_query.filter(Review.is_approved == True)
+    # Admin reviews first, then newest
+    reviews = review_query.order_by(
+        db.case((User.is_admin == True, 0), else_=1),
+        Review.created_at.desc(), Review.id.desc()).paginate(
+            page=request.args.get('page', 1, type=int),
+            per_page=REVIEWS_PER_PAGE,
+            error_out=False)
+
+    # Load the whole thread for this page in a fixed number of queries
+    review_ids = [r.id for r in reviews.items]
+    comments_by_review = {}
+    if review_ids:
+        for comment in ReviewComment.query.options(
+                joinedload(ReviewComment.author)).filter(
+                    ReviewComment.review_id.in_(review_ids)).order_by(
+                        ReviewComment.created_at.desc(),
+                        ReviewComment.id.desc()):
+            comments_by_review.setdefault(comment.review_id, []).append(comment)
+    author_ids = {r.user_id for r in reviews.items if r.user_id}
+    commenter_ids = {
+        c.user_id
+        for comments in comments_by_review.values() for c in comments
+        if c.user_id
+    }
+    highest_badges = User.highest_hierarchy_badges(author_ids | commenter_ids)
+
+    photos, photos_cursor = paginate_photos(restaurant.id,
+                                            per_page=GALLERY_PREVIEW_SIZE)
+
     photo_form = PhotoUploadForm()
     comment_form = ReviewCommentForm()
-    return render_template('restaurant_detail.html',
+    page = render_template('restaurant_detail.html',
                            restaurant=restaurant,
-                           reviews=reviews,
+                           photos=photos,
+                           photos_cursor=photos_cursor,
+                           reviews=reviews.items,
+                           reviews_page=reviews,
+                           comments_by_review=comments_by_review,
+                           highest_badges=highest_badges,
                            photo_form=photo_form,
+                           photo_uploads_enabled=FeatureToggle.
+                           get_feature_status('photo_uploads_enabled'),
                            comment_form=comment_form)
+    # Validators of a restaurant that disappeared mid-request aren't sent
+    return with_validators(page, *validators) if validators else page
 
 
 @app.route('/restaurant/<int:id>/upload-photo', methods=['POST'])
@@ -314,7 +658,6 @@ def upload_restaurant_photo(id):
     if not FeatureToggle.get_feature_status('photo_uploads_enabled'):
         flash('Photo uploads are currently disabled.', 'warning')
         return redirect(url_for('restaurant_detail', id=id))
-    from datetime import datetime
     restaurant = Restaurant.query.get_or_404(id)
     if 'photo' not in request.files:
         flash('No file part', 'danger')
@@ -325,20 +668,13 @@ def upload_restaurant_photo(id):
         return redirect(url_for('restaurant_detail', id=id))
     if file and file.filename:
         try:
-            encoded_photo = process_image_upload(file)
-            if restaurant.photos is None:
-                restaurant.photos = []
-                new_photo = {
-                    'data': encoded_photo,
-                    'content_type': file.content_type,
-                    'uploaded_by': current_user.username,
-                    'uploaded_at': datetime.utcnow().isoformat()
-                }
-                restaurant.photos = restaurant.photos + [new_photo]
-                from sqlalchemy.orm.attributes import flag_modified
-                flag_modified(restaurant, 'photos')
-                db.session.commit()
-                flash('Photo uploaded successfully!', 'success')
+            photo_hash = process_image_upload(file, 'photo')
+            db.session.add(
+                RestaurantPhoto(restaurant_id=restaurant.id,
+                                image_hash=photo_hash,
+                                user_id=current_user.id))
+            db.session.commit()
+            flash('Photo uploaded successfully! It will appear once it has been processed.', 'success')
         except ValueError as e:
             flash(str(e), 'danger')
         except IOError as e:
@@ -356,7 +692,9 @@ def add_review(id):
     if not FeatureToggle.get_feature_status('reviews_enabled'):
         flash('Reviews are currently disabled by administrators.', 'warning')
         return redirect(url_for('restaurant_detail', id=id))
-    restaurant = Restaurant.query.get_or_404(id)
+    from sqlalchemy.orm import undefer_group
+    restaurant = Restaurant.query.options(
+        undefer_group('details')).get_or_404(id)
     existing_review = Review.query.filter_by(user_id=current_user.id,
                                              restaurant_id=id).first()
     if existing_review:
@@ -369,12 +707,12 @@ def add_review(id):
     else:
         form.food_category.choices = [('', 'No food categories available')]
     if form.validate_on_submit():
-        receipt_image = None
+        receipt_image_hash = None
         if form.receipt_photo.data:
             file = form.receipt_photo.data
             if file.filename:
                 try:
-                    receipt_image = process_image_upload(file)
+                    receipt_image_hash = process_image_upload(file, 'receipt')
                 except ValueError as e:
                     flash(f'Receipt image error: {str(e)}. Continuing without it.', 'warning')
                 except IOError as e:
@@ -387,7 +725,7 @@ def add_review(id):
                         if form.food_category.data else None,
                         user_id=current_user.id,
                         restaurant_id=id,
-                        receipt_image=receipt_image,
+                        receipt_image_hash=receipt_image_hash,
                         is_approved=False)
         db.session.add(review)
         db.session.commit()
@@ -423,22 +761,12 @@ def add_restaurant():
             'saturday': form.saturday_hours.data,
             'sunday': form.sunday_hours.data,
         }
-        image_url = None
+        image_hash = None
         if form.restaurant_image.data:
             file = form.restaurant_image.data
             if file.filename:
-                from PIL import Image
-                from io import BytesIO
-                import base64
                 try:
-                    img = Image.open(file)
-                    img.thumbnail((400, 300), Image.Resampling.LANCZOS)
-                    img_io = BytesIO()
-                    img.save(img_io, 'PNG')
-                    img_io.seek(0)
-                    image_data = base64.b64encode(
-                        img_io.getvalue()).decode('utf-8')
-                    image_url = f"data:image/png;base64,{image_data}"
+                    image_hash = process_image_upload(file, 'cover')
                 except Exception as e:
                     flash(
                         'Invalid image file. Please upload a valid PNG or JPG.',
@@ -451,13 +779,14 @@ def add_restaurant():
                                 price_range=form.price_range.data,
                                 cuisine_id=form.cuisine_id.data,
                                 user_id=current_user.id,
-                                image_url=image_url,
+                                image_hash=image_hash,
                                 is_small_business=False,
                                 food_categories=selected_categories,
                                 location_latitude=form.location_latitude.data,
                                 location_longitude=form.location_longitude.data,
                                 is_approved=current_user.is_admin)
         db.session.add(restaurant)
+        current_user.user.apply_restaurant_submission(1)
         db.session.commit()
         if current_user.is_admin:
             flash(
@@ -505,7 +834,8 @@ def profile(user_id):
     if not FeatureToggle.get_feature_status('profiles_enabled'):
         flash('User profiles are temporarily disabled.', 'warning')
         return redirect(url_for('index'))
-    user = User.query.get_or_404(user_id)
+    from sqlalchemy.orm import undefer_group
+    user = User.query.options(undefer_group('profile')).get_or_404(user_id)
     is_own_profile = current_user.is_authenticated and current_user.id == user.id
     # Only show approved reviews unless viewing own profile or admin
     if current_user.is_authenticated and current_user.is_admin:
@@ -523,7 +853,8 @@ def profile(user_id):
 @app.route('/profile/<int:user_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile(user_id):
-    user = User.query.get_or_404(user_id)
+    from sqlalchemy.orm import undefer_group
+    user = User.query.options(undefer_group('profile')).get_or_404(user_id)
     if user.id != current_user.id and not current_user.is_admin:
         flash('You can only edit your own profile.', 'danger')
         return redirect(url_for('profile', user_id=user_id))
@@ -533,15 +864,9 @@ def edit_profile(user_id):
         if form.profile_picture.data:
             file = form.profile_picture.data
             if file.filename:
-                from PIL import Image
-                from io import BytesIO
                 try:
-                    img = Image.open(file)
-                    img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-                    img_io = BytesIO()
-                    img.save(img_io, 'PNG')
-                    img_io.seek(0)
-                    user.profile_picture = img_io.getvalue()
+                    user.profile_picture_hash = process_image_upload(
+                        file, 'avatar')
                 except Exception as e:
                     flash(
                         'Invalid image file. Please upload a valid PNG or JPG.',
@@ -561,43 +886,52 @@ def search():
     if not FeatureToggle.get_feature_status('search_enabled'):
         flash('Search is temporarily disabled.', 'warning')
         return redirect(url_for('restaurants'))
+    from sqlalchemy.orm import joinedload
     query = request.args.get('q', '').strip()
     restaurants = []
+    is_suggestion = False
     if query:
-        name_matches = Restaurant.query.filter(
-            Restaurant.is_approved == True,
-            Restaurant.name.ilike(f'%{query}%')).all()
-        restaurants.extend(name_matches)
-        if not name_matches:
-            from sqlalchemy import or_
-            related = Restaurant.query.join(Cuisine).filter(
-                Restaurant.is_approved == True,
-                or_(Cuisine.name.ilike(f'%{query}%'),
-                    Restaurant.description.ilike(f'%{query}%'))).all()
-            restaurants.extend(related)
-            if not related:
-                restaurants = Restaurant.query.filter(
+        restaurants = search_restaurants(query)
+        if not restaurants:
+            # Nothing matched; suggest promoted and recent restaurants
+            is_suggestion = True
+            restaurants = Restaurant.query.options(
+                joinedload(Restaurant.cuisine)).filter(
                     Restaurant.is_approved == True).order_by(
                         Restaurant.is_promoted.desc(),
                         Restaurant.created_at.desc()).limit(10).all()
-    return render_template(
-        'search_results.html',
-        restaurants=restaurants,
-        query=query,
-        is_suggestion=bool(query and not any(query.lower() in r.name.lower()
-                                             for r in restaurants)))
+    preload_variants(r.image_hash for r in restaurants)
+    return render_template('search_results.html',
+                           restaurants=restaurants,
+                           query=query,
+                           is_suggestion=is_suggestion)
+
+
+@app.route('/api/search/suggest')
+def search_suggest():
+    """Typeahead suggestions for the search box, answered from memory"""
+    if not FeatureToggle.get_feature_status('search_enabled'):
+        return jsonify({'error': 'Search is disabled'}), 403
+    query = request.args.get('q', '').strip()
+    suggestions = []
+    for kind, ref, label in suggestion_index.lookup(query):
+        if kind == 'restaurant':
+            url = url_for('restaurant_detail', id=ref)
+        elif kind == 'cuisine':
+            url = url_for('restaurants', cuisine=ref)
+        else:
+            url = url_for('search', q=label)
+        suggestions.append({'type': kind, 'label': label, 'url': url})
+    return jsonify({'query': query, 'suggestions': suggestions})
 
 
 def get_admin_data():
-    """Helper function to get all admin data"""
-    pending_restaurants = Restaurant.query.filter_by(
-        is_approved=False).order_by(Restaurant.created_at.desc()).all()
-    approved_restaurants = Restaurant.query.filter_by(
-        is_approved=True).order_by(Restaurant.created_at.desc()).all()
-    all_users = User.query.all()
-    all_reviews = Review.query.order_by(Review.created_at.desc()).all()
-    pending_reviews = Review.query.filter_by(
-        is_approved=False).order_by(Review.created_at.desc()).all()
+    """Helper function to get the admin dashboard totals and settings.
+
+    No table is loaded whole here; the dashboard pages through the
+    moderation queues and the approved rows with the /admin/api/<tab>
+    endpoints.
+    """
     all_cuisines = Cuisine.query.all()
     feature_toggles = FeatureToggle.query.all()
     toggle_dict = {
@@ -636,15 +970,13 @@ def get_admin_data():
                 'description': description
             }
     db.session.commit()
+    if len(toggle_dict) != len(feature_toggles):
+        FeatureToggle.invalidate_cache()
     return {
-        'pending': pending_restaurants,
-        'approved': approved_restaurants,
-        'all_users': all_users,
-        'all_reviews': all_reviews,
-        'pending_reviews': pending_reviews,
         'all_cuisines': all_cuisines,
-        'total_users': len(all_users),
-        'total_reviews': len(all_reviews),
+        'total_approved': Restaurant.query.filter_by(is_approved=True).count(),
+        'total_users': User.query.count(),
+        'total_reviews': Review.query.count(),
         'feature_toggles': toggle_dict
     }
 
@@ -704,17 +1036,200 @@ def admin_dashboard():
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('index'))
     tab = request.args.get('tab', 'overview')
-    data = get_admin_data()
-    return render_template('admin_dashboard.html',
-                           tab=tab,
-                           pending=data['pending'],
-                           approved=data['approved'],
-                           all_users=data['all_users'],
-                           all_reviews=data['all_reviews'],
-                           pending_reviews=data['pending_reviews'],
-                           all_cuisines=data['all_cuisines'],
-                           total_users=data['total_users'],
-                           total_reviews=data['total_reviews'])
+    # Tab contents are fetched by the page from the admin API endpoints
+    return render_template('admin_dashboard.html', tab=tab)
+
+
+# Incremental admin sync: rows changed within this window before the
+# client's watermark are resent, covering transactions still in flight
+ADMIN_SYNC_OVERLAP = timedelta(seconds=5)
+# Tombstones older than this are pruned; older watermarks force a full reload
+ADMIN_SYNC_TOMBSTONE_RETENTION = timedelta(days=1)
+
+
+def format_admin_restaurant(r):
+    return {
+        'id': r.id,
+        'name': r.name,
+        'cuisine': r.cuisine.name,
+        'description': r.description[:100],
+        'full_description': r.description,
+        'working_hours': r.working_hours,
+        'price_range': r.price_range,
+        'is_small_business': r.is_small_business,
+        'is_promoted': r.is_promoted,
+        'is_approved': r.is_approved,
+        'food_categories': r.food_categories if r.food_categories else [],
+        'image_url': r.cover_image_url,
+        'image_status': image_status(r.image_hash),
+        'review_count': r.review_count(),
+        'avg_rating': round(r.avg_rating or 0, 1),
+        'created_at': r.created_at.strftime('%b %d, %Y'),
+        'submitter_username':
+        r.submitter.username if r.submitter else 'Unknown',
+        'submitter_email': r.submitter.email if r.submitter else 'Unknown',
+        'cuisine_id': r.cuisine_id
+    }
+
+
+def format_admin_restaurants(restaurants):
+    """format_admin_restaurant for a list, with image lookups batched"""
+    preload_variants(r.image_hash for r in restaurants)
+    return [format_admin_restaurant(r) for r in restaurants]
+
+
+def format_admin_user(u, include_badges=False):
+    user_data = {
+        'id': u.id,
+        'username': u.username,
+        'email': u.email,
+        'is_admin': u.is_admin,
+        'is_banned': u.is_banned,
+        'ban_reason': u.ban_reason,
+        'review_count': u.review_count(),
+        'created_at': u.created_at.strftime('%b %d, %Y')
+    }
+    if include_badges:
+        user_badges = [{
+            'id': ub.badge_id,
+            'name': ub.badge.name,
+            'color': ub.badge.color
+        } for ub in u.custom_badges.all()]
+        user_data['custom_badges'] = user_badges
+    return user_data
+
+
+def format_admin_review(r):
+    return {
+        'id': r.id,
+        'author_id': r.user_id,
+        'author_username':
+        r.author.username if r.author else 'Deleted User',
+        'restaurant_name': r.restaurant.name,
+        'restaurant_id': r.restaurant.id,
+        'rating': r.rating,
+        'title': r.title,
+        'content':
+        r.content[:80] + '...' if len(r.content) > 80 else r.content,
+        'is_approved': r.is_approved,
+        'receipt_image':
+        url_for('admin_review_receipt', id=r.id)
+        if r.receipt_image_hash else None,
+        'receipt_status': image_status(r.receipt_image_hash),
+        'receipt_confirmed': r.receipt_confirmed,
+        'created_at': r.created_at.strftime('%b %d, %Y')
+    }
+
+
+def format_admin_reviews(reviews):
+    """format_admin_review for a list, with receipt lookups batched"""
+    preload_variants(r.receipt_image_hash for r in reviews)
+    return [format_admin_review(r) for r in reviews]
+
+
+def admin_change_marker():
+    """Latest change time across everything the dashboard syncs, or None"""
+    from sqlalchemy import func, select
+    from models import DeletedRecord
+    markers = db.session.query(
+        select(func.max(Restaurant.updated_at)).scalar_subquery(),
+        select(func.max(User.updated_at)).scalar_subquery(),
+        select(func.max(Review.updated_at)).scalar_subquery(),
+        select(func.max(FeatureToggle.updated_at)).scalar_subquery(),
+        select(func.max(DeletedRecord.deleted_at)).scalar_subquery()).one()
+    markers = [m for m in markers if m is not None]
+    return max(markers) if markers else None
+
+
+def admin_sync_etag(marker, now):
+    """ETag value for the dashboard sync endpoints.
+
+    A transaction can commit up to ADMIN_SYNC_OVERLAP after its updated_at,
+    possibly older than the marker, without moving it. Until the marker is
+    that old the ETag also carries the current time, so it never matches
+    later and a 304 can't hide such a row.
+    """
+    etag = marker.isoformat() if marker else 'empty'
+    if marker is not None and now - marker < ADMIN_SYNC_OVERLAP:
+        etag += '/' + now.isoformat()
+    return etag
+
+
+@app.route('/admin/api/page-cache')
+@login_required
+def admin_api_page_cache():
+    """Page cache hit/miss counters for this worker"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return admin_page_response(page_cache.stats())
+
+
+@app.route('/admin/perf', methods=['GET', 'POST'])
+@login_required
+def admin_perf():
+    """Per-endpoint latency and SQL statement percentiles for this worker;
+    POST clears the window"""
+    if not current_user.is_admin:
+        flash('Access denied. Admin privileges required.', 'danger')
+        return redirect(url_for('index'))
+    from perf import (endpoint_stats, PERCENTILES, PERF_WINDOW,
+                      PERF_QUERY_WARNING)
+    if request.method == 'POST':
+        endpoint_stats.reset()
+        flash('Performance samples cleared.', 'success')
+        return redirect(url_for('admin_perf'))
+    return render_template('admin_perf.html',
+                           endpoints=endpoint_stats.summary(),
+                           percentiles=PERCENTILES,
+                           window=PERF_WINDOW,
+                           query_warning=PERF_QUERY_WARNING,
+                           pid=os.getpid())
+
+
+# Maintenance jobs an admin may queue from /admin/api/jobs
+ADMIN_JOBS = (tasks.REPUTATION_REPLAY, tasks.USER_STATS_RECONCILE,
+              tasks.LEADERBOARD_REBUILD)
+
+
+@app.route('/admin/api/jobs', methods=['GET', 'POST'])
+@login_required
+def admin_api_jobs():
+    """Background job counts and recent failures; POST queues a
+    maintenance job by name"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    from sqlalchemy import func
+    from models import Job
+    if request.method == 'POST':
+        name = request.form.get('name', '')
+        if name not in ADMIN_JOBS:
+            return jsonify({'error': 'Unknown job'}), 400
+        job = enqueue(name)
+        db.session.commit()
+        return admin_page_response({
+            'id': job.id,
+            'name': job.name,
+            'status': job.status
+        })
+    counts = {
+        status: count
+        for status, count in db.session.query(Job.status, func.count(
+            Job.id)).group_by(Job.status)
+    }
+    failed = Job.query.filter(Job.status == 'failed').order_by(
+        Job.finished_at.desc()).limit(20).all()
+    # Failures carry tracebacks, so shared caches must not keep them
+    return admin_page_response({
+        'counts': counts,
+        'failed': [{
+            'id': job.id,
+            'name': job.name,
+            'ref': job.ref,
+            'attempts': job.attempts,
+            'error': job.last_error,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } for job in failed]
+    })
 
 
 @app.route('/admin/api/data')
@@ -722,7 +1237,19 @@ def admin_dashboard():
 def admin_api_data():
     if not current_user.is_admin:
         return jsonify({'error': 'Unauthorized'}), 403
-    from models import Badge, UserBadge
+    from models import Badge, UserBadge, DeletedRecord
+
+    # Cuisines and badges carry no change time but are tiny
+    marker = admin_change_marker()
+    etag = page_etag(admin_sync_etag(marker, datetime.utcnow()),
+                     tuple(db.session.query(Cuisine.id, Cuisine.name)),
+                     badge_marker())
+    cached = not_modified(etag, marker)
+    if cached:
+        return cached
+
+    # Taken before reading so changes made during the dump are resent
+    watermark = datetime.utcnow()
 
     # Ensure default badges exist
     seed_default_badges()
@@ -730,67 +1257,9 @@ def admin_api_data():
     # Get admin data first
     data = get_admin_data()
 
-    def format_restaurant(r):
-        return {
-            'id': r.id,
-            'name': r.name,
-            'cuisine': r.cuisine.name,
-            'description': r.description[:100],
-            'full_description': r.description,
-            'working_hours': r.working_hours,
-            'price_range': r.price_range,
-            'is_small_business': r.is_small_business,
-            'is_promoted': r.is_promoted,
-            'is_approved': r.is_approved,
-            'food_categories': r.food_categories if r.food_categories else [],
-            'image_url': r.image_url,
-            'review_count': r.review_count(),
-            'avg_rating': r.avg_rating(),
-            'created_at': r.created_at.strftime('%b %d, %Y'),
-            'submitter_username':
-            r.submitter.username if r.submitter else 'Unknown',
-            'submitter_email': r.submitter.email if r.submitter else 'Unknown',
-            'cuisine_id': r.cuisine_id
-        }
-
-    def format_user(u, include_badges=False):
-        user_data = {
-            'id': u.id,
-            'username': u.username,
-            'email': u.email,
-            'is_admin': u.is_admin,
-            'is_banned': u.is_banned,
-            'ban_reason': u.ban_reason,
-            'review_count': u.review_count(),
-            'review_count': u.review_count(),
-            'created_at': u.created_at.strftime('%b %d, %Y')
-        }
-        if include_badges:
-            user_badges = [{
-                'id': ub.badge_id,
-                'name': ub.badge.name,
-                'color': ub.badge.color
-            } for ub in u.custom_badges.all()]
-            user_data['custom_badges'] = user_badges
-        return user_data
-
-    def format_review(r):
-        return {
-            'id': r.id,
-            'author_id': r.user_id,
-            'author_username':
-            r.author.username if r.author else 'Deleted User',
-            'restaurant_name': r.restaurant.name,
-            'restaurant_id': r.restaurant.id,
-            'rating': r.rating,
-            'title': r.title,
-            'content':
-            r.content[:80] + '...' if len(r.content) > 80 else r.content,
-            'is_approved': r.is_approved,
-            'receipt_image': r.receipt_image,
-            'receipt_confirmed': r.receipt_confirmed,
-            'created_at': r.created_at.strftime('%b %d, %Y')
-        }
+    DeletedRecord.query.filter(DeletedRecord.deleted_at < watermark -
+                               ADMIN_SYNC_TOMBSTONE_RETENTION).delete()
+    db.session.commit()
 
     def format_cuisine(c):
         return {'id': c.id, 'name': c.name}
@@ -807,22 +1276,282 @@ def admin_api_data():
 
     all_badges = Badge.query.all()
 
-    return jsonify({
-        'pending': [format_restaurant(r) for r in data['pending']],
-        'approved': [format_restaurant(r) for r in data['approved']],
-        'all_users':
-        [format_user(u, include_badges=False) for u in data['all_users']],
-        'all_reviews': [format_review(r) for r in data['all_reviews']],
-        'pending_reviews': [format_review(r) for r in data['pending_reviews']],
+    response = jsonify({
+        # First page of each moderation queue, shaped like the responses of
+        # /admin/api/pending-restaurants and /admin/api/pending-reviews
+        'pending': admin_restaurant_page(approved=False),
+        'pending_reviews': admin_review_page(
+            Review.query.filter(Review.is_approved == False)),
         'all_cuisines': [format_cuisine(c) for c in data['all_cuisines']],
         'all_badges': [format_badge(b) for b in all_badges],
+        'total_approved':
+        data['total_approved'],
         'total_users':
         data['total_users'],
         'total_reviews':
         data['total_reviews'],
         'feature_toggles':
-        data['feature_toggles']
+        data['feature_toggles'],
+        'watermark': watermark.isoformat()
     })
+    return with_validators(response, etag, marker)
+
+
+@app.route('/admin/api/changes')
+@login_required
+def admin_api_changes():
+    """Rows created, updated or deleted since the client's watermark.
+
+    Answers 304 when the client's ETag still matches the latest change.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    from sqlalchemy.orm import joinedload, undefer_group
+    from models import DeletedRecord
+
+    try:
+        since = datetime.fromisoformat(request.args.get('since', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid since watermark'}), 400
+    watermark = datetime.utcnow()
+    if watermark - since > ADMIN_SYNC_TOMBSTONE_RETENTION:
+        # Deletions older than the retention window are no longer tracked
+        return jsonify({'reset': True})
+
+    marker = admin_change_marker()
+    etag = admin_sync_etag(marker, watermark)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    elif marker is None or marker <= since - ADMIN_SYNC_OVERLAP:
+        response = jsonify({'watermark': watermark.isoformat()})
+    else:
+        cutoff = since - ADMIN_SYNC_OVERLAP
+        restaurants = Restaurant.query.options(
+            undefer_group('details'), joinedload(Restaurant.cuisine),
+            joinedload(Restaurant.submitter)).filter(
+                Restaurant.updated_at > cutoff).all()
+        users = User.query.options(undefer_group('profile')).filter(
+            User.updated_at > cutoff).all()
+        reviews = Review.query.options(
+            joinedload(Review.author), joinedload(Review.restaurant)).filter(
+                Review.updated_at > cutoff).order_by(
+                    Review.created_at.desc()).all()
+        toggles = FeatureToggle.query.filter(
+            FeatureToggle.updated_at > cutoff).all()
+        deleted = {'restaurant': [], 'user': [], 'review': []}
+        for table_name, record_id in db.session.query(
+                DeletedRecord.table_name, DeletedRecord.record_id).filter(
+                    DeletedRecord.deleted_at > cutoff):
+            deleted.setdefault(table_name, []).append(record_id)
+        response = jsonify({
+            'watermark': watermark.isoformat(),
+            'restaurants': format_admin_restaurants(restaurants),
+            'users': [format_admin_user(u) for u in users],
+            'reviews': format_admin_reviews(reviews),
+            'feature_toggles': {
+                t.feature_name: {
+                    'is_enabled': t.is_enabled,
+                    'description': t.description
+                }
+                for t in toggles
+            },
+            'deleted': deleted,
+            'total_approved':
+            Restaurant.query.filter_by(is_approved=True).count(),
+            'total_users': User.query.count(),
+            'total_reviews': Review.query.count()
+        })
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# Page sizes for the paginated admin tab endpoints
+ADMIN_PAGE_SIZE = 25
+ADMIN_MAX_PAGE_SIZE = 100
+
+
+def paginate_admin_query(query, model, sort_columns, default_sort,
+                         search=None):
+    """Apply the page, per_page, sort, order and q request args to query.
+
+    sort_columns maps accepted sort keys to columns; search, given a LIKE
+    pattern, returns the conditions any of which must match q. The model's
+    id breaks ties so rows never repeat or go missing between pages.
+    """
+    from sqlalchemy import or_
+    sort = request.args.get('sort', default_sort)
+    if sort not in sort_columns:
+        sort = default_sort
+    order = 'asc' if request.args.get('order') == 'asc' else 'desc'
+    q = request.args.get('q', '').strip()
+    if q and search:
+        query = query.filter(or_(*search(f"%{q}%")))
+    if order == 'asc':
+        query = query.order_by(sort_columns[sort].asc(), model.id.asc())
+    else:
+        query = query.order_by(sort_columns[sort].desc(), model.id.desc())
+    per_page = request.args.get('per_page', ADMIN_PAGE_SIZE, type=int)
+    per_page = min(max(per_page, 1), ADMIN_MAX_PAGE_SIZE)
+    pagination = query.paginate(page=request.args.get('page', 1, type=int),
+                                per_page=per_page,
+                                error_out=False)
+    return pagination, {'sort': sort, 'order': order, 'q': q}
+
+
+def admin_page_data(pagination, items, params):
+    return {
+        'items': items,
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'pages': pagination.pages,
+        'total': pagination.total,
+        **params
+    }
+
+
+def admin_page_response(data):
+    response = jsonify(data)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def admin_restaurant_page(approved):
+    """One page of pending or approved restaurants, per the request args"""
+    from sqlalchemy.orm import joinedload, undefer_group
+    query = Restaurant.query.options(
+        undefer_group('details'), joinedload(Restaurant.cuisine),
+        joinedload(Restaurant.submitter)).filter(
+            Restaurant.is_approved == approved)
+    pagination, params = paginate_admin_query(
+        query, Restaurant, {
+            'created_at': Restaurant.created_at,
+            'name': Restaurant.name,
+            'rating': Restaurant.avg_rating,
+            'review_count': Restaurant.approved_review_count,
+            'price_range': Restaurant.price_range
+        },
+        'created_at',
+        search=lambda pattern: [
+            Restaurant.name.ilike(pattern),
+            Restaurant.description.ilike(pattern)
+        ])
+    return admin_page_data(pagination,
+                           format_admin_restaurants(pagination.items), params)
+
+
+def admin_review_page(query):
+    """One page of the reviews in query, per the request args"""
+    from sqlalchemy.orm import joinedload
+    query = query.options(joinedload(Review.author),
+                          joinedload(Review.restaurant))
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        # Served by idx_review_user_approval
+        query = query.filter(Review.user_id == user_id)
+    pagination, params = paginate_admin_query(
+        query, Review, {
+            'created_at': Review.created_at,
+            'rating': Review.rating
+        },
+        'created_at',
+        search=lambda pattern: [
+            Review.title.ilike(pattern),
+            Review.content.ilike(pattern),
+            Review.author.has(User.username.ilike(pattern)),
+            Review.restaurant.has(Restaurant.name.ilike(pattern))
+        ])
+    return admin_page_data(pagination, format_admin_reviews(pagination.items),
+                           params)
+
+
+@app.route('/admin/api/pending-restaurants')
+@login_required
+def admin_api_pending_restaurants():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return admin_page_response(admin_restaurant_page(approved=False))
+
+
+@app.route('/admin/api/approved-restaurants')
+@login_required
+def admin_api_approved_restaurants():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return admin_page_response(admin_restaurant_page(approved=True))
+
+
+@app.route('/admin/api/users')
+@login_required
+def admin_api_users():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    from sqlalchemy.orm import undefer_group
+    query = User.query.options(undefer_group('profile'))
+    pagination, params = paginate_admin_query(
+        query, User, {
+            'created_at': User.created_at,
+            'username': User.username,
+            'email': User.email,
+            'review_count': User.approved_review_count
+        },
+        'created_at',
+        search=lambda pattern:
+        [User.username.ilike(pattern),
+         User.email.ilike(pattern)])
+    return admin_page_response(
+        admin_page_data(pagination,
+                        [format_admin_user(u) for u in pagination.items],
+                        params))
+
+
+@app.route('/admin/api/reviews')
+@login_required
+def admin_api_reviews():
+    """Approved reviews; receipt=unconfirmed limits to receipts to verify"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    query = Review.query.filter(Review.is_approved == True)
+    if request.args.get('receipt') == 'unconfirmed':
+        query = query.filter(Review.receipt_image_hash.isnot(None),
+                             Review.receipt_confirmed == False)
+    return admin_page_response(admin_review_page(query))
+
+
+@app.route('/admin/api/pending-reviews')
+@login_required
+def admin_api_pending_reviews():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    return admin_page_response(
+        admin_review_page(Review.query.filter(Review.is_approved == False)))
+
+
+@app.route('/admin/review/<int:id>/receipt')
+@login_required
+def admin_review_receipt(id):
+    """Receipt image for one review, fetched when the admin opens it"""
+    if not current_user.is_admin:
+        abort(403)
+    receipt_hash = db.session.query(
+        Review.receipt_image_hash).filter_by(id=id).scalar()
+    if not receipt_hash:
+        abort(404)
+    if receipt_hash in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        data = get_blob_store().get(receipt_hash)
+        if data is None:
+            abort(404)
+        response = app.response_class(
+            data, mimetype=sniff_image_type(data) or 'application/octet-stream')
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.set_etag(receipt_hash)
+    response.cache_control.private = True
+    response.cache_control.max_age = 3600
+    return response
 
 
 @app.route('/admin/approve/<int:id>', methods=['POST'])
@@ -832,12 +1561,16 @@ def approve_restaurant(id):
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('index'))
     restaurant = Restaurant.query.get_or_404(id)
+    if restaurant.is_approved:
+        # A re-submitted form must not write a second ledger event
+        flash(f'{restaurant.name} is already approved.', 'info')
+        return redirect(url_for('admin_dashboard', tab='restaurants'))
     restaurant.is_approved = True
     restaurant.approved_by_id = current_user.id
     restaurant.approved_at = datetime.utcnow()
+    award_points([(restaurant.user_id, RESTAURANT_POINTS,
+                   REASON_RESTAURANT_APPROVED, restaurant.id)])
     db.session.commit()
-    if restaurant.user_id:
-        award_restaurant_points(restaurant.user_id)
     flash(f'{restaurant.name} has been approved!', 'success')
     return redirect(url_for('admin_dashboard', tab='restaurants'))
 
@@ -848,14 +1581,17 @@ def approve_review(id):
     if not current_user.is_admin:
         return jsonify({'error': 'Unauthorized'}), 403
     review = Review.query.get_or_404(id)
+    if not review.is_approved:
+        review.apply_approval(1)
     review.is_approved = True
     review.approved_by_id = current_user.id
     review.approved_at = datetime.utcnow()
+    LeaderboardEntry.refresh([review.user_id])
     db.session.commit()
     
     # Don't award points for approval - only for receipt confirmation
     # Customize message based on whether review has receipt
-    if review.receipt_image and not review.receipt_confirmed:
+    if review.receipt_image_hash and not review.receipt_confirmed:
         message = 'Review approved! Consider confirming the receipt for additional trust verification.'
     else:
         message = 'Review approved and published!'
@@ -872,20 +1608,29 @@ def confirm_receipt(id):
     
     # Auto-approve review if it's not already approved
     was_not_approved = not review.is_approved
+    already_confirmed = review.receipt_confirmed
+    if was_not_approved:
+        review.apply_approval(1)
     review.is_approved = True
     review.receipt_confirmed = True
     review.approved_by_id = current_user.id
     review.approved_at = datetime.utcnow()
-    db.session.commit()
     
-    # Award points to reviewer for receipt confirmation (not approval)
-    if review.user_id:
-        award_review_points(review.user_id)
-        reviewer = User.query.get(review.user_id)
-        if reviewer:
-            reviewer.update_reputation()
+    # Award points to reviewer for receipt confirmation (not approval),
+    # in the same transaction as the confirmation itself. The ledger isn't
+    # idempotent, so confirming again awards nothing, as in bulk moderation
+    if not already_confirmed and award_points([
+            (review.user_id, REVIEW_POINTS, REASON_REVIEW_CONFIRMED, review.id)
+    ]):
+        review.author.update_reputation()
+    db.session.commit()
     
-    message = 'Receipt confirmed and review approved!' if was_not_approved else 'Receipt confirmed! Reviewer earned 5 reputation points.'
+    if already_confirmed:
+        message = 'Receipt was already confirmed.'
+    elif was_not_approved:
+        message = 'Receipt confirmed and review approved!'
+    else:
+        message = 'Receipt confirmed! Reviewer earned 5 reputation points.'
     return jsonify({'success': True, 'message': message})
 
 
@@ -896,7 +1641,10 @@ def reject_review(id):
         return jsonify({'error': 'Unauthorized'}), 403
     review = Review.query.get_or_404(id)
     restaurant_id = review.restaurant_id
+    if review.is_approved:
+        review.apply_approval(-1)
     db.session.delete(review)
+    LeaderboardEntry.refresh([review.user_id])
     db.session.commit()
     return jsonify({'success': True, 'message': 'Review rejected and removed.'})
 
@@ -907,13 +1655,136 @@ def reject_restaurant(id):
     if not current_user.is_admin:
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('index'))
+    from deletion import delete_restaurants
     restaurant = Restaurant.query.get_or_404(id)
-    db.session.delete(restaurant)
+    name = restaurant.name
+    # Also recounts the stats and badges of the submitter and of everyone
+    # whose approved reviews go with it
+    delete_restaurants([restaurant.id])
     db.session.commit()
-    flash(f'{restaurant.name} has been rejected and removed.', 'warning')
+    flash(f'{name} has been rejected and removed.', 'warning')
     return redirect(url_for('admin_dashboard', tab='overview'))
 
 
+def bulk_ids():
+    """Distinct integer ids posted as ids[], ignoring malformed values"""
+    ids = set()
+    for value in request.form.getlist('ids[]'):
+        try:
+            ids.add(int(value))
+        except ValueError:
+            continue
+    return sorted(ids)
+
+
+@app.route('/admin/api/reviews/bulk', methods=['POST'])
+@login_required
+def bulk_moderate_reviews():
+    """Approve, confirm or reject many reviews with one commit.
+
+    Rating aggregates, author stats, badges, reputation and leaderboard
+    rows are recomputed once per affected restaurant or user rather than
+    once per review.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    from deletion import delete_reviews
+    action = request.form.get('action')
+    if action not in ('approve', 'confirm', 'reject'):
+        return jsonify({'error': 'Invalid action'}), 400
+    rows = db.session.query(
+        Review.id, Review.user_id, Review.restaurant_id,
+        Review.receipt_confirmed,
+        Review.receipt_image_hash.isnot(None).label('has_receipt')).filter(
+            Review.id.in_(bulk_ids())).all()
+    if not rows:
+        return jsonify({'error': 'No reviews selected'}), 400
+    review_ids = [row.id for row in rows]
+    user_ids = {row.user_id for row in rows if row.user_id}
+    # Confirming approves every selected review but only confirms, and
+    # only pays for, receipts that exist and weren't confirmed already
+    confirmed = [row for row in rows
+                 if action == 'confirm' and row.has_receipt
+                 and not row.receipt_confirmed]
+
+    if action == 'reject':
+        delete_reviews(review_ids)
+    else:
+        Review.query.filter(Review.id.in_(review_ids)).update(
+            {
+                'is_approved': True,
+                'approved_by_id': current_user.id,
+                'approved_at': datetime.utcnow()
+            },
+            synchronize_session=False)
+        if confirmed:
+            Review.query.filter(
+                Review.id.in_([row.id for row in confirmed])).update(
+                    {'receipt_confirmed': True}, synchronize_session=False)
+    Restaurant.reconcile_rating_aggregates(
+        {row.restaurant_id for row in rows})
+    User.reconcile_stats(user_ids)
+    User.recompute_badges(user_ids)
+    # Only confirmations earn points, once per review
+    award_points([(row.user_id, REVIEW_POINTS, REASON_REVIEW_CONFIRMED,
+                   row.id) for row in confirmed])
+    LeaderboardEntry.refresh(user_ids)
+    db.session.commit()
+    if action == 'confirm':
+        message = (f'{len(review_ids)} review(s) approved, '
+                   f'{len(confirmed)} receipt(s) confirmed.')
+    else:
+        past_tense = {'approve': 'approved', 'reject': 'rejected'}[action]
+        message = f'{len(review_ids)} review(s) {past_tense}.'
+    return jsonify({
+        'success': True,
+        'count': len(review_ids),
+        'message': message
+    })
+
+
+@app.route('/admin/api/restaurants/bulk', methods=['POST'])
+@login_required
+def bulk_moderate_restaurants():
+    """Approve or reject many pending restaurant submissions with one commit"""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    from deletion import delete_restaurants
+    from search import note_bulk_changes
+    action = request.form.get('action')
+    if action not in ('approve', 'reject'):
+        return jsonify({'error': 'Invalid action'}), 400
+    rows = db.session.query(
+        Restaurant.id, Restaurant.name, Restaurant.user_id).filter(
+            Restaurant.id.in_(bulk_ids()),
+            Restaurant.is_approved == False).all()
+    if not rows:
+        return jsonify({'error': 'No pending restaurants selected'}), 400
+    restaurant_ids = [row.id for row in rows]
+
+    if action == 'approve':
+        Restaurant.query.filter(Restaurant.id.in_(restaurant_ids)).update(
+            {
+                'is_approved': True,
+                'approved_by_id': current_user.id,
+                'approved_at': datetime.utcnow()
+            },
+            synchronize_session=False)
+        note_bulk_changes('restaurant',
+                          ((row.id, row.name) for row in rows))
+        award_points([(row.user_id, RESTAURANT_POINTS,
+                       REASON_RESTAURANT_APPROVED, row.id) for row in rows])
+    else:
+        delete_restaurants(restaurant_ids)
+    db.session.commit()
+    past_tense = {'approve': 'approved', 'reject': 'rejected'}[action]
+    return jsonify({
+        'success': True,
+        'count': len(restaurant_ids),
+        'message': f'{len(restaurant_ids)} restaurant(s) {past_tense}.'
+    })
+
+
 @app.route('/admin/badge/<int:badge_id>/hierarchy', methods=['POST'])
 @login_required
 def update_badge_hierarchy(badge_id):
@@ -931,15 +1802,34 @@ def update_badge_hierarchy(badge_id):
 
 
 @app.route('/leaderboard')
+@cached_page
 def leaderboard():
     if not FeatureToggle.get_feature_status('leaderboard_enabled'):
         flash('Leaderboard is temporarily disabled.', 'warning')
         return redirect(url_for('index'))
-    all_users = (User.query.filter(
-        User.is_admin == False, User.is_banned == False).order_by(
-            User.reputation_score.desc()).all())
-    all_users = [u for u in all_users if (u.reputation_score or 0) > 0]
-    return render_template('leaderboard.html', users=all_users)
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import joinedload
+    # Snapshot rows change whenever a rank or score does; names and
+    # pictures come from the users themselves
+    marker = db.session.query(
+        func.max(LeaderboardEntry.updated_at),
+        func.count(LeaderboardEntry.user_id),
+        select(func.max(User.updated_at)).where(
+            User.id.in_(select(LeaderboardEntry.user_id))).scalar_subquery()
+    ).one()
+    changed = [value for value in marker if isinstance(value, datetime)]
+    etag = page_etag(tuple(marker))
+    last_modified = max(changed) if changed else None
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+    entries = LeaderboardEntry.query.options(joinedload(
+        LeaderboardEntry.user)).order_by(LeaderboardEntry.rank).paginate(
+            page=request.args.get('page', 1, type=int),
+            per_page=LEADERBOARD_PER_PAGE,
+            error_out=False)
+    return with_validators(render_template('leaderboard.html', entries=entries),
+                           etag, last_modified)
 
 
 @app.route('/admin/toggle-promoted/<int:id>', methods=['POST'])
@@ -964,7 +1854,14 @@ def delete_restaurant(id):
         return redirect(url_for('index'))
     restaurant = Restaurant.query.get_or_404(id)
     name = restaurant.name
+    # Its reviews are deleted with it, changing their authors' standings
+    author_ids = [
+        user_id for (user_id, ) in db.session.query(Review.user_id).filter(
+            Review.restaurant_id == id, Review.is_approved == True)
+    ]
     db.session.delete(restaurant)
+    User.reconcile_stats(author_ids + [restaurant.user_id])
+    LeaderboardEntry.refresh(author_ids)
     db.session.commit()
     flash(f'{name} has been deleted.', 'success')
     return redirect(url_for('admin_dashboard', tab='restaurants'))
@@ -983,10 +1880,12 @@ def manage_user(id):
         status = 'promoted to admin' if user.is_admin else 'demoted from admin'
         flash(f'{user.username} has been {status}.', 'success')
     elif action == 'delete':
+        from deletion import delete_users
         username = user.username
-        Review.query.filter_by(user_id=id).update({'user_id': None})
-        db.session.delete(user)
-        flash(f'{username} has been deleted.', 'success')
+        if delete_users([id], successor_id=current_user.id)['users']:
+            flash(f'{username} has been deleted.', 'success')
+        else:
+            flash('You cannot delete your own account.', 'danger')
     elif action == 'ban':
         ban_reason = request.form.get('ban_reason', '').strip()[:500]
         user.is_banned = True
@@ -1032,6 +1931,7 @@ def manage_user(id):
                 return redirect(url_for('admin_dashboard', tab='users'))
             user.set_password(new_password)
         flash(f'User has been updated.', 'success')
+    LeaderboardEntry.refresh([id])
     db.session.commit()
     return redirect(url_for('admin_dashboard', tab='users'))
 
@@ -1042,7 +1942,9 @@ def edit_restaurant(id):
     if not current_user.is_admin:
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('index'))
-    restaurant = Restaurant.query.get_or_404(id)
+    from sqlalchemy.orm import undefer_group
+    restaurant = Restaurant.query.options(
+        undefer_group('details')).get_or_404(id)
     restaurant.name = request.form.get(
         'name', restaurant.name).strip()[:100] or restaurant.name
     restaurant.description = request.form.get(
@@ -1056,7 +1958,7 @@ def edit_restaurant(id):
             'working_hours',
     restaurant.working_hours).strip()[:500] or restaurant.working_hours
         
-        # Handle location coordinates
+    # Handle location coordinates
     try:
         lat = request.form.get('location_latitude', '').strip()
         lon = request.form.get('location_longitude', '').strip()
@@ -1065,54 +1967,41 @@ def edit_restaurant(id):
             restaurant.location_longitude = float(lon)
     except (ValueError, TypeError):
         pass
-        
-        if 'restaurant_image' in request.files:
-            file = request.files['restaurant_image']
+
+    file = request.files.get('restaurant_image')
     if file and file.filename:
-        try:
-            from PIL import Image
-            from io import BytesIO
-            import base64
-            allowed_extensions = {'png', 'jpg', 'jpeg'}
-            filename = file.filename.lower()
-            if any(
-                filename.endswith('.' + ext)
-                for ext in allowed_extensions):
-                try:
-                    img = Image.open(file)
-                    img.thumbnail((400, 300), Image.Resampling.LANCZOS)
-                    img_io = BytesIO()
-                    img.save(img_io, 'PNG')
-                    img_io.seek(0)
-                    image_data = base64.b64encode(
-                    img_io.getvalue()).decode('utf-8')
-                    restaurant.image_url = f"data:image/png;base64,{image_data}"
-                except Exception as e:
-                    pass
-            cuisine_id = int(request.form.get('cuisine_id', restaurant.cuisine_id))
-            if not Cuisine.query.get(cuisine_id):
-                flash('Invalid cuisine selected.', 'danger')
-                return redirect(url_for('admin_dashboard', tab='restaurants'))
-            restaurant.cuisine_id = cuisine_id
-            price_range = int(
-                request.form.get('price_range', restaurant.price_range))
-            if price_range not in [1, 2, 3, 4]:
-                price_range = restaurant.price_range
-            restaurant.price_range = price_range
-            restaurant.is_small_business = request.form.get(
-                'is_small_business') == 'on'
-            restaurant.is_approved = request.form.get('is_approved') == 'on'
-            restaurant.is_promoted = request.form.get('is_promoted') == 'on'
-            food_categories_input = request.form.get('food_categories', '').strip()
-            restaurant.food_categories = [
-                tag.strip() for tag in food_categories_input.split(',')
-                if tag.strip()
-            ] if food_categories_input else []
-            db.session.commit()
-            flash(f'{restaurant.name} has been updated.', 'success')
-        except (ValueError, TypeError) as e:
-            flash('Error updating restaurant. Please check your input.', 'danger')
-        return redirect(url_for('admin_dashboard', tab='restaurants'))
+        allowed_extensions = {'png', 'jpg', 'jpeg'}
+        filename = file.filename.lower()
+        if any(filename.endswith('.' + ext) for ext in allowed_extensions):
+            try:
+                restaurant.image_hash = process_image_upload(file, 'cover')
+            except Exception as e:
+                pass
+    try:
+        cuisine_id = int(request.form.get('cuisine_id', restaurant.cuisine_id))
+        if not Cuisine.query.get(cuisine_id):
+            flash('Invalid cuisine selected.', 'danger')
+            return redirect(url_for('admin_dashboard', tab='restaurants'))
+        restaurant.cuisine_id = cuisine_id
+        price_range = int(
+            request.form.get('price_range', restaurant.price_range))
+        if price_range not in [1, 2, 3, 4]:
+            price_range = restaurant.price_range
+        restaurant.price_range = price_range
+        restaurant.is_small_business = request.form.get(
+            'is_small_business') == 'on'
+        restaurant.is_approved = request.form.get('is_approved') == 'on'
+        restaurant.is_promoted = request.form.get('is_promoted') == 'on'
+        food_categories_input = request.form.get('food_categories', '').strip()
+        restaurant.food_categories = [
+            tag.strip() for tag in food_categories_input.split(',')
+            if tag.strip()
+        ] if food_categories_input else []
+        db.session.commit()
+        flash(f'{restaurant.name} has been updated.', 'success')
+    except (ValueError, TypeError) as e:
+        flash('Error updating restaurant. Please check your input.', 'danger')
+    return redirect(url_for('admin_dashboard', tab='restaurants'))
 
 
 @app.route('/admin/bulk-delete', methods=['POST'])
@@ -1121,7 +2010,6 @@ def bulk_delete():
     if not current_user.is_admin:
         return jsonify({'error': 'Access denied'}), 403
     item_type = request.form.get('type')
-    ids = request.form.getlist('ids[]')
     if not item_type or item_type not in [
             'user', 'restaurant', 'review', 'cuisine'
     ]:
@@ -1135,22 +2023,32 @@ def bulk_delete():
         return redirect(
             url_for('admin_dashboard',
                     tab=tab_mapping.get(item_type, 'overview')))
+    import deletion
+    ids = bulk_ids()
     if item_type == 'user':
-        for user_id in ids:
-            Review.query.filter_by(user_id=int(user_id)).update(
-                {'user_id': None})
-            User.query.filter_by(id=int(user_id)).delete()
-        flash(f'Deleted {len(ids)} user(s).', 'success')
+        counts = deletion.delete_users(ids, successor_id=current_user.id)
+        flash(
+            f"Deleted {counts['users']} user(s) and {counts['badges']} badge "
+            f"assignment(s). {counts['reviews_kept']} review(s) were kept "
+            f"without an author.", 'success')
     elif item_type == 'restaurant':
-        Restaurant.query.filter(Restaurant.id.in_([int(id)
-                                                   for id in ids])).delete()
-        flash(f'Deleted {len(ids)} restaurant(s).', 'success')
+        counts = deletion.delete_restaurants(ids)
+        flash(
+            f"Deleted {counts['restaurants']} restaurant(s), "
+            f"{counts['reviews']} review(s) and {counts['comments']} "
+            f"comment(s).", 'success')
     elif item_type == 'review':
-        Review.query.filter(Review.id.in_([int(id) for id in ids])).delete()
-        flash(f'Deleted {len(ids)} review(s).', 'success')
+        counts = deletion.delete_reviews(ids)
+        flash(
+            f"Deleted {counts['reviews']} review(s) and "
+            f"{counts['comments']} comment(s).", 'success')
     elif item_type == 'cuisine':
-        Cuisine.query.filter(Cuisine.id.in_([int(id) for id in ids])).delete()
-        flash(f'Deleted {len(ids)} cuisine(s).', 'success')
+        counts = deletion.delete_cuisines(ids)
+        flash(f"Deleted {counts['cuisines']} cuisine(s).", 'success')
+        if counts['cuisines_in_use']:
+            flash(
+                f"{counts['cuisines_in_use']} cuisine(s) still have "
+                f"restaurants and were kept.", 'warning')
     db.session.commit()
     tab_mapping = {
         'review': 'reviews',
@@ -1169,7 +2067,10 @@ def delete_review(id):
         flash('Access denied. Admin privileges required.', 'danger')
         return redirect(url_for('index'))
     review = Review.query.get_or_404(id)
+    if review.is_approved:
+        review.apply_approval(-1)
     db.session.delete(review)
+    LeaderboardEntry.refresh([review.user_id])
     db.session.commit()
     flash('Review has been deleted.', 'success')
     return redirect(url_for('admin_dashboard', tab='reviews'))
@@ -1224,6 +2125,7 @@ def edit_cuisine(id):
 
 
 @app.route('/news')
+@cached_page
 def news():
     if not FeatureToggle.get_feature_status('news_enabled'):
         flash('News is temporarily disabled.', 'warning')
@@ -1239,9 +2141,33 @@ def news_detail(news_id):
     if not FeatureToggle.get_feature_status('news_enabled'):
         flash('News is temporarily disabled.', 'warning')
         return redirect(url_for('index'))
+    from sqlalchemy import func, select
+    from sqlalchemy.orm import aliased
+    # Posts aren't edited, so the page changes only when the author posts
+    # again, a post is removed or the author is renamed or handed over
+    other = aliased(News)
+    marker = db.session.query(
+        News.created_at, News.user_id,
+        select(func.max(other.created_at)).where(
+            other.user_id == News.user_id).scalar_subquery(),
+        select(func.count(other.id)).where(
+            other.user_id == News.user_id).scalar_subquery(),
+        select(User.updated_at).where(
+            User.id == News.user_id).scalar_subquery()).filter(
+                News.id == news_id).first()
+    if marker is None:
+        abort(404)
+    changed = [value for value in marker if isinstance(value, datetime)]
+    etag = page_etag(tuple(marker))
+    last_modified = max(changed) if changed else None
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
     news_post = News.query.get_or_404(news_id)
     related_posts = News.query.filter(News.user_id == news_post.user_id, News.id != news_post.id).order_by(News.created_at.desc()).limit(3).all()
-    return render_template('news_detail.html', post=news_post, related_posts=related_posts)
+    return with_validators(
+        render_template('news_detail.html', post=news_post, related_posts=related_posts),
+        etag, last_modified)
 
 
 @app.route('/post_news', methods=['GET', 'POST'])
@@ -1313,6 +2239,7 @@ def toggle_feature(feature_name):
     else:
         feature.is_enabled = not feature.is_enabled
     db.session.commit()
+    FeatureToggle.invalidate_cache()
     return jsonify({
         'success': True,
         'feature_name': feature_name,
@@ -1480,6 +2407,18 @@ def forbidden_error(error):
     ), 403
 
 
+@app.errorhandler(413)
+def request_too_large_error(error):
+    return render_template(
+        'error.html',
+        error_code=413,
+        error_title='File Too Large',
+        error_message='The file you uploaded is too large.',
+        error_description=
+        'Images can be at most 2MB. Please choose a smaller file or reduce its size and try again.'
+    ), 413
+
+
 @app.errorhandler(400)
 def bad_request_error(error):
     return render_template(
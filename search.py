@@ -0,0 +1,473 @@
+"""
+Restaurant Search for Yalla
+Ranked full-text search over approved restaurants.
+
+On PostgreSQL the restaurant name and description are matched with a
+tsvector GIN index (idx_restaurant_search, see add_search_index.py) and
+ranked with ts_rank. Other databases (SQLite in development) fall back to
+an in-process inverted index that is rebuilt from one query whenever a
+searchable column changes.
+
+Both backends fold Arabic spelling variants and strip diacritics the same
+way and use the language-neutral 'simple' configuration, so Arabic and
+English text match however it was typed. Every query word is matched as
+a prefix, cuisine names count at half weight and promoted restaurants get
+a fixed relevance boost.
+
+Search box suggestions come from a separate in-memory prefix index over
+restaurant, cuisine and food category names that is updated as changes
+commit, so lookups never touch the database.
+"""
+
+import bisect
+import os
+import re
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import any_, event, func, inspect, select, text
+from sqlalchemy.orm import Session
+# Registers the typed to_tsvector/to_tsquery/ts_rank function constructs
+import sqlalchemy.dialects.postgresql  # noqa: F401
+
+from app import db
+from models import Restaurant, Cuisine, FoodCategory
+
+# Arabic letter variants folded to one spelling (alef forms, ta marbuta,
+# alef maqsura) and marks removed entirely (harakat, shadda, tatweel)
+ARABIC_FOLD_FROM = 'أإآٱةى'
+ARABIC_FOLD_TO = 'ااااهي'
+ARABIC_STRIP = 'ًٌٍَُِّْٰـ'
+
+_FOLD_TABLE = str.maketrans(ARABIC_FOLD_FROM, ARABIC_FOLD_TO, ARABIC_STRIP)
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Relevance weights shared by both backends
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+CUISINE_WEIGHT = 0.5
+PROMOTED_BOOST = 1.5
+
+SEARCH_RESULT_LIMIT = 50
+SUGGESTION_LIMIT = 8
+# Upper bound on index keys examined by one suggestion lookup
+SUGGESTION_SCAN_LIMIT = 200
+
+# Language-neutral text search configuration: no stemming or stop words,
+# which works for Arabic and English alike
+SEARCH_CONFIG = text("'simple'")
+
+# Columns whose changes affect search results
+SEARCHABLE_COLUMNS = ('name', 'description', 'cuisine_id', 'is_approved',
+                      'is_promoted')
+
+
+def normalize_text(text):
+    """Lowercase text and fold Arabic spelling variants"""
+    return (text or '').translate(_FOLD_TABLE).casefold()
+
+
+def tokenize(text):
+    """Split normalized text into searchable words"""
+    return _TOKEN_PATTERN.findall(normalize_text(text))
+
+
+def _folded(column):
+    """SQL equivalent of normalize_text (to_tsvector lowercases itself)"""
+    # translate() drops characters that have no counterpart in the target
+    return func.translate(func.coalesce(column, ''),
+                          ARABIC_FOLD_FROM + ARABIC_STRIP, ARABIC_FOLD_TO)
+
+
+def _tsvector(column, weight):
+    return func.setweight(func.to_tsvector(SEARCH_CONFIG, _folded(column)),
+                          weight)
+
+
+# Name weighted 'A' (1.0) and description 'B' (0.4) in ts_rank's defaults
+restaurant_search_document = (
+    _tsvector(Restaurant.name, 'A').op('||')(
+        _tsvector(Restaurant.description, 'B')))
+cuisine_search_document = _tsvector(Cuisine.name, 'A')
+
+restaurant_search_index = db.Index(
+    'idx_restaurant_search', restaurant_search_document,
+    postgresql_using='gin').ddl_if(dialect='postgresql')
+
+
+class RestaurantSearchIndex:
+    """In-process inverted index over approved restaurants.
+
+    Maps each word to the restaurants containing it with a field weight,
+    with separate postings for the restaurant's own name and description
+    and for its cuisine name. As in the PostgreSQL query, a restaurant
+    matches when its own fields hold every query word, or when its
+    cuisine name does; words are not pooled across the two. Marked dirty by mapper events in this process and reloaded after ttl
+    seconds so edits made by other workers show up too.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._postings = {}
+        self._cuisine_postings = {}
+        self._words = []
+        self._promoted = set()
+        self._loaded_at = None
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _is_fresh(self):
+        return (self._loaded_at is not None
+                and time.monotonic() - self._loaded_at < self.ttl)
+
+    def _load(self):
+        postings = {}
+        cuisine_postings = {}
+        promoted = set()
+        rows = db.session.query(
+            Restaurant.id, Restaurant.name, Restaurant.description,
+            Restaurant.is_promoted, Cuisine.name).join(
+                Cuisine, Restaurant.cuisine_id == Cuisine.id).filter(
+                    Restaurant.is_approved == True)
+        for restaurant_id, name, description, is_promoted, cuisine in rows:
+            for target, text, weight in (
+                    (postings, name, NAME_WEIGHT),
+                    (postings, description, DESCRIPTION_WEIGHT),
+                    (cuisine_postings, cuisine, CUISINE_WEIGHT)):
+                for word in tokenize(text):
+                    entry = target.setdefault(word, {})
+                    entry[restaurant_id] = entry.get(restaurant_id, 0) + weight
+            if is_promoted:
+                promoted.add(restaurant_id)
+        self._postings = postings
+        self._cuisine_postings = cuisine_postings
+        self._words = sorted(postings.keys() | cuisine_postings.keys())
+        self._promoted = promoted
+        self._loaded_at = time.monotonic()
+
+    def _prefix_scores(self, postings, prefix):
+        """Best field weight per restaurant over words starting with prefix"""
+        scores = {}
+        start = bisect.bisect_left(self._words, prefix)
+        for word in self._words[start:]:
+            if not word.startswith(prefix):
+                break
+            for restaurant_id, weight in postings.get(word, {}).items():
+                if weight > scores.get(restaurant_id, 0):
+                    scores[restaurant_id] = weight
+        return scores
+
+    def _match_all(self, postings, words):
+        """Summed scores of the restaurants whose postings hold every word"""
+        totals = None
+        for word in words:
+            scores = self._prefix_scores(postings, word)
+            if totals is None:
+                totals = scores
+            else:
+                totals = {
+                    restaurant_id: total + scores[restaurant_id]
+                    for restaurant_id, total in totals.items()
+                    if restaurant_id in scores
+                }
+            if not totals:
+                return {}
+        return totals
+
+    def search(self, text, limit=SEARCH_RESULT_LIMIT):
+        """Restaurant ids whose own fields or cuisine name match every
+        word of text, best first"""
+        words = tokenize(text)
+        if not words:
+            return []
+        if not self._is_fresh():
+            self._load()
+        totals = self._match_all(self._postings, words)
+        for restaurant_id, score in self._match_all(self._cuisine_postings,
+                                                    words).items():
+            totals[restaurant_id] = totals.get(restaurant_id, 0) + score
+        if not totals:
+            return []
+        ranked = sorted(
+            totals,
+            key=lambda restaurant_id: (
+                totals[restaurant_id] *
+                (PROMOTED_BOOST if restaurant_id in self._promoted else 1),
+                restaurant_id),
+            reverse=True)
+        return ranked[:limit]
+
+
+search_index = RestaurantSearchIndex(
+    ttl=float(os.environ.get('SEARCH_INDEX_TTL', 60)))
+
+
+def _restaurant_changed(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes()
+           for name in SEARCHABLE_COLUMNS):
+        search_index.invalidate()
+
+
+def _invalidate_search_index(mapper, connection, target):
+    search_index.invalidate()
+
+
+event.listen(Restaurant, 'after_insert', _invalidate_search_index)
+event.listen(Restaurant, 'after_update', _restaurant_changed)
+event.listen(Restaurant, 'after_delete', _invalidate_search_index)
+event.listen(Cuisine, 'after_update', _invalidate_search_index)
+event.listen(Cuisine, 'after_delete', _invalidate_search_index)
+
+
+def _search_postgresql(words, limit):
+    from sqlalchemy.orm import contains_eager
+    tsquery = func.to_tsquery(SEARCH_CONFIG,
+                              ' & '.join(f"{word}:*" for word in words))
+    # ARRAY(subquery) runs once as an init plan, so both sides of the OR
+    # can use an index (GIN on the document, btree on cuisine_id)
+    matching_cuisines = func.array(
+        select(Cuisine.id).where(cuisine_search_document.op('@@')(
+            tsquery)).correlate(None).scalar_subquery())
+    score = ((func.ts_rank(restaurant_search_document, tsquery) +
+              CUISINE_WEIGHT * func.ts_rank(cuisine_search_document, tsquery)) *
+             db.case((Restaurant.is_promoted == True, PROMOTED_BOOST),
+                     else_=1))
+    return Restaurant.query.join(
+        Cuisine, Restaurant.cuisine_id == Cuisine.id).options(
+            contains_eager(Restaurant.cuisine)).filter(
+                Restaurant.is_approved == True,
+                db.or_(restaurant_search_document.op('@@')(tsquery),
+                       Restaurant.cuisine_id == any_(matching_cuisines))).order_by(
+                           score.desc(), Restaurant.id.desc()).limit(limit).all()
+
+
+def _search_in_process(text, limit):
+    from sqlalchemy.orm import joinedload
+    ids = search_index.search(text, limit)
+    if not ids:
+        return []
+    restaurants = Restaurant.query.options(joinedload(
+        Restaurant.cuisine)).filter(
+            Restaurant.id.in_(ids),
+            # The index may predate an unapproval by another worker
+            Restaurant.is_approved == True).all()
+    position = {restaurant_id: i for i, restaurant_id in enumerate(ids)}
+    return sorted(restaurants, key=lambda r: position[r.id])
+
+
+def search_restaurants(text, limit=SEARCH_RESULT_LIMIT):
+    """Approved restaurants matching text, most relevant first"""
+    words = tokenize(text)
+    if not words:
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgresql(words, limit)
+    return _search_in_process(text, limit)
+
+
+class SuggestionIndex:
+    """Sorted prefix index for search box suggestions.
+
+    Keys are (text, kind, id) tuples for every word position of a name, so
+    'gri' suggests 'Istanbul Grill'. Lookups bisect the sorted keys without
+    querying the database. Committed changes in this process are applied
+    one entry at a time; the whole index is reloaded after ttl seconds to
+    pick up changes committed by other workers. Only the first load runs
+    inside a request; later reloads run in a background thread while
+    lookups keep using the current index.
+    """
+
+    KINDS = ('restaurant', 'cuisine', 'category')
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._keys = []
+        self._labels = {}
+        self._loaded_at = None
+        # Held by whichever thread is reloading the index
+        self._reload_lock = threading.Lock()
+        # Guards _keys/_labels; changes applied during a reload are
+        # recorded in _pending and replayed onto the reloaded index
+        self._lock = threading.RLock()
+        self._pending = None
+
+    @property
+    def is_loaded(self):
+        return self._loaded_at is not None
+
+    def _entry_keys(self, kind, ref, label):
+        words = tokenize(label)
+        kind_rank = self.KINDS.index(kind)
+        return [(' '.join(words[i:]), kind_rank, ref)
+                for i in range(len(words))]
+
+    def _load(self):
+        with self._lock:
+            self._pending = []
+        try:
+            labels = {}
+            for ref, name in db.session.query(
+                    Restaurant.id, Restaurant.name).filter(
+                        Restaurant.is_approved == True):
+                labels[('restaurant', ref)] = name
+            for ref, name in db.session.query(Cuisine.id, Cuisine.name):
+                labels[('cuisine', ref)] = name
+            for ref, name in db.session.query(FoodCategory.id,
+                                              FoodCategory.name):
+                labels[('category', ref)] = name
+            keys = sorted(key for (kind, ref), label in labels.items()
+                          for key in self._entry_keys(kind, ref, label))
+        finally:
+            with self._lock:
+                pending, self._pending = self._pending, None
+        with self._lock:
+            self._keys = keys
+            self._labels = labels
+            # Changes committed while the rows were read may be missing
+            for kind, ref, label in pending:
+                self._set(kind, ref, label)
+            self._loaded_at = time.monotonic()
+
+    def _reload_in_background(self):
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        app = current_app._get_current_object()
+
+        def reload():
+            try:
+                with app.app_context():
+                    try:
+                        self._load()
+                    except Exception:
+                        app.logger.exception('Suggestion index reload failed')
+                    finally:
+                        db.session.remove()
+            finally:
+                self._reload_lock.release()
+
+        threading.Thread(target=reload, name='suggestion-index-reload',
+                         daemon=True).start()
+
+    def _ensure_loaded(self):
+        if not self.is_loaded:
+            with self._reload_lock:
+                if not self.is_loaded:
+                    self._load()
+        elif time.monotonic() - self._loaded_at >= self.ttl:
+            self._reload_in_background()
+
+    def _remove(self, kind, ref):
+        label = self._labels.pop((kind, ref), None)
+        if label is None:
+            return
+        for key in self._entry_keys(kind, ref, label):
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def _set(self, kind, ref, label):
+        self._remove(kind, ref)
+        if label:
+            self._labels[(kind, ref)] = label
+            for key in self._entry_keys(kind, ref, label):
+                bisect.insort(self._keys, key)
+
+    def remove(self, kind, ref):
+        self.set(kind, ref, None)
+
+    def set(self, kind, ref, label):
+        """Add or rename an entry; a label of None removes it"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((kind, ref, label))
+            elif not self.is_loaded:
+                return
+            self._set(kind, ref, label)
+
+    def lookup(self, text, limit=SUGGESTION_LIMIT):
+        """(kind, id, label) for names with a word starting with text"""
+        prefix = ' '.join(tokenize(text))
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            keys, labels = self._keys, self._labels
+            start = bisect.bisect_left(keys, (prefix, ))
+            candidates = keys[start:start + SUGGESTION_SCAN_LIMIT]
+        results = []
+        seen = set()
+        for key, kind_rank, ref in candidates:
+            if not key.startswith(prefix):
+                break
+            entry = (self.KINDS[kind_rank], ref)
+            if entry in seen:
+                continue
+            seen.add(entry)
+            label = labels.get(entry)
+            if label is None:
+                continue
+            results.append((*entry, label))
+            if len(results) >= limit:
+                break
+        return results
+
+
+suggestion_index = SuggestionIndex(
+    ttl=float(os.environ.get('SUGGESTION_INDEX_TTL', 300)))
+
+
+def _suggestion_entry(obj, deleted=False):
+    """(kind, id, label) for a flushed object the suggestion index covers"""
+    if isinstance(obj, Restaurant):
+        return ('restaurant', obj.id,
+                None if deleted or not obj.is_approved else obj.name)
+    if isinstance(obj, Cuisine):
+        return ('cuisine', obj.id, None if deleted else obj.name)
+    if isinstance(obj, FoodCategory):
+        return ('category', obj.id, None if deleted else obj.name)
+    return None
+
+
+def _queue_suggestion_changes(session, flush_context):
+    # session.new/dirty/deleted still hold the pre-flush state here
+    changes = session.info.setdefault('suggestion_changes', [])
+    for obj in session.new | session.dirty:
+        entry = _suggestion_entry(obj)
+        if entry:
+            changes.append(entry)
+    for obj in session.deleted:
+        entry = _suggestion_entry(obj, deleted=True)
+        if entry:
+            changes.append(entry)
+
+
+def _apply_suggestion_changes(session):
+    changes = session.info.pop('suggestion_changes', [])
+    for kind, ref, label in changes:
+        suggestion_index.set(kind, ref, label)
+
+
+def _discard_suggestion_changes(session):
+    session.info.pop('suggestion_changes', None)
+
+
+def note_bulk_changes(kind, entries):
+    """Bring both indexes up to date after a bulk UPDATE or DELETE.
+
+    Query-level writes skip the mapper and flush events above. kind is
+    'restaurant' or 'cuisine'; entries are (id, name) pairs, with None as
+    the name for rows that are gone (or restaurants no longer approved).
+    Suggestion changes are applied on commit.
+    """
+    search_index.invalidate()
+    db.session.info.setdefault('suggestion_changes', []).extend(
+        (kind, ref, label) for ref, label in entries)
+
+
+# Only committed changes reach the suggestion index
+event.listen(Session, 'after_flush', _queue_suggestion_changes)
+event.listen(Session, 'after_commit', _apply_suggestion_changes)
+event.listen(Session, 'after_rollback', _discard_suggestion_changes)
@@ -1,5 +1,5 @@
 from app import app, db
-from models import User, Cuisine, Restaurant, Review
+from models import User, Cuisine, Restaurant, Review, LeaderboardEntry
 
 def seed_database():
     with app.app_context():
@@ -204,6 +204,10 @@ def seed_database():
         for review in reviews:
             db.session.add(review)
         db.session.commit()
+        Restaurant.reconcile_rating_aggregates()
+        User.reconcile_stats()
+        LeaderboardEntry.rebuild()
+        db.session.commit()
         print(f"Created {len(reviews)} reviews")
         
         print("\nDatabase seeded successfully!")
@@ -0,0 +1,78 @@
+"""
+Background tasks and broadcast handlers for Yalla
+
+Registered with jobs.task / jobs.broadcast_handler when this module is
+imported; routes.py and worker.py import it so web processes can enqueue
+these jobs and worker processes can run them.
+"""
+
+from images import VARIANT_JOB, generate_variants, variant_cache
+from jobs import task, broadcast_handler, broadcast
+from media import get_blob_store
+from models import User, LeaderboardEntry, FeatureToggle
+from page_cache import page_cache
+from reputation import replay_reputation
+from search import search_index
+
+# Broadcast names
+CACHES_INVALIDATE = 'caches_invalidate'
+IMAGE_VARIANTS_READY = 'image_variants_ready'
+
+# Job names
+REPUTATION_REPLAY = 'reputation_replay'
+USER_STATS_RECONCILE = 'user_stats_reconcile'
+LEADERBOARD_REBUILD = 'leaderboard_rebuild'
+
+
+@task(VARIANT_JOB)
+def build_image_variants(image_hash, profile):
+    """Render the stored upload image_hash at its profile's sizes"""
+    data = get_blob_store().get(image_hash)
+    if data is None:
+        raise LookupError(f'Blob {image_hash} is missing')
+    generate_variants(data, profile, image_hash)
+    broadcast(IMAGE_VARIANTS_READY, {'image_hash': image_hash})
+
+
+@task(REPUTATION_REPLAY)
+def replay_reputation_task(user_ids=None):
+    """Rebuild scores from the ledger and re-rank the affected users"""
+    replay_reputation(user_ids)
+    if user_ids is None:
+        LeaderboardEntry.rebuild()
+    else:
+        LeaderboardEntry.refresh(user_ids)
+    broadcast(CACHES_INVALIDATE)
+
+
+@task(USER_STATS_RECONCILE)
+def reconcile_user_stats_task(user_ids=None):
+    """Recount review and submission counters, then re-rank"""
+    User.reconcile_stats(user_ids)
+    if user_ids is None:
+        LeaderboardEntry.rebuild()
+    else:
+        LeaderboardEntry.refresh(user_ids)
+    broadcast(CACHES_INVALIDATE)
+
+
+@task(LEADERBOARD_REBUILD)
+def rebuild_leaderboard_task():
+    LeaderboardEntry.rebuild()
+    broadcast(CACHES_INVALIDATE)
+
+
+@broadcast_handler(CACHES_INVALIDATE)
+def invalidate_caches():
+    """Drop this process's cached pages, toggles and search index"""
+    page_cache.invalidate()
+    FeatureToggle.invalidate_cache()
+    search_index.invalidate()
+
+
+@broadcast_handler(IMAGE_VARIANTS_READY)
+def image_variants_ready(image_hash):
+    """Forget that image_hash was still processing; pages showing its
+    placeholder are stale"""
+    variant_cache.discard(image_hash)
+    page_cache.invalidate()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+
+import pytest
+
+# app.py reads its configuration at import time
+_tmp = tempfile.mkdtemp(prefix='yalla-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'test.db')
+os.environ.setdefault('SESSION_SECRET', 'test-secret')
+os.environ['MEDIA_ROOT'] = os.path.join(_tmp, 'media')
+
+
+@pytest.fixture(scope='session')
+def app():
+    import seed_data
+    from app import app as flask_app, db
+    from models import FeatureToggle
+    seed_data.seed_database()
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        if FeatureToggle.query.filter_by(
+                feature_name='maintenance_mode').first() is None:
+            db.session.add(
+                FeatureToggle(feature_name='maintenance_mode',
+                              is_enabled=False))
+            db.session.commit()
+    return flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, username, password):
+    client.post('/login', data={'user_input': username, 'password': password})
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app.test_client(), 'admin', 'admin123')
+
+
+@pytest.fixture
+def user_client(app):
+    from models import User
+    with app.app_context():
+        username = User.query.filter_by(is_admin=False).order_by(
+            User.id).first().username
+    return login(app.test_client(), username, 'password123')
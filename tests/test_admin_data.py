@@ -0,0 +1,40 @@
+def test_admin_data_carries_only_the_first_page_of_each_queue(
+        app, admin_client):
+    from app import db
+    from models import Cuisine, Restaurant
+    from routes import ADMIN_PAGE_SIZE
+    with app.app_context():
+        cuisine_id = Cuisine.query.first().id
+        restaurants = [
+            Restaurant(name=f'Pending {i}', description='Awaiting review',
+                       cuisine_id=cuisine_id,
+                       is_approved=False)
+            for i in range(ADMIN_PAGE_SIZE + 5)
+        ]
+        db.session.add_all(restaurants)
+        db.session.commit()
+        ids = [r.id for r in restaurants]
+    try:
+        data = admin_client.get('/admin/api/data').get_json()
+        pending = data['pending']
+        assert len(pending['items']) == ADMIN_PAGE_SIZE
+        assert pending['total'] >= ADMIN_PAGE_SIZE + 5
+        assert pending['pages'] >= 2
+        assert len(data['pending_reviews']['items']) <= ADMIN_PAGE_SIZE
+
+        second = admin_client.get('/admin/api/pending-restaurants?page=2')
+        assert second.get_json()['page'] == 2
+        assert not {r['id'] for r in second.get_json()['items']} & {
+            r['id'] for r in pending['items']}
+    finally:
+        with app.app_context():
+            Restaurant.query.filter(Restaurant.id.in_(ids)).delete(
+                synchronize_session=False)
+            db.session.commit()
+
+
+def test_job_status_is_not_stored_by_shared_caches(admin_client):
+    response = admin_client.get('/admin/api/jobs')
+    assert response.cache_control.private
+    assert response.cache_control.no_cache
+    assert not response.cache_control.public
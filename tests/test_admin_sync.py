@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+
+def _touch_review(app, updated_at):
+    from app import db
+    from models import Review
+    with app.app_context():
+        review = Review.query.order_by(Review.id).first()
+        Review.query.filter(Review.id == review.id).update(
+            {'updated_at': updated_at}, synchronize_session=False)
+        db.session.commit()
+
+
+def test_late_commit_behind_the_marker_is_not_hidden_by_a_304(
+        app, admin_client):
+    now = datetime.utcnow()
+    since = (now - timedelta(minutes=1)).isoformat()
+    _touch_review(app, now)
+    response = admin_client.get(f'/admin/api/changes?since={since}')
+    etag = response.headers['ETag']
+
+    # Commits after the response but carries an older change time
+    with app.app_context():
+        from app import db
+        from models import Review
+        late = Review.query.order_by(Review.id.desc()).first()
+        Review.query.filter(Review.id == late.id).update(
+            {'updated_at': now - timedelta(seconds=1)},
+            synchronize_session=False)
+        db.session.commit()
+        late_id = late.id
+
+    response = admin_client.get(f'/admin/api/changes?since={since}',
+                                headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert late_id in [r['id'] for r in response.get_json()['reviews']]
+
+
+def test_settled_marker_revalidates(app, admin_client, monkeypatch):
+    import routes
+    monkeypatch.setattr(routes, 'ADMIN_SYNC_OVERLAP', timedelta(0))
+    since = datetime.utcnow().isoformat()
+    response = admin_client.get(f'/admin/api/changes?since={since}')
+    response = admin_client.get(
+        f'/admin/api/changes?since={since}',
+        headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
@@ -0,0 +1,21 @@
+def test_if_modified_since_alone_does_not_revalidate(app, client):
+    from models import Restaurant
+    with app.app_context():
+        restaurant_id = Restaurant.query.filter_by(
+            is_approved=True).first().id
+    url = f'/restaurant/{restaurant_id}'
+    response = client.get(url)
+    assert response.status_code == 200
+    last_modified = response.headers['Last-Modified']
+    etag = response.headers['ETag']
+
+    # Switching language changes the page but not the data's timestamp
+    client.get('/set_language/ar')
+    response = client.get(url, headers={'If-Modified-Since': last_modified})
+    assert response.status_code == 200
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+
+    response = client.get(url,
+                          headers={'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
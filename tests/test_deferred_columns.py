@@ -0,0 +1,76 @@
+"""The hot queries must not select the heavy, rarely rendered columns"""
+
+import re
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HEAVY_COLUMNS = {
+    'user': {'password_hash', 'bio', 'ban_reason', 'profile_picture'},
+    'restaurant': {'working_hours', 'food_categories', 'photos'},
+    'review': {'receipt_image'},
+}
+
+# table.column, with optional quoting and the _1 suffix of aliases
+COLUMN_REFERENCE = re.compile(r'"?([a-z_]+?)(?:_\d+)?"?\.([a-z_]+)\b')
+
+
+@contextmanager
+def recorded_selects():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
+
+
+def heavy_columns_in(statements):
+    found = set()
+    for statement in statements:
+        for table, column in COLUMN_REFERENCE.findall(statement):
+            if column in HEAVY_COLUMNS.get(table, ()):
+                found.add(f'{table}.{column}')
+    return found
+
+
+def test_session_principal_skips_heavy_user_columns(app, user_client):
+    with recorded_selects() as statements:
+        assert user_client.get('/about').status_code == 200
+    assert statements
+    assert heavy_columns_in(statements) == set()
+
+
+def test_full_user_load_skips_heavy_user_columns(app):
+    from models import User
+    from principal import load_principal
+    with app.test_request_context():
+        user_id = User.query.filter_by(is_admin=False).first().id
+        with recorded_selects() as statements:
+            principal = load_principal(user_id)
+            assert principal.user.username == principal.username
+    assert heavy_columns_in(statements) == set()
+
+
+@pytest.mark.parametrize('url', ['/restaurants', '/api/restaurants'])
+def test_restaurant_listing_skips_detail_columns(app, client, url):
+    with recorded_selects() as statements:
+        assert client.get(url).status_code == 200
+    assert any('FROM restaurant' in s for s in statements)
+    assert heavy_columns_in(statements) == set()
+
+
+@pytest.mark.parametrize('url', ['/admin/api/reviews',
+                                 '/admin/api/pending-reviews'])
+def test_admin_review_queries_skip_receipt_data(app, admin_client, url):
+    with recorded_selects() as statements:
+        assert admin_client.get(url).status_code == 200
+    assert any('FROM review' in s for s in statements)
+    assert heavy_columns_in(statements) == set()
@@ -0,0 +1,9 @@
+def test_gallery_pages_are_cached_briefly(app, client):
+    from models import Restaurant
+    from routes import GALLERY_PAGE_MAX_AGE
+    with app.app_context():
+        restaurant_id = Restaurant.query.filter_by(
+            is_approved=True).first().id
+    response = client.get(f'/api/restaurants/{restaurant_id}/photos')
+    assert response.status_code == 200
+    assert response.cache_control.max_age == GALLERY_PAGE_MAX_AGE
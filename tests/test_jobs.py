@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+
+def test_broadcast_committed_out_of_id_order_is_applied(app):
+    import jobs
+    from app import db
+    from models import Job
+    received = []
+    jobs.broadcast_handler('test_ping')(lambda n: received.append(n))
+    listener = jobs.BroadcastListener(interval=0)
+    with app.app_context():
+        listener.poll()
+        base = (db.session.query(db.func.max(Job.id)).scalar() or 0) + 10
+        now = datetime.utcnow()
+        # The later id commits first...
+        db.session.add(Job(id=base + 1, name='test_ping', payload={'n': 2},
+                           status=jobs.STATUS_BROADCAST, created_at=now))
+        db.session.commit()
+        assert listener.poll() == 1
+        # ...and the earlier one, inserted before it, only afterwards
+        db.session.add(Job(id=base, name='test_ping', payload={'n': 1},
+                           status=jobs.STATUS_BROADCAST,
+                           created_at=now - timedelta(seconds=1)))
+        db.session.commit()
+        assert listener.poll() == 1
+        assert listener.poll() == 0
+    assert received == [2, 1]
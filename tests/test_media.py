@@ -0,0 +1,49 @@
+import os
+
+
+def _stored(app, label):
+    from media import store_blob
+    with app.app_context():
+        return store_blob(b'\xff\xd8\xff' + label.encode() + os.urandom(8))
+
+
+def _add_variant(app, image_hash, blob_hash):
+    from app import db
+    from models import ImageVariant
+    with app.app_context():
+        db.session.add(ImageVariant(image_hash=image_hash, format='jpeg',
+                                    width=480, height=320, byte_size=10,
+                                    blob_hash=blob_hash))
+        db.session.commit()
+
+
+def test_renditions_are_public_but_raw_uploads_are_not(app, client):
+    upload = _stored(app, 'upload')
+    rendition = _stored(app, 'rendition')
+    _add_variant(app, upload, rendition)
+    assert client.get(f'/media/{rendition}').status_code == 200
+    assert client.get(f'/media/{upload}').status_code == 404
+
+
+def test_receipts_are_not_served_publicly(app, client, admin_client):
+    from app import db
+    from models import Review
+    receipt = _stored(app, 'receipt')
+    rendition = _stored(app, 'receipt rendition')
+    _add_variant(app, receipt, rendition)
+    with app.app_context():
+        review = Review.query.order_by(Review.id).first()
+        previous = review.receipt_image_hash
+        review.receipt_image_hash = receipt
+        db.session.commit()
+        review_id = review.id
+    try:
+        assert client.get(f'/media/{receipt}').status_code == 404
+        assert client.get(f'/media/{rendition}').status_code == 404
+        response = admin_client.get(f'/admin/review/{review_id}/receipt')
+        assert response.status_code == 200
+    finally:
+        with app.app_context():
+            Review.query.filter_by(id=review_id).update(
+                {'receipt_image_hash': previous})
+            db.session.commit()
@@ -0,0 +1,118 @@
+def _unconfirmed_review(app):
+    from models import Review
+    with app.app_context():
+        review = Review.query.filter(Review.user_id.isnot(None),
+                                     Review.receipt_confirmed == False).first()
+        return review.id, review.user_id
+
+
+def _confirmation_state(app, review_id, user_id):
+    from app import db
+    from models import ReputationEvent, User
+    from reputation import REASON_REVIEW_CONFIRMED
+    with app.app_context():
+        events = ReputationEvent.query.filter_by(
+            user_id=user_id, reason=REASON_REVIEW_CONFIRMED,
+            source_id=review_id).count()
+        score = db.session.get(User, user_id).reputation_score
+        return events, score
+
+
+def test_confirming_a_receipt_twice_awards_points_once(app, admin_client):
+    from reputation import REVIEW_POINTS
+    review_id, user_id = _unconfirmed_review(app)
+    _, score_before = _confirmation_state(app, review_id, user_id)
+
+    response = admin_client.post(f'/admin/confirm-receipt/{review_id}')
+    assert response.get_json()['success']
+    assert _confirmation_state(app, review_id,
+                               user_id) == (1, score_before + REVIEW_POINTS)
+
+    response = admin_client.post(f'/admin/confirm-receipt/{review_id}')
+    assert response.get_json()['message'] == 'Receipt was already confirmed.'
+    assert _confirmation_state(app, review_id,
+                               user_id) == (1, score_before + REVIEW_POINTS)
+
+
+def test_bulk_confirm_skips_reviews_without_a_receipt(app, admin_client):
+    from app import db
+    from models import Restaurant, ReputationEvent, Review, User
+    from reputation import REASON_REVIEW_CONFIRMED
+    with app.app_context():
+        user = User.query.filter_by(is_admin=False).order_by(User.id).first()
+        restaurant = Restaurant.query.filter_by(is_approved=True).first()
+        with_receipt = Review(rating=4, content='With receipt',
+                              user_id=user.id, restaurant_id=restaurant.id,
+                              receipt_image_hash='0' * 64)
+        without_receipt = Review(rating=4, content='Without receipt',
+                                 user_id=user.id,
+                                 restaurant_id=restaurant.id)
+        db.session.add_all([with_receipt, without_receipt])
+        db.session.commit()
+        ids = [with_receipt.id, without_receipt.id]
+
+    response = admin_client.post('/admin/api/reviews/bulk',
+                                 data={'action': 'confirm', 'ids[]': ids})
+    assert response.get_json()['success']
+
+    with app.app_context():
+        reviews = {review.id: review
+                   for review in Review.query.filter(Review.id.in_(ids))}
+        assert all(review.is_approved for review in reviews.values())
+        assert reviews[ids[0]].receipt_confirmed
+        assert not reviews[ids[1]].receipt_confirmed
+        awarded = {event.source_id for event in ReputationEvent.query.filter(
+            ReputationEvent.reason == REASON_REVIEW_CONFIRMED,
+            ReputationEvent.source_id.in_(ids))}
+        assert awarded == {ids[0]}
+
+
+def test_approving_a_restaurant_twice_awards_points_once(app, admin_client):
+    from app import db
+    from models import Cuisine, ReputationEvent, Restaurant, User
+    from reputation import REASON_RESTAURANT_APPROVED
+    with app.app_context():
+        user = User.query.filter_by(is_admin=False).order_by(User.id).first()
+        restaurant = Restaurant(name='Pending Twice',
+                                description='Awaiting review',
+                                cuisine_id=Cuisine.query.first().id,
+                                user_id=user.id, is_approved=False)
+        db.session.add(restaurant)
+        db.session.commit()
+        restaurant_id = restaurant.id
+
+    admin_client.post(f'/admin/approve/{restaurant_id}')
+    admin_client.post(f'/admin/approve/{restaurant_id}')
+
+    with app.app_context():
+        assert db.session.get(Restaurant, restaurant_id).is_approved
+        assert ReputationEvent.query.filter_by(
+            reason=REASON_RESTAURANT_APPROVED,
+            source_id=restaurant_id).count() == 1
+
+
+def test_rejecting_a_restaurant_recounts_its_reviewers(app, admin_client):
+    from app import db
+    from models import Cuisine, Restaurant, Review, User
+    with app.app_context():
+        user = User.query.filter_by(is_admin=False).order_by(
+            User.id.desc()).first()
+        restaurant = Restaurant(name='Rejected Later',
+                                description='Awaiting review',
+                                cuisine_id=Cuisine.query.first().id,
+                                is_approved=False)
+        db.session.add(restaurant)
+        db.session.flush()
+        db.session.add(Review(rating=5, content='Great', user_id=user.id,
+                              restaurant_id=restaurant.id, is_approved=True))
+        User.reconcile_stats([user.id])
+        db.session.commit()
+        user_id, restaurant_id = user.id, restaurant.id
+        count = db.session.get(User, user_id).approved_review_count
+
+    admin_client.post(f'/admin/reject/{restaurant_id}')
+
+    with app.app_context():
+        assert db.session.get(Restaurant, restaurant_id) is None
+        assert db.session.get(User,
+                              user_id).approved_review_count == count - 1
@@ -0,0 +1,35 @@
+from page_cache import page_cache
+
+
+def test_preference_saves_keep_cached_pages(client, user_client):
+    page_cache.invalidate()
+    assert client.get('/').headers.get('X-Cache') == 'MISS'
+    assert client.get('/').headers.get('X-Cache') == 'HIT'
+
+    response = user_client.post('/save_dark_mode', data={'darkMode': 'true'})
+    assert response.status_code == 200
+    assert client.get('/').headers.get('X-Cache') == 'HIT'
+
+    user_client.get('/set_language/ar')
+    assert client.get('/').headers.get('X-Cache') == 'HIT'
+
+
+def test_public_user_changes_invalidate_cached_pages(app, client):
+    from app import db
+    from models import User
+    page_cache.invalidate()
+    client.get('/')
+    assert client.get('/').headers.get('X-Cache') == 'HIT'
+    with app.app_context():
+        User.query.filter(User.is_admin == False).update(
+            {'reputation_score': User.reputation_score + 1},
+            synchronize_session=False)
+        db.session.commit()
+    assert client.get('/').headers.get('X-Cache') == 'MISS'
+
+
+def test_page_cache_stats_are_not_stored_by_shared_caches(admin_client):
+    response = admin_client.get('/admin/api/page-cache')
+    assert response.cache_control.private
+    assert response.cache_control.no_cache
+    assert not response.cache_control.public
@@ -0,0 +1,16 @@
+def test_consecutive_rating_changes_accumulate_before_commit(app):
+    from app import db
+    from models import Restaurant
+    with app.app_context():
+        restaurant = Restaurant.query.filter_by(is_approved=True).first()
+        count = restaurant.approved_review_count or 0
+        total = restaurant.rating_sum or 0
+        try:
+            restaurant.apply_review_rating(4, 1)
+            restaurant.apply_review_rating(2, 1)
+            assert restaurant.approved_review_count == count + 2
+            assert restaurant.rating_sum == total + 6
+            assert isinstance(restaurant.avg_rating, float)
+            assert restaurant.avg_rating == (total + 6) / (count + 2)
+        finally:
+            db.session.rollback()
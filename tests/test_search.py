@@ -0,0 +1,101 @@
+import threading
+
+
+def test_stale_suggestion_index_reloads_once_in_background(app):
+    import search
+    from app import db
+    from models import Restaurant
+    index = search.SuggestionIndex(ttl=3600)
+    loads = []
+    release = threading.Event()
+    load = index._load
+
+    def slow_load():
+        loads.append(threading.current_thread().name)
+        if len(loads) > 1:
+            release.wait(5)
+        load()
+
+    index._load = slow_load
+    with app.app_context():
+        name = db.session.query(Restaurant.name).filter(
+            Restaurant.is_approved == True).first()[0]
+        prefix = name[:3]
+        expected = index.lookup(prefix)
+        assert expected
+        index._loaded_at -= index.ttl
+        # Stale lookups keep answering from the current index while a
+        # single reload runs in the background
+        for _ in range(5):
+            assert index.lookup(prefix) == expected
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'suggestion-index-reload':
+                thread.join(5)
+        assert index.lookup(prefix) == expected
+    assert len(loads) == 2
+    assert loads[1] == 'suggestion-index-reload'
+
+
+def test_change_committed_during_reload_is_kept(app):
+    import search
+
+    class Index(search.SuggestionIndex):
+        watching = False
+        committed = False
+
+        def _entry_keys(self, kind, ref, label):
+            # Simulate another request committing a new cuisine while
+            # the reload is still reading rows
+            if (self.watching and self._pending is not None
+                    and not self.committed):
+                self.committed = True
+                self.set('cuisine', -1, 'Zzyzx Fusion')
+            return super()._entry_keys(kind, ref, label)
+
+    index = Index(ttl=3600)
+    with app.app_context():
+        index.lookup('a')
+        index.watching = True
+        index._load()
+    assert index.committed
+    assert index.lookup('zzyzx') == [('cuisine', -1, 'Zzyzx Fusion')]
+
+
+def _add_restaurant(name, cuisine_name):
+    from app import db
+    from models import Cuisine, Restaurant
+    cuisine = Cuisine(name=cuisine_name)
+    restaurant = Restaurant(name=name, description='Wood fired ovens',
+                            cuisine=cuisine, is_approved=True)
+    db.session.add_all([cuisine, restaurant])
+    db.session.commit()
+    return restaurant.id
+
+
+def test_query_words_are_not_pooled_across_name_and_cuisine(app):
+    import search
+    with app.app_context():
+        restaurant_id = _add_restaurant('Qorvo Pizzeria', 'Xantish')
+        search.search_index.invalidate()
+        assert restaurant_id in search.search_index.search('qorvo wood')
+        assert restaurant_id in search.search_index.search('xantish')
+        # As on PostgreSQL, every word must be in the restaurant's own
+        # fields or every word in its cuisine name
+        assert search.search_index.search('xantish qorvo') == []
+
+
+def test_restaurant_unapproved_elsewhere_is_not_returned(app):
+    import search
+    from app import db
+    from sqlalchemy import text
+    with app.app_context():
+        restaurant_id = _add_restaurant('Vellum Grill', 'Quellish')
+        assert [r.id for r in search._search_in_process('vellum', 10)] == [
+            restaurant_id]
+        # Another worker unapproves it; this index hasn't expired yet
+        db.session.execute(
+            text('UPDATE restaurant SET is_approved = 0 WHERE id = :id'),
+            {'id': restaurant_id})
+        db.session.commit()
+        assert search._search_in_process('vellum', 10) == []
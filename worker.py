@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Background job worker for Yalla
+
+Runs queued jobs (image variants, reputation replays, leaderboard
+rebuilds; see jobs.py and tasks.py) until interrupted. Any number of
+workers can run next to the web processes.
+"""
+
+from app import app
+from jobs import work
+import tasks  # registers the background task handlers
+
+if __name__ == "__main__":
+    print("✓ Job worker started")
+    work(app)